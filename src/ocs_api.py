@@ -5,37 +5,390 @@
 #  September 4, 2024: generated based on schema at https://chatbots.dimagi.com/api/schema/ (schema snapshot saved to
 #                     ocs-api-schema.yaml)
 
-"""Open Chat Studio API wrapper with timeouts and tenacity retries."""
+"""Open Chat Studio API wrappers (blocking and asyncio) with timeouts and tenacity retries."""
 
+import asyncio
+import contextvars
+import httpx
+import io
+import os
+import queue
+import re
+import threading
+import random
 import requests
-from tenacity import retry, stop_after_attempt, wait_fixed
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from tenacity import Retrying, AsyncRetrying, retry_if_exception, RetryCallState
 import logging
-from functools import wraps, partial
-from typing import Optional, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, parse_qs
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+from ocs_flow_control import TokenBucketRateLimiter, AdaptiveConcurrencyLimiter, CircuitBreaker, HedgePolicy
+from ocs_response_cache import ResponseCache
+from ocs_json import JSONCodec, IncrementalPageParser, default_json_codec
+from ocs_cassette import Cassette
+from typing import Optional, Dict, Any, Iterable, Iterator, AsyncIterator
+
+
+class OCSAPIError(Exception):
+    """Base class for errors raised by the OCS API clients."""
+
+
+class OCSConnectionError(OCSAPIError):
+    """Raised when a connection to the OCS API can't be established or is dropped."""
+
+
+class OCSTimeoutError(OCSAPIError):
+    """Raised when an OCS API request times out."""
+
+
+class OCSHTTPError(OCSAPIError):
+    """Raised when the OCS API responds with an error status."""
+
+    def __init__(self, message: str, status_code: int, response_content: bytes = None,
+                 retry_after_seconds: float = None):
+        """
+        Initialize the error.
+
+        Args:
+            message (str): The error message.
+            status_code (int): The HTTP status code of the response.
+            response_content (bytes): The raw content of the response (if any). Defaults to None.
+            retry_after_seconds (float): How long the server asked us to wait before retrying, per any Retry-After
+              header. Defaults to None.
+        """
+
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_content = response_content
+        self.retry_after_seconds = retry_after_seconds
+
+
+class OCSClientError(OCSHTTPError):
+    """Raised when the OCS API rejects a request with a 4xx status."""
+
+
+class OCSAuthenticationError(OCSClientError):
+    """Raised when the OCS API rejects our credentials (401 or 403)."""
+
+
+class OCSNotFoundError(OCSClientError):
+    """Raised when the OCS API can't find the requested resource (404)."""
+
+
+class OCSRateLimitError(OCSClientError):
+    """Raised when the OCS API throttles a request (429)."""
+
+
+class OCSServerError(OCSHTTPError):
+    """Raised when the OCS API fails with a 5xx status."""
+
+
+class OCSCircuitOpenError(OCSAPIError):
+    """Raised when a call is refused because the client's circuit breaker is open (and calls should fail fast)."""
+
+
+class OCSDeadlineExceededError(OCSAPIError):
+    """Raised when a call's deadline passes (or would pass before its next retry) before it succeeds."""
+
+
+# errors that suggest the service is overloaded or unavailable (and that a later attempt may succeed)
+_OVERLOAD_ERRORS = (OCSTimeoutError, OCSConnectionError, OCSRateLimitError, OCSServerError)
+
+# the monotonic time by which the current operation must finish (if any), as set by deadline()
+_current_deadline = contextvars.ContextVar("ocs_deadline", default=None)
+
+# how many incrementally-parsed results to buffer ahead of the caller
+_INCREMENTAL_QUEUE_SIZE = 100
+
+# how many bytes of a list response to read and parse at a time, when parsing incrementally
+_INCREMENTAL_CHUNK_SIZE = 64 * 1024
+
+
+class RetryPolicy:
+    """Policy for retrying OCS API calls: which errors to retry, and how long to wait between attempts."""
+
+    def __init__(self, max_attempts: int = 3, initial_wait_seconds: float = 2.0, backoff_multiplier: float = 2.0,
+                 max_wait_seconds: float = 60.0, jitter_seconds: float = 1.0, max_retry_after_seconds: float = 300.0):
+        """
+        Initialize the retry policy.
+
+        Only timeouts, connection errors, 429 (rate limit), and 5xx (server) errors are retried; other errors (e.g.,
+        400, 401, 404) are raised immediately. Waits grow exponentially with random jitter, but if the server sends a
+        Retry-After header, we wait at least that long.
+
+        Args:
+            max_attempts (int): The maximum number of attempts per call (including the first). Defaults to 3.
+            initial_wait_seconds (float): The wait before the first retry, before jitter. Defaults to 2.0.
+            backoff_multiplier (float): The factor by which the wait grows with each retry. Defaults to 2.0.
+            max_wait_seconds (float): The maximum wait between attempts, before jitter. Defaults to 60.0.
+            jitter_seconds (float): The maximum random jitter to add to each wait. Defaults to 1.0.
+            max_retry_after_seconds (float): The maximum wait to honor from a Retry-After header. Defaults to 300.0.
+        """
+
+        # set parameters
+        self.max_attempts = max_attempts
+        self.initial_wait_seconds = initial_wait_seconds
+        self.backoff_multiplier = backoff_multiplier
+        self.max_wait_seconds = max_wait_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_retry_after_seconds = max_retry_after_seconds
+
+    @staticmethod
+    def is_retryable(exception: BaseException) -> bool:
+        """
+        Determine whether a failed attempt should be retried.
+
+        Args:
+            exception (BaseException): The exception raised by the attempt.
+
+        Returns:
+            bool: True if the call should be retried.
+        """
+
+        return isinstance(exception, _OVERLOAD_ERRORS)
+
+    def wait_seconds(self, retry_state: RetryCallState) -> float:
+        """
+        Compute how long to wait before the next attempt (tenacity wait strategy).
+
+        Args:
+            retry_state (RetryCallState): The tenacity state for the call.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+
+        # exponential backoff with jitter
+        backoff = min(self.initial_wait_seconds * self.backoff_multiplier ** (retry_state.attempt_number - 1),
+                      self.max_wait_seconds)
+        wait = backoff + random.uniform(0, self.jitter_seconds)
+
+        # honor any Retry-After from the server (within reason)
+        exception = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = getattr(exception, "retry_after_seconds", None)
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, self.max_retry_after_seconds))
+
+        return wait
+
+    def build_retrying(self, use_asyncio: bool = False) -> Retrying:
+        """
+        Build a tenacity retrying object that applies this policy.
+
+        The result can be built once and reused; call copy() on it for each call, so that concurrent calls keep
+        separate attempt state. Retries stop after max_attempts attempts (whatever the state of any circuit
+        breaker), or sooner if the next attempt couldn't start before the current deadline (if any; see deadline()),
+        in which case OCSDeadlineExceededError is raised.
+
+        Args:
+            use_asyncio (bool): Whether to build an AsyncRetrying object for coroutines. Defaults to False.
+
+        Returns:
+            Retrying: The tenacity retrying object (re-raising the last error once attempts are exhausted).
+        """
+
+        def out_of_time(retry_state: RetryCallState) -> bool:
+            deadline_at = _current_deadline.get()
+            return deadline_at is not None and time.monotonic() + (retry_state.upcoming_sleep or 0) >= deadline_at
+
+        def stop(retry_state: RetryCallState) -> bool:
+            return out_of_time(retry_state) or retry_state.attempt_number >= self.max_attempts
+
+        def give_up(retry_state: RetryCallState):
+            # re-raise the last error, unless we stopped early for lack of time
+            error = retry_state.outcome.exception()
+            if out_of_time(retry_state):
+                raise OCSDeadlineExceededError(f"Deadline exceeded after {retry_state.attempt_number} attempt(s): "
+                                               f"{error}") from error
+            raise error
+
+        retrying_class = AsyncRetrying if use_asyncio else Retrying
+        return retrying_class(stop=stop, wait=self.wait_seconds, retry=retry_if_exception(self.is_retryable),
+                              retry_error_callback=give_up)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Set a deadline for all OCS API calls made within a block (in the same thread or task), including their retries.
+
+    For example, "with deadline(120):" around a simulation turn makes its calls fail with OCSDeadlineExceededError
+    rather than run past 120 seconds: each attempt's timeouts are cut to the time remaining, waits for the circuit
+    breaker and rate and concurrency limits are cut short, and retries stop once there isn't time for them. Worker
+    threads that the clients and simulators start for a call (e.g., to prefetch pages or hedge requests) inherit the
+    deadline. Nested deadlines can only shorten the current one.
+
+    Args:
+        seconds (float): The time allowed for the block, in seconds.
+    """
+
+    deadline_at = time.monotonic() + seconds
+    current = _current_deadline.get()
+    token = _current_deadline.set(deadline_at if current is None else min(current, deadline_at))
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def remaining_deadline_seconds() -> Optional[float]:
+    """
+    Get the time left before the current deadline (see deadline()).
+
+    Returns:
+        Optional[float]: The number of seconds remaining (negative if the deadline has passed), or None if there's
+        no deadline.
+    """
+
+    deadline_at = _current_deadline.get()
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+def _wait_budget_seconds() -> Optional[float]:
+    """
+    Get how long a call can wait for flow control before the current deadline (see deadline()).
+
+    Returns:
+        Optional[float]: The number of seconds (zero if the deadline has passed), or None if there's no deadline.
+    """
+
+    remaining = remaining_deadline_seconds()
+    return None if remaining is None else max(0.0, remaining)
+
+
+def _raise_if_deadline_passed(activity: str):
+    """
+    Raise OCSDeadlineExceededError if the current deadline (if any) has passed.
+
+    Args:
+        activity (str): What was being done when the deadline passed, for the error message.
+
+    Raises:
+        OCSDeadlineExceededError: If the deadline has passed.
+    """
+
+    remaining = remaining_deadline_seconds()
+    if remaining is not None and remaining <= 0:
+        raise OCSDeadlineExceededError(f"Deadline exceeded {activity}")
 
 
 class OCSAPIClient:
     """Open Chat Studio API client with timeouts and tenacity retries."""
 
     def __init__(self, api_key: str, base_url: str = "https://chatbots.dimagi.com", timeout_seconds: int = 300,
-                 num_retries: int = 3, retry_wait_seconds: int = 2):
+                 num_retries: int = 3, retry_wait_seconds: int = 2, pool_connections: int = 10,
+                 pool_maxsize: int = 10, pool_block: bool = False, keep_alive: bool = True,
+                 retry_policy: RetryPolicy = None, rate_limiter: TokenBucketRateLimiter = None,
+                 concurrency_limiter: AdaptiveConcurrencyLimiter = None, circuit_breaker: CircuitBreaker = None,
+                 response_cache: ResponseCache = None, json_codec: JSONCodec = None,
+                 hedge_policy: HedgePolicy = None, connect_timeout_seconds: float = 10.0,
+                 deadline_seconds: float = None, cassette: Cassette = None):
         """
         Initialize the OCS API client.
 
+        All requests go through a single pooled HTTP session owned by the client, so connections (and their TLS
+        handshakes) are reused across calls. The client can be shared between worker threads.
+
         Args:
             api_key (str): The OCS API key for authentication.
             base_url (str): The base URL for the API. Defaults to "https://chatbots.dimagi.com".
-            timeout_seconds (int): The timeout in seconds for API requests. Defaults to 300.
+            timeout_seconds (int): The timeout in seconds for reading API responses, per attempt. Defaults to 300.
             num_retries (int): The number of retries for API requests. Defaults to 3.
             retry_wait_seconds (int): The number of seconds to wait between retries. Defaults to 2.
+            pool_connections (int): The number of per-host connection pools to cache. Defaults to 10.
+            pool_maxsize (int): The maximum number of connections to keep open per host; set this to at least the
+              number of worker threads sharing the client. Defaults to 10.
+            pool_block (bool): Whether to block when all pooled connections to a host are in use (rather than
+              opening a temporary extra connection). Defaults to False.
+            keep_alive (bool): Whether to keep connections open between requests. Defaults to True.
+            retry_policy (RetryPolicy): The policy for retrying failed calls. Defaults to exponential backoff with
+              jitter, starting at retry_wait_seconds, for up to num_retries attempts.
+            rate_limiter (TokenBucketRateLimiter): A limiter to hold each request (including each retry) to
+              per-endpoint, per-experiment rates. Defaults to None (no limit).
+            concurrency_limiter (AdaptiveConcurrencyLimiter): A limiter to adapt the number of requests in flight
+              to observed latency and errors. Defaults to None (no adaptive limit).
+            circuit_breaker (CircuitBreaker): A breaker to hold back (or fail fast) all calls while the service is
+              failing. Defaults to None (no breaker).
+            response_cache (ResponseCache): A cache for GET responses (e.g., experiment metadata), so that repeat
+              lookups are served from memory. Defaults to None (no caching).
+            json_codec (JSONCodec): The codec for encoding requests and decoding responses. Defaults to orjson if
+              it's installed, otherwise the standard library.
+            hedge_policy (HedgePolicy): A policy for duplicating slow idempotent GET requests to cut tail latency.
+              Defaults to None (no hedging).
+            connect_timeout_seconds (float): The timeout in seconds for connecting to the API, per attempt. Defaults
+              to 10.0.
+            deadline_seconds (float): The time allowed for each call, including all retries and waits between them.
+              Within a deadline() block, the earlier deadline applies. Defaults to None (no per-call deadline).
+            cassette (Cassette): A cassette to record all traffic to, or (in replay mode) to serve all responses
+              from instead of the server. Defaults to None (talk to the server as usual).
         """
 
         # set parameters
         self.api_key = api_key
         self.base_url = base_url
         self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.cassette = cassette
+        self.pool_maxsize = pool_maxsize
         self.num_retries = num_retries
         self.retry_wait_seconds = retry_wait_seconds
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=num_retries,
+                                                        initial_wait_seconds=retry_wait_seconds)
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breaker = circuit_breaker
+        self.response_cache = response_cache
+        self.json_codec = json_codec or default_json_codec()
+        self.hedge_policy = hedge_policy
+
+        # build retry handling once per client
+        self._retrying = self.retry_policy.build_retrying()
+
+        # build default headers once, for authorization and content type
+        self.default_headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        if not keep_alive:
+            self.default_headers["Connection"] = "close"
+
+        # set up a pooled session to reuse connections across calls (retries are handled by tenacity, not urllib3)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+                              max_retries=0)
+        if cassette:
+            adapter = cassette.wrap_adapter(adapter)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # we authenticate with a bearer token, so refuse cookies to keep the shared session stateless across threads
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        # hedged requests (and the requests they duplicate) are sent from worker threads, so the caller can take
+        # whichever responds first
+        self._hedge_executor = ThreadPoolExecutor(max_workers=2 * pool_maxsize, thread_name_prefix="ocs-hedge") \
+            if hedge_policy else None
+
+    def close(self):
+        """
+        Close the client's pooled connections.
+        """
+
+        if self._hedge_executor:
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @staticmethod
     def retry_decorator(func):
@@ -45,9 +398,9 @@ class OCSAPIClient:
 
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            bound_func = partial(func, self)
-            return retry(stop=stop_after_attempt(self.num_retries),
-                         wait=wait_fixed(self.retry_wait_seconds))(bound_func)(*args, **kwargs)
+            # copy the prebuilt retrying object so that concurrent calls keep separate attempt state
+            with _call_deadline(self.deadline_seconds):
+                return self._retrying.copy()(func, self, *args, **kwargs)
         return wrapper
 
     @retry_decorator
@@ -72,7 +425,8 @@ class OCSAPIClient:
         if messages:
             payload["messages"] = messages
 
-        return self._execute_request("creating experiment session", "POST", url, json=payload)
+        return self._execute_request("creating experiment session", "POST", url, json=payload,
+                                     endpoint="session_create", experiment_id=experiment_id)
 
     @retry_decorator
     def retrieve_experiment_session(self, session_id):
@@ -87,7 +441,8 @@ class OCSAPIClient:
         """
 
         url = f"{self.base_url}/api/sessions/{session_id}/"
-        return self._execute_request("retrieving experiment session", "GET", url)
+        return self._execute_request("retrieving experiment session", "GET", url,
+                                     endpoint="session_retrieve")
 
     @retry_decorator
     def send_new_api_message(self, experiment_id, message, session_id=None):
@@ -110,18 +465,22 @@ class OCSAPIClient:
         if session_id:
             payload["session"] = session_id
 
-        return self._execute_request("sending new message via API", "POST", url, json=payload)
+        return self._execute_request("sending new message via API", "POST", url, json=payload,
+                                     endpoint="new_api_message", experiment_id=experiment_id)
 
     @retry_decorator
-    def list_experiments(self, cursor=None):
+    def list_experiments(self, cursor=None, item_callback=None):
         """
         List all experiments.
 
         Args:
             cursor (str, optional): The pagination cursor value. Defaults to None.
+            item_callback (function, optional): A function to receive each experiment as soon as it has
+              been parsed, rather than after the whole page; receives the experiment's index within the page and the
+              experiment. Requires ijson. Defaults to None.
 
         Returns:
-            dict: The response from the server as a JSON object.
+            dict: The response from the server as a JSON object (without "results" if item_callback is given).
         """
 
         url = f"{self.base_url}/api/experiments/"
@@ -129,7 +488,8 @@ class OCSAPIClient:
         if cursor:
             params["cursor"] = cursor
 
-        return self._execute_request("listing experiments", "GET", url, params=params)
+        return self._execute_request("listing experiments", "GET", url, params=params,
+                                     endpoint="experiment_list", stream_handler=_page_stream_handler(item_callback))
 
     @retry_decorator
     def retrieve_experiment(self, experiment_id):
@@ -145,9 +505,9 @@ class OCSAPIClient:
 
         url = f"{self.base_url}/api/experiments/{experiment_id}/"
 
-        return self._execute_request("retrieving experiment", "GET", url)
+        return self._execute_request("retrieving experiment", "GET", url,
+                                     endpoint="experiment_retrieve", experiment_id=experiment_id)
 
-    @retry_decorator
     def download_file_content(self, file_id):
         """
         Download file content by its ID.
@@ -159,9 +519,77 @@ class OCSAPIClient:
             bytes: The content of the file.
         """
 
+        buffer = io.BytesIO()
+        self._download_file(file_id, buffer, {"written": 0}, 64 * 1024, None)
+        return buffer.getvalue()
+
+    def save_file_content(self, file_id, destination, chunk_size=1024 * 1024, resume=True, progress_callback=None):
+        """
+        Download file content by its ID, streaming it to a file or writable buffer.
+
+        Content is written chunk by chunk, so memory use stays bounded regardless of file size. If the download is
+        interrupted, retries pick up where it left off (using an HTTP Range request).
+
+        Args:
+            file_id (int): The ID of the file to download.
+            destination (str | os.PathLike | BinaryIO): The path to save to, or a writable binary buffer.
+            chunk_size (int): The number of bytes to read and write at a time. Defaults to 1 MiB.
+            resume (bool): Whether to resume into an existing file at the destination path (rather than overwriting
+              it), e.g. after an earlier run was interrupted. Only applies when destination is a path. Defaults to
+              True.
+            progress_callback (function): A callback function to report progress; receives the number of bytes
+              downloaded so far and the total size in bytes (or None if unknown). Defaults to None.
+
+        Returns:
+            int: The number of bytes in the file (for a path) or written to the buffer.
+        """
+
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, "ab" if resume else "wb") as file:
+                file.seek(0, os.SEEK_END)
+                return self._download_file(file_id, file, {"written": file.tell()}, chunk_size, progress_callback)
+        return self._download_file(file_id, destination, {"written": 0}, chunk_size, progress_callback)
+
+    @retry_decorator
+    def _download_file(self, file_id, file, state, chunk_size, progress_callback):
+        """
+        Make one attempt to stream file content, resuming after any bytes already written.
+
+        Args:
+            file_id (int): The ID of the file to download.
+            file (BinaryIO): The writable binary file or buffer to write to.
+            state (dict): Download state shared across attempts, with the number of bytes already written under
+              "written".
+            chunk_size (int): The number of bytes to read and write at a time.
+            progress_callback (function): A callback function to report progress (or None).
+
+        Returns:
+            int: The number of bytes written in total.
+        """
+
         url = f"{self.base_url}/api/files/{file_id}/content"
+        offset = state["written"]
+        headers = self.default_headers
+        if offset:
+            headers = {**headers, "Range": f"bytes={offset}-"}
 
-        return self._execute_request("downloading file content", "GET", url)
+        def write_chunks(response):
+            with response:
+                if _download_complete(response.status_code, response.headers, offset):
+                    return offset
+                if response.status_code >= 400:
+                    _raise_for_status(response.status_code, response.content, response.headers)
+                skip, total = _download_range(response.status_code, response.headers, offset)
+                for chunk in response.iter_content(chunk_size):
+                    state["written"] += _write_chunk(file, chunk, skip)
+                    skip = max(0, skip - len(chunk))
+                    if progress_callback:
+                        progress_callback(state["written"], total)
+                _check_download_size(state["written"], total)
+                return state["written"]
+
+        return self._execute_request("downloading file content", "GET", url, headers=headers,
+                                     endpoint="file_content", stream_handler=write_chunks)
 
     @retry_decorator
     def chat_completions(self, experiment_id, messages):
@@ -181,7 +609,8 @@ class OCSAPIClient:
             "messages": messages
         }
 
-        return self._execute_request("sending messages for chat completions", "POST", url, json=payload)
+        return self._execute_request("sending messages for chat completions", "POST", url, json=payload,
+                                     endpoint="openai_chat_completions", experiment_id=experiment_id)
 
     @retry_decorator
     def update_participant_data(self, participant_data):
@@ -196,19 +625,23 @@ class OCSAPIClient:
         """
 
         url = f"{self.base_url}/api/participants/"
-        return self._execute_request("upserting participant data", "POST", url, json=participant_data)
+        return self._execute_request("upserting participant data", "POST", url, json=participant_data,
+                                     endpoint="update_participant_data")
 
     @retry_decorator
-    def list_experiment_sessions(self, cursor=None, ordering=None):
+    def list_experiment_sessions(self, cursor=None, ordering=None, item_callback=None):
         """
         List all experiment sessions.
 
         Args:
             cursor (str, optional): The pagination cursor value. Defaults to None.
             ordering (str, optional): The field to use when ordering the results. Defaults to None.
+            item_callback (function, optional): A function to receive each session as soon as it has been
+              parsed, rather than after the whole page; receives the session's index within the page and the
+              session. Requires ijson. Defaults to None.
 
         Returns:
-            dict: The response from the server as a JSON object.
+            dict: The response from the server as a JSON object (without "results" if item_callback is given).
         """
 
         url = f"{self.base_url}/api/sessions/"
@@ -218,11 +651,265 @@ class OCSAPIClient:
         if ordering:
             params["ordering"] = ordering
     
-        return self._execute_request("listing experiment sessions", "GET", url, params=params)
+        return self._execute_request("listing experiment sessions", "GET", url, params=params,
+                                     endpoint="session_list", stream_handler=_page_stream_handler(item_callback))
+
+    def retrieve_experiment_sessions(self, session_ids: Iterable[str], max_concurrency: int = 8) -> Iterator[dict]:
+        """
+        Retrieve many experiment sessions (with their messages) in parallel, yielding each as it arrives.
+
+        Each session is retrieved with retrieve_experiment_session(), including retries. Failures are reported per
+        session rather than raised, so one bad ID doesn't stop the rest. If the caller stops iterating early,
+        retrievals that haven't started are cancelled.
+
+        Args:
+            session_ids (Iterable[str]): The IDs of the sessions to retrieve.
+            max_concurrency (int): The maximum number of sessions to retrieve at once. Keep this at or below the
+              connection pool size. Defaults to 8.
+
+        Yields:
+            dict: A dictionary for each session ID, in completion order, with the following keys: "session_id",
+            "session" (the session as a JSON object, or None on error), "error" (the exception raised, or None).
+        """
+
+        def retrieve(session_id: str) -> dict:
+            try:
+                return {"session_id": session_id, "session": self.retrieve_experiment_session(session_id),
+                        "error": None}
+            except Exception as e:
+                return {"session_id": session_id, "session": None, "error": e}
+
+        session_ids = iter(session_ids)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ocs-retrieve")
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                # keep up to max_concurrency retrievals going
+                while not exhausted and len(pending) < max_concurrency:
+                    try:
+                        pending.add(executor.submit(contextvars.copy_context().run, retrieve, next(session_ids)))
+                    except StopIteration:
+                        exhausted = True
+                if not pending:
+                    return
+
+                # yield whatever's done
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_experiments(self, prefetch: bool = True, incremental: bool = False) -> Iterator[dict]:
+        """
+        Iterate over all experiments, following pagination cursors automatically.
+
+        Args:
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+              Defaults to True.
+            incremental (bool): Whether to parse pages incrementally in the background, yielding each experiment as
+              soon as it arrives (always prefetching). Requires ijson. Defaults to False.
+
+        Yields:
+            dict: Each experiment, as a JSON object.
+        """
+
+        if incremental:
+            yield from self._iter_pages_incrementally(self.list_experiments)
+        else:
+            yield from self._iter_pages(self.list_experiments, prefetch)
+
+    def iter_experiment_sessions(self, ordering=None, prefetch: bool = True,
+                                 incremental: bool = False) -> Iterator[dict]:
+        """
+        Iterate over all experiment sessions, following pagination cursors automatically.
+
+        Args:
+            ordering (str, optional): The field to use when ordering the results. Defaults to None.
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+              Defaults to True.
+            incremental (bool): Whether to parse pages incrementally in the background, yielding each session as
+              soon as it arrives (always prefetching). Useful for large pages of long transcripts. Requires ijson.
+              Defaults to False.
+
+        Yields:
+            dict: Each experiment session, as a JSON object.
+        """
+
+        if incremental:
+            yield from self._iter_pages_incrementally(self.list_experiment_sessions, ordering=ordering)
+        else:
+            yield from self._iter_pages(self.list_experiment_sessions, prefetch, ordering=ordering)
+
+    @staticmethod
+    def _iter_pages(list_func: callable, prefetch: bool, **kwargs) -> Iterator[dict]:
+        """
+        Iterate over the results of a paginated list method, following cursors and (optionally) prefetching.
+
+        If the caller stops iterating early, any page being prefetched is abandoned.
+
+        Args:
+            list_func (callable): The list method to call, accepting a cursor keyword argument.
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+            **kwargs: Any other arguments to pass to the list method.
+
+        Yields:
+            dict: Each result, as a JSON object.
+        """
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocs-prefetch") if prefetch else None
+        try:
+            page = list_func(cursor=None, **kwargs)
+            while True:
+                # start fetching the next page (if any) before handing out this one
+                cursor = _next_cursor(page)
+                next_page_future = executor.submit(contextvars.copy_context().run, list_func, cursor=cursor, **kwargs) \
+                    if cursor and executor else None
+                yield from page.get("results", [])
+                if not cursor:
+                    return
+                page = next_page_future.result() if next_page_future else list_func(cursor=cursor, **kwargs)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _iter_pages_incrementally(list_func: callable, **kwargs) -> Iterator[dict]:
+        """
+        Iterate over the results of a paginated list method, following cursors in a background thread that parses
+        each page incrementally.
+
+        If the caller stops iterating early, the background thread stops after the page it's on.
+
+        Args:
+            list_func (callable): The list method to call, accepting cursor and item_callback keyword arguments.
+            **kwargs: Any other arguments to pass to the list method.
+
+        Yields:
+            dict: Each result, as a JSON object.
+        """
+
+        entries = queue.Queue(maxsize=_INCREMENTAL_QUEUE_SIZE)
+        stop = threading.Event()
+
+        def put(entry):
+            # hand an entry to the caller, giving up if they've stopped iterating
+            while not stop.is_set():
+                try:
+                    entries.put(entry, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def fetch_pages():
+            try:
+                cursor = None
+                while not stop.is_set():
+                    delivered = 0
+
+                    def item_callback(index, item):
+                        # skip results already handed out before a retry
+                        nonlocal delivered
+                        if index == delivered:
+                            put(("result", item))
+                            delivered += 1
+
+                    page = list_func(cursor=cursor, item_callback=item_callback, **kwargs)
+                    cursor = _next_cursor(page)
+                    if not cursor:
+                        break
+                put(("done", None))
+            except Exception as e:
+                put(("error", e))
+
+        threading.Thread(target=contextvars.copy_context().run, args=(fetch_pages,), name="ocs-incremental",
+                         daemon=True).start()
+        try:
+            while True:
+                kind, value = entries.get()
+                if kind == "result":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            stop.set()
+
+    def _get(self, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]], endpoint: Optional[str],
+             timeout: tuple[float, float], stream: bool = False) -> requests.Response:
+        """
+        Send a GET request, hedging it with a duplicate if it's slow to respond (when hedging is enabled).
+
+        The first response with a status that isn't worth retrying (i.e., not 429 or 5xx) wins. The other request
+        can't be interrupted once it's been sent, so it's abandoned rather than cancelled: it runs to completion in
+        the background, and its response is closed (returning its connection to the pool) when it arrives.
+
+        Args:
+            url (str): The URL to send the request to.
+            headers (Dict[str, str]): HTTP headers to include in the request.
+            params (Optional[Dict[str, Any]]): Query parameters for the request.
+            endpoint (Optional[str]): The endpoint's operation ID in ocs-api-schema.yaml.
+            timeout (tuple[float, float]): The connect and read timeouts in seconds.
+            stream (bool): Whether to stream the response content (streamed requests aren't hedged). Defaults to
+              False.
+
+        Returns:
+            requests.Response: The winning response (or, if neither request got one, a 429 or 5xx response).
+        """
+
+        def send():
+            send_start = time.monotonic()
+            send_response = self.session.get(url, headers=headers, params=params, timeout=timeout, stream=stream)
+            if self.hedge_policy:
+                self.hedge_policy.record_latency(endpoint, time.monotonic() - send_start)
+            return send_response
+
+        hedge_delay = self.hedge_policy.hedge_delay(endpoint) if self.hedge_policy and not stream else None
+        if hedge_delay is None:
+            return send()
+
+        # wait for the original request up to the hedge delay, then race it against a duplicate
+        original = self._hedge_executor.submit(contextvars.copy_context().run, send)
+        done, _ = wait([original], timeout=hedge_delay)
+        if done or not self.hedge_policy.try_hedge():
+            return original.result()
+        hedge = self._hedge_executor.submit(contextvars.copy_context().run, send)
+        pending = {original, hedge}
+        fallback = None
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if _retryable_status(future.result().status_code):
+                    # keep waiting for the other request, but fall back on this response if it does no better
+                    if fallback is None:
+                        fallback = future
+                    else:
+                        future.result().close()
+                    continue
+
+                # abandon the other request (which only stops it if it hasn't started yet), closing its response
+                # when it arrives
+                for loser in (original, hedge):
+                    if loser is not future:
+                        loser.cancel()
+                        loser.add_done_callback(_close_abandoned_response)
+                if future is hedge:
+                    self.hedge_policy.record_hedge_won()
+                return future.result()
+        if fallback is not None:
+            return fallback.result()
+        raise error
 
     def _execute_request(self, action: str, method: str, url: str, headers: Dict[str, str] = None, 
                          params: Optional[Dict[str, Any]] = None, 
-                         json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                         json: Optional[Dict[str, Any]] = None, endpoint: str = None,
+                         experiment_id: str = None, stream_handler=None, use_cached: bool = True) -> Any:
         """
         Execute an HTTP request with default headers plus logging and exceptions for error statuses.
     
@@ -230,38 +917,1160 @@ class OCSAPIClient:
             action (str): Description of the action being performed (e.g., "listing experiment sessions").
             method (str): HTTP method to use ("GET" or "POST").
             url (str): The URL to send the request to.
-            headers (Dict[str, str]): HTTP headers to include in the request.
+            headers (Dict[str, str]): HTTP headers to include in the request. Defaults to the client's default
+              headers.
             params (Optional[Dict[str, Any]], optional): Query parameters for the request. Defaults to None.
             json (Optional[Dict[str, Any]], optional): JSON payload for the request. Defaults to None.
+            endpoint (str, optional): The endpoint's operation ID in ocs-api-schema.yaml (e.g., "session_list"), for
+              flow control and caching. Defaults to None.
+            experiment_id (str, optional): The ID of the experiment the request is for (if any), for flow control.
+              Defaults to None.
+            stream_handler (function, optional): A function to stream and consume the response (including checking
+              its status) in place of parsing it as JSON; its return value is returned. Defaults to None.
+            use_cached (bool): Whether to serve (or conditionally revalidate) any cached response; if False, the
+              request is sent unconditionally, though its response is still cached. Defaults to True.
     
         Returns:
-            Dict[str, Any]: The response from the server as a JSON object.
+            Any: The response from the server as a JSON object (or the stream handler's return value).
     
         Raises:
-            Exception: If the request fails.
+            OCSAPIError: If the request fails (with a subclass indicating the kind of failure).
         """
     
-        # default headers for authorization and content type
+        # use default headers (built once per client) unless overridden
         if headers is None:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            headers = self.default_headers
+
+        # serve fresh cached responses from memory, and revalidate stale ones with a conditional request
+        unconditional_headers = headers
+        cache_key = None
+        if self.response_cache and method == "GET" and stream_handler is None and self.response_cache.caches(endpoint):
+            cache_key = self.response_cache.make_key(endpoint, url, params)
+            cached, conditional_headers = self.response_cache.lookup(cache_key) if use_cached else (None, None)
+            if cached is not None:
+                return cached
+            if conditional_headers:
+                headers = {**headers, **conditional_headers}
     
+        # hold back while the circuit breaker is open (or fail fast), then wait for our turn under any rate and
+        # concurrency limits, for no longer than the current deadline (if any) allows
+        permit = None
+        if self.circuit_breaker:
+            permit = self.circuit_breaker.acquire(_wait_budget_seconds())
+            if permit is None:
+                _raise_if_deadline_passed(f"waiting for the circuit breaker; not {action}")
+                raise OCSCircuitOpenError(f"Circuit breaker open; not {action}")
+        try:
+            if self.rate_limiter and self.rate_limiter.acquire(endpoint, experiment_id,
+                                                               _wait_budget_seconds()) is None:
+                raise OCSDeadlineExceededError(f"Deadline exceeded waiting for the rate limit; not {action}")
+            if self.concurrency_limiter and not self.concurrency_limiter.acquire(_wait_budget_seconds()):
+                raise OCSDeadlineExceededError(f"Deadline exceeded waiting for a concurrency slot; not {action}")
+        except OCSDeadlineExceededError:
+            if permit:
+                self.circuit_breaker.release(permit, "cancelled")
+            raise
+
         response = None
+        outcome = "error"
+        start_time = time.monotonic()
+        deadline_clipped = False
         try:
-            if method == "GET":
-                response = requests.get(url, headers=headers, params=params, timeout=self.timeout_seconds)
-            elif method == "POST":
-                response = requests.post(url, headers=headers, json=json, timeout=self.timeout_seconds)
+            try:
+                # fit this attempt's timeouts within what's left of the deadline (if any)
+                connect_timeout, read_timeout, deadline_clipped = _attempt_timeouts(self.connect_timeout_seconds,
+                                                                                   self.timeout_seconds)
+                timeout = (connect_timeout, read_timeout)
+                if method == "GET":
+                    response = self._get(url, headers, params, endpoint, timeout, stream=stream_handler is not None)
+                elif method == "POST":
+                    body = None if json is None else self.json_codec.dumps(json)
+                    response = self.session.post(url, headers=headers, data=body, timeout=timeout)
+                else:
+                    raise ValueError(f"Unsupported method: {method}")
+                if stream_handler is not None:
+                    result = stream_handler(response)
+                    outcome = "success"
+                    return result
+            except requests.Timeout as e:
+                if deadline_clipped:
+                    raise OCSDeadlineExceededError(f"Deadline exceeded: {e}") from e
+                raise OCSTimeoutError(f"Request timed out: {e}") from e
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                raise OCSConnectionError(f"Connection failed: {e}") from e
+
+            # reuse the cached response if the server says it hasn't changed (if it was evicted in the meantime,
+            # we'll fetch it again unconditionally, below, once we've released our limits)
+            if cache_key is not None and response.status_code == 304:
+                result = self.response_cache.not_modified(cache_key)
+                outcome = "success"
+                if result is not None:
+                    return result
             else:
-                raise ValueError(f"Unsupported method: {method}")
-    
-            response.raise_for_status()
-            return response.json()
+                _raise_for_status(response.status_code, response.content, response.headers)
+                result = self.json_codec.loads(response.content)
+                if cache_key is not None:
+                    self.response_cache.store(cache_key, result, response.headers)
+                outcome = "success"
+                return result
         except Exception as e:
-            if response and response.status_code < 500:
+            if isinstance(e, _OVERLOAD_ERRORS):
+                outcome = "overload"
+            # (a partly-streamed response has no content to log)
+            if response is not None and response.status_code < 500 and (stream_handler is None
+                                                                         or response.status_code >= 400):
                 logging.warning(f"Error {action}: {e}; response content: {response.content}")
             else:
                 logging.warning(f"Error {action}: {e}")
             raise
+        finally:
+            # report back to the concurrency limiter and circuit breaker (if any)
+            if self.concurrency_limiter:
+                self.concurrency_limiter.release(time.monotonic() - start_time, outcome)
+            if permit:
+                self.circuit_breaker.release(permit, outcome)
+
+        logging.info(f"Cached response evicted before revalidation; {action} again without conditions")
+        return self._execute_request(action, method, url, unconditional_headers, params, json, endpoint, experiment_id,
+                                     use_cached=False)
+
+
+class AsyncOCSAPIClient:
+    """Open Chat Studio asyncio API client with timeouts, tenacity retries, and a concurrency limit."""
+
+    def __init__(self, api_key: str, base_url: str = "https://chatbots.dimagi.com", timeout_seconds: int = 300,
+                 num_retries: int = 3, retry_wait_seconds: int = 2, max_concurrency: int = 100,
+                 max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry_seconds: float = 5.0, retry_policy: RetryPolicy = None,
+                 rate_limiter: TokenBucketRateLimiter = None,
+                 concurrency_limiter: AdaptiveConcurrencyLimiter = None, circuit_breaker: CircuitBreaker = None,
+                 response_cache: ResponseCache = None, json_codec: JSONCodec = None,
+                 hedge_policy: HedgePolicy = None, connect_timeout_seconds: float = 10.0,
+                 deadline_seconds: float = None, cassette: Cassette = None):
+        """
+        Initialize the asyncio OCS API client.
+
+        Methods mirror those of OCSAPIClient, but are coroutines. All requests share a single pooled connection
+        pool, and at most max_concurrency requests are in flight at once (further requests wait their turn).
+
+        Args:
+            api_key (str): The OCS API key for authentication.
+            base_url (str): The base URL for the API. Defaults to "https://chatbots.dimagi.com".
+            timeout_seconds (int): The timeout in seconds for reading API responses, per attempt. Defaults to 300.
+            num_retries (int): The number of retries for API requests. Defaults to 3.
+            retry_wait_seconds (int): The number of seconds to wait between retries. Defaults to 2.
+            max_concurrency (int): The maximum number of requests in flight at once. Defaults to 100.
+            max_connections (int): The maximum number of open connections in the pool. Defaults to 100.
+            max_keepalive_connections (int): The maximum number of idle connections to keep open. Defaults to 20.
+            keepalive_expiry_seconds (float): How long to keep idle connections open. Defaults to 5.0.
+            retry_policy (RetryPolicy): The policy for retrying failed calls. Defaults to exponential backoff with
+              jitter, starting at retry_wait_seconds, for up to num_retries attempts.
+            rate_limiter (TokenBucketRateLimiter): A limiter to hold each request (including each retry) to
+              per-endpoint, per-experiment rates. Defaults to None (no limit).
+            concurrency_limiter (AdaptiveConcurrencyLimiter): A limiter to adapt the number of requests in flight
+              to observed latency and errors. Defaults to None (no adaptive limit).
+            circuit_breaker (CircuitBreaker): A breaker to hold back (or fail fast) all calls while the service is
+              failing. Defaults to None (no breaker).
+            response_cache (ResponseCache): A cache for GET responses (e.g., experiment metadata), so that repeat
+              lookups are served from memory. Defaults to None (no caching).
+            json_codec (JSONCodec): The codec for encoding requests and decoding responses. Defaults to orjson if
+              it's installed, otherwise the standard library.
+            hedge_policy (HedgePolicy): A policy for duplicating slow idempotent GET requests to cut tail latency.
+              Defaults to None (no hedging).
+            connect_timeout_seconds (float): The timeout in seconds for connecting to the API, per attempt. Defaults
+              to 10.0.
+            deadline_seconds (float): The time allowed for each call, including all retries and waits between them.
+              Within a deadline() block, the earlier deadline applies. Defaults to None (no per-call deadline).
+            cassette (Cassette): A cassette to record all traffic to, or (in replay mode) to serve all responses
+              from instead of the server. Defaults to None (talk to the server as usual).
+        """
+
+        # set parameters
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.cassette = cassette
+        self.num_retries = num_retries
+        self.retry_wait_seconds = retry_wait_seconds
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=num_retries,
+                                                        initial_wait_seconds=retry_wait_seconds)
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breaker = circuit_breaker
+        self.response_cache = response_cache
+        self.json_codec = json_codec or default_json_codec()
+        self.hedge_policy = hedge_policy
+
+        # build retry handling once per client
+        self._retrying = self.retry_policy.build_retrying(use_asyncio=True)
+
+        # build default headers once, for authorization and content type
+        self.default_headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # set up a shared connection pool and a limit on in-flight requests
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                              keepalive_expiry=keepalive_expiry_seconds)
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+        if cassette:
+            transport = cassette.wrap_async_transport(transport)
+        self.client = httpx.AsyncClient(headers=self.default_headers, transport=transport,
+                                        timeout=httpx.Timeout(self.timeout_seconds,
+                                                              connect=self.connect_timeout_seconds))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def aclose(self):
+        """
+        Close the client's pooled connections.
+        """
+
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    @staticmethod
+    def retry_decorator(func):
+        """
+        Decorator for retrying asyncio API calls.
+        """
+
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            # copy the prebuilt retrying object so that concurrent calls keep separate attempt state
+            with _call_deadline(self.deadline_seconds):
+                return await self._retrying.copy()(func, self, *args, **kwargs)
+        return wrapper
+
+    @retry_decorator
+    async def create_experiment_session(self, experiment_id, participant_id, messages=None):
+        """
+        Create a new experiment session.
+
+        Args:
+            experiment_id (str): The ID of the experiment.
+            participant_id (str): The ID of the participant.
+            messages (list): A list of messages to start the session (optional).
+
+        Returns:
+            dict: The response from the server as a JSON object.
+        """
+
+        url = f"{self.base_url}/api/sessions/"
+        payload = {
+            "experiment": experiment_id,
+            "participant": participant_id
+        }
+        if messages:
+            payload["messages"] = messages
+
+        return await self._execute_request("creating experiment session", "POST", url, json=payload,
+                                           endpoint="session_create", experiment_id=experiment_id)
+
+    @retry_decorator
+    async def retrieve_experiment_session(self, session_id):
+        """
+        Retrieve an experiment session by its ID.
+
+        Args:
+            session_id (str): The ID of the session to retrieve.
+
+        Returns:
+            dict: The response from the server as a JSON object.
+        """
+
+        url = f"{self.base_url}/api/sessions/{session_id}/"
+        return await self._execute_request("retrieving experiment session", "GET", url,
+                                           endpoint="session_retrieve")
+
+    @retry_decorator
+    async def send_new_api_message(self, experiment_id, message, session_id=None):
+        """
+        Send a new message to an experiment.
+
+        Args:
+            experiment_id (str): The ID of the experiment.
+            message (str): The message to send.
+            session_id (str, optional): The ID of the session. Defaults to None.
+
+        Returns:
+            dict: The response from the server as a JSON object.
+        """
+
+        url = f"{self.base_url}/channels/api/{experiment_id}/incoming_message"
+        payload = {
+            "message": message
+        }
+        if session_id:
+            payload["session"] = session_id
+
+        return await self._execute_request("sending new message via API", "POST", url, json=payload,
+                                           endpoint="new_api_message", experiment_id=experiment_id)
+
+    @retry_decorator
+    async def list_experiments(self, cursor=None, item_callback=None):
+        """
+        List all experiments.
+
+        Args:
+            cursor (str, optional): The pagination cursor value. Defaults to None.
+            item_callback (function, optional): A coroutine function to receive each experiment as soon as it has
+              been parsed, rather than after the whole page; receives the experiment's index within the page and the
+              experiment. Requires ijson. Defaults to None.
+
+        Returns:
+            dict: The response from the server as a JSON object (without "results" if item_callback is given).
+        """
+
+        url = f"{self.base_url}/api/experiments/"
+        params = {}
+        if cursor:
+            params["cursor"] = cursor
+
+        return await self._execute_request("listing experiments", "GET", url, params=params,
+                                           endpoint="experiment_list",
+                                           stream_handler=_async_page_stream_handler(item_callback))
+
+    @retry_decorator
+    async def retrieve_experiment(self, experiment_id):
+        """
+        Retrieve an experiment by its ID.
+
+        Args:
+            experiment_id (str): The ID of the experiment to retrieve.
+
+        Returns:
+            dict: The response from the server as a JSON object.
+        """
+
+        url = f"{self.base_url}/api/experiments/{experiment_id}/"
+
+        return await self._execute_request("retrieving experiment", "GET", url,
+                                           endpoint="experiment_retrieve", experiment_id=experiment_id)
+
+    async def download_file_content(self, file_id):
+        """
+        Download file content by its ID.
+
+        Args:
+            file_id (int): The ID of the file to download.
+
+        Returns:
+            bytes: The content of the file.
+        """
+
+        buffer = io.BytesIO()
+        await self._download_file(file_id, buffer, {"written": 0}, 64 * 1024, None)
+        return buffer.getvalue()
+
+    async def save_file_content(self, file_id, destination, chunk_size=1024 * 1024, resume=True,
+                                progress_callback=None):
+        """
+        Download file content by its ID, streaming it to a file or writable buffer.
+
+        Content is written chunk by chunk, so memory use stays bounded regardless of file size. If the download is
+        interrupted, retries pick up where it left off (using an HTTP Range request).
+
+        Args:
+            file_id (int): The ID of the file to download.
+            destination (str | os.PathLike | BinaryIO): The path to save to, or a writable binary buffer.
+            chunk_size (int): The number of bytes to read and write at a time. Defaults to 1 MiB.
+            resume (bool): Whether to resume into an existing file at the destination path (rather than overwriting
+              it), e.g. after an earlier run was interrupted. Only applies when destination is a path. Defaults to
+              True.
+            progress_callback (function): A callback function to report progress; receives the number of bytes
+              downloaded so far and the total size in bytes (or None if unknown). Defaults to None.
+
+        Returns:
+            int: The number of bytes in the file (for a path) or written to the buffer.
+        """
+
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, "ab" if resume else "wb") as file:
+                file.seek(0, os.SEEK_END)
+                return await self._download_file(file_id, file, {"written": file.tell()}, chunk_size,
+                                                 progress_callback)
+        return await self._download_file(file_id, destination, {"written": 0}, chunk_size, progress_callback)
+
+    @retry_decorator
+    async def _download_file(self, file_id, file, state, chunk_size, progress_callback):
+        """
+        Make one attempt to stream file content, resuming after any bytes already written.
+
+        Args:
+            file_id (int): The ID of the file to download.
+            file (BinaryIO): The writable binary file or buffer to write to.
+            state (dict): Download state shared across attempts, with the number of bytes already written under
+              "written".
+            chunk_size (int): The number of bytes to read and write at a time.
+            progress_callback (function): A callback function to report progress (or None).
+
+        Returns:
+            int: The number of bytes written in total.
+        """
+
+        url = f"{self.base_url}/api/files/{file_id}/content"
+        offset = state["written"]
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
+        async def write_chunks(response):
+            try:
+                if _download_complete(response.status_code, response.headers, offset):
+                    return offset
+                if response.status_code >= 400:
+                    await response.aread()
+                    _raise_for_status(response.status_code, response.content, response.headers)
+                skip, total = _download_range(response.status_code, response.headers, offset)
+                async for chunk in response.aiter_bytes(chunk_size):
+                    state["written"] += _write_chunk(file, chunk, skip)
+                    skip = max(0, skip - len(chunk))
+                    if progress_callback:
+                        progress_callback(state["written"], total)
+                _check_download_size(state["written"], total)
+                return state["written"]
+            finally:
+                await response.aclose()
+
+        return await self._execute_request("downloading file content", "GET", url, headers=headers,
+                                           endpoint="file_content", stream_handler=write_chunks)
+
+    @retry_decorator
+    async def chat_completions(self, experiment_id, messages):
+        """
+        Send messages to the experiment and get responses.
+
+        Args:
+            experiment_id (str): The ID of the experiment.
+            messages (list): A list of messages to send.
+
+        Returns:
+            dict: The response from the server as a JSON object.
+        """
+
+        url = f"{self.base_url}/api/openai/{experiment_id}/chat/completions"
+        payload = {
+            "messages": messages
+        }
+
+        return await self._execute_request("sending messages for chat completions", "POST", url, json=payload,
+                                           endpoint="openai_chat_completions", experiment_id=experiment_id)
+
+    @retry_decorator
+    async def update_participant_data(self, participant_data):
+        """
+        Upsert participant data for all specified experiments in the payload.
+
+        Args:
+            participant_data (dict): The participant data to upsert.
+
+        Returns:
+            None
+        """
+
+        url = f"{self.base_url}/api/participants/"
+        return await self._execute_request("upserting participant data", "POST", url, json=participant_data,
+                                           endpoint="update_participant_data")
+
+    @retry_decorator
+    async def list_experiment_sessions(self, cursor=None, ordering=None, item_callback=None):
+        """
+        List all experiment sessions.
+
+        Args:
+            cursor (str, optional): The pagination cursor value. Defaults to None.
+            ordering (str, optional): The field to use when ordering the results. Defaults to None.
+            item_callback (function, optional): A coroutine function to receive each session as soon as it has been
+              parsed, rather than after the whole page; receives the session's index within the page and the
+              session. Requires ijson. Defaults to None.
+
+        Returns:
+            dict: The response from the server as a JSON object (without "results" if item_callback is given).
+        """
+
+        url = f"{self.base_url}/api/sessions/"
+        params = {}
+        if cursor:
+            params["cursor"] = cursor
+        if ordering:
+            params["ordering"] = ordering
+
+        return await self._execute_request("listing experiment sessions", "GET", url, params=params,
+                                           endpoint="session_list",
+                                           stream_handler=_async_page_stream_handler(item_callback))
+
+    async def retrieve_experiment_sessions(self, session_ids: Iterable[str],
+                                           max_concurrency: int = 8) -> AsyncIterator[dict]:
+        """
+        Retrieve many experiment sessions (with their messages) concurrently, yielding each as it arrives.
+
+        Each session is retrieved with retrieve_experiment_session(), including retries. Failures are reported per
+        session rather than raised, so one bad ID doesn't stop the rest. If the caller stops iterating early,
+        outstanding retrievals are cancelled.
+
+        Args:
+            session_ids (Iterable[str]): The IDs of the sessions to retrieve.
+            max_concurrency (int): The maximum number of sessions to retrieve at once (within the client's overall
+              concurrency limit). Defaults to 8.
+
+        Yields:
+            dict: A dictionary for each session ID, in completion order, with the following keys: "session_id",
+            "session" (the session as a JSON object, or None on error), "error" (the exception raised, or None).
+        """
+
+        async def retrieve(session_id: str) -> dict:
+            try:
+                return {"session_id": session_id, "session": await self.retrieve_experiment_session(session_id),
+                        "error": None}
+            except Exception as e:
+                return {"session_id": session_id, "session": None, "error": e}
+
+        session_ids = iter(session_ids)
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                # keep up to max_concurrency retrievals going
+                while not exhausted and len(pending) < max_concurrency:
+                    try:
+                        pending.add(asyncio.create_task(retrieve(next(session_ids))))
+                    except StopIteration:
+                        exhausted = True
+                if not pending:
+                    return
+
+                # yield whatever's done
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_experiments(self, prefetch: bool = True, incremental: bool = False) -> AsyncIterator[dict]:
+        """
+        Iterate over all experiments, following pagination cursors automatically.
+
+        Args:
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+              Defaults to True.
+            incremental (bool): Whether to parse pages incrementally in the background, yielding each experiment as
+              soon as it arrives (always prefetching). Requires ijson. Defaults to False.
+
+        Yields:
+            dict: Each experiment, as a JSON object.
+        """
+
+        if incremental:
+            results = self._iter_pages_incrementally(self.list_experiments)
+        else:
+            results = self._iter_pages(self.list_experiments, prefetch)
+        async for result in results:
+            yield result
+
+    async def iter_experiment_sessions(self, ordering=None, prefetch: bool = True,
+                                       incremental: bool = False) -> AsyncIterator[dict]:
+        """
+        Iterate over all experiment sessions, following pagination cursors automatically.
+
+        Args:
+            ordering (str, optional): The field to use when ordering the results. Defaults to None.
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+              Defaults to True.
+            incremental (bool): Whether to parse pages incrementally in the background, yielding each session as
+              soon as it arrives (always prefetching). Useful for large pages of long transcripts. Requires ijson.
+              Defaults to False.
+
+        Yields:
+            dict: Each experiment session, as a JSON object.
+        """
+
+        if incremental:
+            results = self._iter_pages_incrementally(self.list_experiment_sessions, ordering=ordering)
+        else:
+            results = self._iter_pages(self.list_experiment_sessions, prefetch, ordering=ordering)
+        async for result in results:
+            yield result
+
+    @staticmethod
+    async def _iter_pages(list_func: callable, prefetch: bool, **kwargs) -> AsyncIterator[dict]:
+        """
+        Iterate over the results of a paginated list method, following cursors and (optionally) prefetching.
+
+        If the caller stops iterating early, any page being prefetched is cancelled.
+
+        Args:
+            list_func (callable): The list coroutine to call, accepting a cursor keyword argument.
+            prefetch (bool): Whether to fetch the next page in the background while the current one is processed.
+            **kwargs: Any other arguments to pass to the list coroutine.
+
+        Yields:
+            dict: Each result, as a JSON object.
+        """
+
+        next_page_task = None
+        try:
+            page = await list_func(cursor=None, **kwargs)
+            while True:
+                # start fetching the next page (if any) before handing out this one
+                cursor = _next_cursor(page)
+                if cursor and prefetch:
+                    next_page_task = asyncio.create_task(list_func(cursor=cursor, **kwargs))
+                for result in page.get("results", []):
+                    yield result
+                if not cursor:
+                    return
+                page = await next_page_task if next_page_task else await list_func(cursor=cursor, **kwargs)
+                next_page_task = None
+        finally:
+            if next_page_task and not next_page_task.done():
+                next_page_task.cancel()
+
+    @staticmethod
+    async def _iter_pages_incrementally(list_func: callable, **kwargs) -> AsyncIterator[dict]:
+        """
+        Iterate over the results of a paginated list method, following cursors in a background task that parses
+        each page incrementally.
+
+        If the caller stops iterating early, the background task is cancelled.
+
+        Args:
+            list_func (callable): The list coroutine to call, accepting cursor and item_callback keyword arguments.
+            **kwargs: Any other arguments to pass to the list coroutine.
+
+        Yields:
+            dict: Each result, as a JSON object.
+        """
+
+        entries = asyncio.Queue(maxsize=_INCREMENTAL_QUEUE_SIZE)
+
+        async def fetch_pages():
+            try:
+                cursor = None
+                while True:
+                    delivered = 0
+
+                    async def item_callback(index, item):
+                        # skip results already handed out before a retry
+                        nonlocal delivered
+                        if index == delivered:
+                            await entries.put(("result", item))
+                            delivered += 1
+
+                    page = await list_func(cursor=cursor, item_callback=item_callback, **kwargs)
+                    cursor = _next_cursor(page)
+                    if not cursor:
+                        break
+                await entries.put(("done", None))
+            except Exception as e:
+                await entries.put(("error", e))
+
+        fetch_task = asyncio.create_task(fetch_pages())
+        try:
+            while True:
+                kind, value = await entries.get()
+                if kind == "result":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            fetch_task.cancel()
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]], params: Optional[Dict[str, Any]],
+                   endpoint: Optional[str], timeout: httpx.Timeout) -> httpx.Response:
+        """
+        Send a GET request, hedging it with a duplicate if it's slow to respond (when hedging is enabled).
+
+        Args:
+            url (str): The URL to send the request to.
+            headers (Optional[Dict[str, str]]): HTTP headers to add to the client's defaults.
+            params (Optional[Dict[str, Any]]): Query parameters for the request.
+            endpoint (Optional[str]): The endpoint's operation ID in ocs-api-schema.yaml.
+            timeout (httpx.Timeout): The timeouts for the request.
+
+        Returns:
+            httpx.Response: The first response with a status that isn't worth retrying (i.e., not 429 or 5xx), or,
+            if neither request got one, a 429 or 5xx response. The other request is cancelled.
+        """
+
+        async def send():
+            send_start = time.monotonic()
+            send_response = await self.client.get(url, headers=headers, params=params, timeout=timeout)
+            if self.hedge_policy:
+                self.hedge_policy.record_latency(endpoint, time.monotonic() - send_start)
+            return send_response
+
+        hedge_delay = self.hedge_policy.hedge_delay(endpoint) if self.hedge_policy else None
+        if hedge_delay is None:
+            return await send()
+
+        # wait for the original request up to the hedge delay, then race it against a duplicate (cancelling
+        # whichever loses)
+        original = asyncio.create_task(send())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({original}, timeout=hedge_delay)
+            if done or not self.hedge_policy.try_hedge():
+                return await original
+            hedge = asyncio.create_task(send())
+            pending = {original, hedge}
+            fallback = None
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if _retryable_status(task.result().status_code):
+                        # keep waiting for the other request, but fall back on this response if it does no better
+                        if fallback is None:
+                            fallback = task
+                        else:
+                            await task.result().aclose()
+                        continue
+                    if fallback is not None:
+                        await fallback.result().aclose()
+                    if task is hedge:
+                        self.hedge_policy.record_hedge_won()
+                    return task.result()
+            if fallback is not None:
+                return fallback.result()
+            raise error
+        finally:
+            for task in (original, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _execute_request(self, action: str, method: str, url: str, headers: Dict[str, str] = None,
+                               params: Optional[Dict[str, Any]] = None,
+                               json: Optional[Dict[str, Any]] = None, endpoint: str = None,
+                               experiment_id: str = None, stream_handler=None, use_cached: bool = True) -> Any:
+        """
+        Execute an HTTP request (within the concurrency limit) with logging and exceptions for error statuses.
+
+        Args:
+            action (str): Description of the action being performed (e.g., "listing experiment sessions").
+            method (str): HTTP method to use ("GET" or "POST").
+            url (str): The URL to send the request to.
+            headers (Dict[str, str]): HTTP headers to include in the request. Defaults to the client's default
+              headers.
+            params (Optional[Dict[str, Any]], optional): Query parameters for the request. Defaults to None.
+            json (Optional[Dict[str, Any]], optional): JSON payload for the request. Defaults to None.
+            endpoint (str, optional): The endpoint's operation ID in ocs-api-schema.yaml (e.g., "session_list"), for
+              flow control and caching. Defaults to None.
+            experiment_id (str, optional): The ID of the experiment the request is for (if any), for flow control.
+              Defaults to None.
+            stream_handler (function, optional): A coroutine function to stream and consume the response (including
+              checking its status) in place of parsing it as JSON; its return value is returned. Defaults to None.
+            use_cached (bool): Whether to serve (or conditionally revalidate) any cached response; if False, the
+              request is sent unconditionally, though its response is still cached. Defaults to True.
+
+        Returns:
+            Any: The response from the server as a JSON object (or the stream handler's return value).
+
+        Raises:
+            OCSAPIError: If the request fails (with a subclass indicating the kind of failure).
+        """
+
+        # serve fresh cached responses from memory, and revalidate stale ones with a conditional request
+        unconditional_headers = headers
+        cache_key = None
+        if self.response_cache and method == "GET" and stream_handler is None and self.response_cache.caches(endpoint):
+            cache_key = self.response_cache.make_key(endpoint, url, params)
+            cached, conditional_headers = self.response_cache.lookup(cache_key) if use_cached else (None, None)
+            if cached is not None:
+                return cached
+            if conditional_headers:
+                headers = {**(headers or {}), **conditional_headers}
+
+        # hold back while the circuit breaker is open (or fail fast), then wait for our turn under any rate and
+        # concurrency limits (before taking up a concurrency slot), for no longer than the current deadline (if any)
+        # allows
+        permit = None
+        if self.circuit_breaker:
+            permit = await self.circuit_breaker.acquire_async(_wait_budget_seconds())
+            if permit is None:
+                _raise_if_deadline_passed(f"waiting for the circuit breaker; not {action}")
+                raise OCSCircuitOpenError(f"Circuit breaker open; not {action}")
+        try:
+            if self.rate_limiter and await self.rate_limiter.acquire_async(endpoint, experiment_id,
+                                                                           _wait_budget_seconds()) is None:
+                raise OCSDeadlineExceededError(f"Deadline exceeded waiting for the rate limit; not {action}")
+            if self.concurrency_limiter and not await self.concurrency_limiter.acquire_async(
+                    max_wait_seconds=_wait_budget_seconds()):
+                raise OCSDeadlineExceededError(f"Deadline exceeded waiting for a concurrency slot; not {action}")
+        except OCSDeadlineExceededError:
+            if permit:
+                self.circuit_breaker.release(permit, "cancelled")
+            raise
+
+        response = None
+        outcome = "error"
+        start_time = time.monotonic()
+        deadline_clipped = False
+        try:
+            try:
+                async with self._semaphore:
+                    # fit this attempt's timeouts within what's left of the deadline (if any)
+                    connect_timeout, read_timeout, deadline_clipped = _attempt_timeouts(self.connect_timeout_seconds,
+                                                                                       self.timeout_seconds)
+                    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+                    if method == "GET" and stream_handler is not None:
+                        request = self.client.build_request("GET", url, headers=headers, params=params,
+                                                            timeout=timeout,
+                                                            extensions={Cassette.STREAMED_EXTENSION: True})
+                        response = await self.client.send(request, stream=True)
+                        result = await stream_handler(response)
+                        outcome = "success"
+                        return result
+                    elif method == "GET":
+                        response = await self._get(url, headers, params, endpoint, timeout)
+                    elif method == "POST":
+                        body = None if json is None else self.json_codec.dumps(json)
+                        response = await self.client.post(url, headers=headers, content=body, timeout=timeout)
+                    else:
+                        raise ValueError(f"Unsupported method: {method}")
+            except httpx.TimeoutException as e:
+                if deadline_clipped:
+                    raise OCSDeadlineExceededError(f"Deadline exceeded: {e}") from e
+                raise OCSTimeoutError(f"Request timed out: {e}") from e
+            except httpx.TransportError as e:
+                raise OCSConnectionError(f"Connection failed: {e}") from e
+
+            # reuse the cached response if the server says it hasn't changed (if it was evicted in the meantime,
+            # we'll fetch it again unconditionally, below, once we've released our limits)
+            if cache_key is not None and response.status_code == 304:
+                result = self.response_cache.not_modified(cache_key)
+                outcome = "success"
+                if result is not None:
+                    return result
+            else:
+                _raise_for_status(response.status_code, response.content, response.headers)
+                result = self.json_codec.loads(response.content)
+                if cache_key is not None:
+                    self.response_cache.store(cache_key, result, response.headers)
+                outcome = "success"
+                return result
+        except Exception as e:
+            if isinstance(e, _OVERLOAD_ERRORS):
+                outcome = "overload"
+            # (a partly-streamed response has no content to log)
+            if response is not None and response.status_code < 500 and (stream_handler is None
+                                                                         or response.status_code >= 400):
+                logging.warning(f"Error {action}: {e}; response content: {response.content}")
+            else:
+                logging.warning(f"Error {action}: {e}")
+            raise
+        finally:
+            # report back to the concurrency limiter and circuit breaker (if any)
+            if self.concurrency_limiter:
+                self.concurrency_limiter.release(time.monotonic() - start_time, outcome)
+            if permit:
+                self.circuit_breaker.release(permit, outcome)
+
+        logging.info(f"Cached response evicted before revalidation; {action} again without conditions")
+        return await self._execute_request(action, method, url, unconditional_headers, params, json, endpoint,
+                                           experiment_id, use_cached=False)
+
+
+def _next_cursor(page: dict) -> Optional[str]:
+    """
+    Get the cursor for the next page of a paginated list response.
+
+    Args:
+        page (dict): The list response, with a "next" URL (or None on the last page).
+
+    Returns:
+        Optional[str]: The cursor value, or None if there are no more pages.
+    """
+
+    next_url = page.get("next")
+    if not next_url:
+        return None
+    return parse_qs(urlparse(next_url).query).get("cursor", [None])[0]
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value (Optional[str]): The header value, either a number of seconds or an HTTP date.
+
+    Returns:
+        Optional[float]: The number of seconds to wait, or None if the value is missing or invalid.
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _raise_for_status(status_code: int, content: bytes, headers) -> None:
+    """
+    Raise the appropriate OCSHTTPError subclass for an error status.
+
+    Args:
+        status_code (int): The HTTP status code of the response.
+        content (bytes): The raw content of the response.
+        headers: The response headers (a case-insensitive mapping).
+
+    Raises:
+        OCSHTTPError: If the status code indicates an error.
+    """
+
+    if status_code < 400:
+        return
+
+    message = f"HTTP {status_code} error"
+    retry_after = _parse_retry_after(headers.get("Retry-After"))
+    if status_code in (401, 403):
+        error_class = OCSAuthenticationError
+    elif status_code == 404:
+        error_class = OCSNotFoundError
+    elif status_code == 429:
+        error_class = OCSRateLimitError
+    elif status_code < 500:
+        error_class = OCSClientError
+    else:
+        error_class = OCSServerError
+    raise error_class(message, status_code, content, retry_after)
+
+
+def _retryable_status(status_code: int) -> bool:
+    """
+    Determine whether a response's status indicates an error worth retrying (429 or 5xx).
+
+    Args:
+        status_code (int): The HTTP status code of the response.
+
+    Returns:
+        bool: True if the request is worth retrying.
+    """
+
+    return status_code == 429 or status_code >= 500
+
+
+def _download_complete(status_code: int, headers, offset: int) -> bool:
+    """
+    Determine whether a resumed download was already complete (i.e., the server rejected a Range request because
+    there are no more bytes to send).
+
+    Args:
+        status_code (int): The HTTP status code of the response.
+        headers: The response headers (a case-insensitive mapping).
+        offset (int): The number of bytes already downloaded.
+
+    Returns:
+        bool: True if the download is already complete.
+    """
+
+    if status_code != 416 or not offset:
+        return False
+    match = re.fullmatch(r"bytes \*/(\d+)", headers.get("Content-Range", "").strip())
+    return match is not None and int(match.group(1)) == offset
+
+
+def _download_range(status_code: int, headers, offset: int) -> tuple[int, Optional[int]]:
+    """
+    Work out how a (possibly resumed) download response lines up with the bytes already downloaded.
+
+    Args:
+        status_code (int): The HTTP status code of the response.
+        headers: The response headers (a case-insensitive mapping).
+        offset (int): The number of bytes already downloaded.
+
+    Returns:
+        tuple[int, Optional[int]]: The number of leading response bytes to skip (because they were already
+        downloaded) and the total size of the file in bytes (or None if unknown).
+
+    Raises:
+        OCSAPIError: If the server returned a range that doesn't start at or before the offset.
+    """
+
+    if status_code == 206:
+        match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", headers.get("Content-Range", "").strip())
+        if match is None or int(match.group(1)) > offset:
+            raise OCSAPIError(f"Unexpected Content-Range for download resuming at byte {offset}: "
+                              f"{headers.get('Content-Range')}")
+        total = None if match.group(2) == "*" else int(match.group(2))
+        return offset - int(match.group(1)), total
+
+    # the server sent the whole file (e.g., because it doesn't support ranges), so skip what we already have
+    content_length = headers.get("Content-Length")
+    return offset, int(content_length) if content_length and not headers.get("Content-Encoding") else None
+
+
+def _write_chunk(file, chunk: bytes, skip: int) -> int:
+    """
+    Write a downloaded chunk, minus any leading bytes to skip.
+
+    Args:
+        file (BinaryIO): The writable binary file or buffer to write to.
+        chunk (bytes): The chunk of content.
+        skip (int): The number of leading bytes still to skip.
+
+    Returns:
+        int: The number of bytes written.
+    """
+
+    if skip >= len(chunk):
+        return 0
+    file.write(chunk[skip:] if skip else chunk)
+    return len(chunk) - skip
+
+
+def _check_download_size(written: int, total: Optional[int]) -> None:
+    """
+    Check that a download received the whole file.
+
+    Args:
+        written (int): The number of bytes downloaded.
+        total (Optional[int]): The total size of the file in bytes (or None if unknown).
+
+    Raises:
+        OCSConnectionError: If fewer bytes were received than expected (so that the download is retried).
+    """
+
+    if total is not None and written < total:
+        raise OCSConnectionError(f"Download ended early: received {written} of {total} bytes")
+
+
+def _close_abandoned_response(future):
+    """
+    Close the response of an abandoned request (if it got one), returning its connection to the pool.
+
+    Args:
+        future (Future): The abandoned request's future.
+    """
+
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _page_stream_handler(item_callback) -> Optional[callable]:
+    """
+    Build a stream handler that parses a list response incrementally, passing each result to a callback.
+
+    Args:
+        item_callback (function): The callback to receive each result's index within the page and the result (or
+          None to parse the page normally).
+
+    Returns:
+        Optional[callable]: The stream handler for _execute_request() (or None if there's no callback).
+    """
+
+    if item_callback is None:
+        return None
+
+    def parse_page(response):
+        with response:
+            if response.status_code >= 400:
+                _raise_for_status(response.status_code, response.content, response.headers)
+            parser = IncrementalPageParser()
+            index = 0
+            for chunk in response.iter_content(_INCREMENTAL_CHUNK_SIZE):
+                for item in parser.feed(chunk):
+                    item_callback(index, item)
+                    index += 1
+            for item in parser.close():
+                item_callback(index, item)
+                index += 1
+            return parser.page
+
+    return parse_page
+
+
+def _async_page_stream_handler(item_callback) -> Optional[callable]:
+    """
+    Build an asyncio stream handler that parses a list response incrementally, passing each result to a callback.
+
+    Args:
+        item_callback (function): The coroutine function to receive each result's index within the page and the
+          result (or None to parse the page normally).
+
+    Returns:
+        Optional[callable]: The stream handler for _execute_request() (or None if there's no callback).
+    """
+
+    if item_callback is None:
+        return None
+
+    async def parse_page(response):
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                _raise_for_status(response.status_code, response.content, response.headers)
+            parser = IncrementalPageParser()
+            index = 0
+            async for chunk in response.aiter_bytes(_INCREMENTAL_CHUNK_SIZE):
+                for item in parser.feed(chunk):
+                    await item_callback(index, item)
+                    index += 1
+            for item in parser.close():
+                await item_callback(index, item)
+                index += 1
+            return parser.page
+        finally:
+            await response.aclose()
+
+    return parse_page
+
+
+def _call_deadline(seconds: Optional[float]):
+    """
+    Get a context manager for a client's per-call deadline (if any).
+
+    Args:
+        seconds (Optional[float]): The time allowed for the call, or None for no per-call deadline.
+
+    Returns:
+        A context manager that applies the deadline.
+    """
+
+    return deadline(seconds) if seconds is not None else nullcontext()
+
+
+def _attempt_timeouts(connect_timeout: float, read_timeout: float) -> tuple[float, float, bool]:
+    """
+    Fit an attempt's timeouts within what's left of the current deadline (if any).
+
+    Args:
+        connect_timeout (float): The client's connect timeout in seconds.
+        read_timeout (float): The client's read timeout in seconds.
+
+    Returns:
+        tuple[float, float, bool]: The connect and read timeouts to use, and whether either was cut short by the
+        deadline (in which case a timeout means the deadline was exceeded).
+
+    Raises:
+        OCSDeadlineExceededError: If the deadline has already passed.
+    """
+
+    remaining = remaining_deadline_seconds()
+    if remaining is None:
+        return connect_timeout, read_timeout, False
+    if remaining <= 0:
+        raise OCSDeadlineExceededError("Deadline passed before the request could be sent")
+    clipped = remaining < max(connect_timeout, read_timeout)
+    return min(connect_timeout, remaining), min(read_timeout, remaining), clipped
@@ -0,0 +1,566 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Throughput benchmarks for the simulation, replay, and query workflows, run against the local mock OCS server.
+
+Run the suite with "python ocs_benchmark.py run --output results.json", then compare two revisions' results with
+"python ocs_benchmark.py compare baseline.json results.json" (which exits with status 1 if it finds regressions).
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from requests.adapters import BaseAdapter
+from ocs_api import OCSAPIClient
+from ocs_simulation_support import OCSBotToBotSimulator, OCSQueryRunner, ConversationReplayer
+from typing import Iterator, Optional
+
+# memory sampling is optional (without psutil, peak RSS is the process-wide peak, where available)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# how peak_rss_mb is measured: per case ("psutil"), the process-wide peak so far ("ru_maxrss"), or not at all (None)
+MEMORY_SOURCE = "psutil" if psutil is not None else "ru_maxrss" if resource is not None else None
+
+
+# the workflows we can benchmark
+WORKLOADS = ("simulations", "replays", "queries")
+
+# the default sweep
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_CONVERSATION_LENGTHS = (5, 20)
+DEFAULT_PAYLOAD_WORDS = (30, 300)
+
+# metrics compared between runs, and whether higher values are better
+COMPARED_METRICS = {
+    "conversations_per_second": True,
+    "requests_per_second": True,
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "peak_rss_mb": False,
+    "cpu_ms_per_request": False
+}
+
+# IDs used against the mock server
+_EXPERIMENT_ID = "benchmark-experiment"
+_USER_EXPERIMENT_ID = "benchmark-user-simulator"
+_PARTICIPANT_ID = "benchmark-participant"
+
+# where to find the mock server
+_MOCK_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocs_mock_server.py")
+
+
+def run_benchmarks(workloads: tuple = WORKLOADS, concurrency_levels: tuple = DEFAULT_CONCURRENCY,
+                   conversation_lengths: tuple = DEFAULT_CONVERSATION_LENGTHS,
+                   payload_words: tuple = DEFAULT_PAYLOAD_WORDS, num_conversations: int = 32,
+                   server_latency: str = "fixed:0", status_callback: callable = None) -> dict:
+    """
+    Run the benchmark suite: each workload at each combination of concurrency, conversation length, and payload size.
+
+    Each case starts a fresh mock OCS server in a separate process (so that its CPU and memory aren't counted against
+    the client) and a fresh OCS API client, then runs the workflow's exec_*() method over num_conversations items.
+    Queries are single-turn, so they ignore conversation length.
+
+    Args:
+        workloads (tuple): The workflows to run: any of "simulations" (OCSBotToBotSimulator.exec_simulations()),
+          "replays" (ConversationReplayer.exec_replays()), and "queries" (OCSQueryRunner.exec_queries()). Defaults to
+          all three.
+        concurrency_levels (tuple): The max_concurrency values to run with. Defaults to (1, 4, 16).
+        conversation_lengths (tuple): The number of exchanges per simulated conversation, and per conversation to
+          replay. Defaults to (5, 20).
+        payload_words (tuple): The number of words per message, in both directions. Defaults to (30, 300).
+        num_conversations (int): The number of simulations, replayed conversations, or queries per case. Defaults
+          to 32.
+        server_latency (str): The mock server's latency distribution, as passed to its --latency option (e.g.,
+          "lognormal:0.05:0.5"). Defaults to "fixed:0" (measure client overhead only).
+        status_callback (callable, optional): A callback to report progress. Defaults to None. Should accept one
+          argument: the result of each case as it completes.
+
+    Returns:
+        dict: A dictionary with the following keys: "metadata" (the revision, platform, settings, and
+        "memory_source", as for MEMORY_SOURCE) and "cases" (a list of case results, as returned by run_case()).
+    """
+
+    if MEMORY_SOURCE != "psutil":
+        measured = "the process-wide peak so far, not each case's own" if MEMORY_SOURCE else "not measured"
+        logging.warning(f"psutil isn't installed (see requirements.txt), so peak_rss_mb is {measured}, and won't be "
+                        f"compared between runs")
+    results = {"metadata": {**run_metadata(num_conversations=num_conversations, server_latency=server_latency),
+                            "memory_source": MEMORY_SOURCE},
+               "cases": []}
+    for workload, concurrency, length, words in itertools.product(workloads, concurrency_levels,
+                                                                  conversation_lengths, payload_words):
+        if workload == "queries" and length != conversation_lengths[0]:
+            # queries are single-turn, so there's nothing to vary
+            continue
+        case = run_case(workload, concurrency, length, words, num_conversations, server_latency)
+        results["cases"].append(case)
+        if status_callback:
+            status_callback(case)
+    return results
+
+
+def run_case(workload: str, concurrency: int, conversation_length: int, payload_words: int,
+             num_conversations: int = 32, server_latency: str = "fixed:0") -> dict:
+    """
+    Run a single benchmark case.
+
+    Args:
+        workload (str): The workflow to run: "simulations", "replays", or "queries".
+        concurrency (int): The max_concurrency to run with.
+        conversation_length (int): The number of exchanges per conversation (ignored for queries).
+        payload_words (int): The number of words per message.
+        num_conversations (int): The number of simulations, replayed conversations, or queries. Defaults to 32.
+        server_latency (str): The mock server's latency distribution, as passed to its --latency option. Defaults to
+          "fixed:0".
+
+    Returns:
+        dict: A dictionary with the following keys: "case" (a key identifying the case across runs), "workload",
+        "concurrency", "conversation_length", "payload_words", "conversations", "requests", "errors",
+        "wall_seconds", "conversations_per_second" (simulations, replayed conversations, or queries completed per
+        second), "requests_per_second", "latency_ms" (HTTP request latency percentiles: "p50", "p95", "p99",
+        "mean", "max"), "peak_rss_mb" (client process), "cpu_seconds" (client process), "cpu_ms_per_request".
+
+    Raises:
+        ValueError: If the workload isn't supported.
+    """
+
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unsupported workload: {workload}")
+
+    words = " ".join(itertools.islice(itertools.cycle(("benchmark", "payload", "text", "for", "the", "mock")),
+                                      payload_words))
+    with _mock_server_process(conversation_length, payload_words, server_latency) as base_url:
+        client = OCSAPIClient("benchmark-key", base_url, timeout_seconds=60, pool_maxsize=max(10, 2 * concurrency))
+        timings = _TimingAdapter(client.session.get_adapter(base_url))
+        client.session.mount("http://", timings)
+        sampler = _MemorySampler()
+        simulator = None
+        try:
+            # build inputs before we start measuring
+            if workload == "simulations":
+                simulator = OCSBotToBotSimulator(client, _EXPERIMENT_ID, _USER_EXPERIMENT_ID, _PARTICIPANT_ID)
+                items = [(f"sim-{i}", f"Simulation {i}: {words}") for i in range(num_conversations)]
+                run = partial(simulator.exec_simulations, items, max_exchanges=conversation_length + 1,
+                              max_concurrency=concurrency)
+            elif workload == "replays":
+                replayer = ConversationReplayer(client, _EXPERIMENT_ID, _PARTICIPANT_ID)
+                items = ConversationReplayer.build_jobs(
+                    _synthetic_export_rows(num_conversations, conversation_length, words))
+                run = partial(replayer.exec_replays, items, max_concurrency=concurrency)
+            else:
+                runner = OCSQueryRunner(client, _EXPERIMENT_ID, _PARTICIPANT_ID)
+                items = [(f"query-{i}", f"Query {i}: {words}") for i in range(num_conversations)]
+                run = partial(runner.exec_queries, items, max_concurrency=concurrency)
+
+            # run the workflow, measuring client time and memory
+            sampler.start()
+            start_cpu = time.process_time()
+            start_time = time.perf_counter()
+            results = run()
+            wall_seconds = time.perf_counter() - start_time
+            cpu_seconds = time.process_time() - start_cpu
+        finally:
+            sampler.stop()
+            if simulator:
+                simulator.close()
+            client.close()
+
+    latencies = timings.latencies()
+    requests = len(latencies)
+    return {
+        "case": case_key(workload, concurrency, conversation_length, payload_words),
+        "workload": workload,
+        "concurrency": concurrency,
+        "conversation_length": conversation_length if workload != "queries" else 1,
+        "payload_words": payload_words,
+        "conversations": num_conversations,
+        "requests": requests,
+        "errors": sum(1 for result in results if _is_error(result)),
+        "wall_seconds": round(wall_seconds, 4),
+        "conversations_per_second": round(num_conversations / wall_seconds, 3),
+        "requests_per_second": round(requests / wall_seconds, 3),
+        "latency_ms": latency_summary(latencies),
+        "peak_rss_mb": sampler.peak_rss_mb(),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "cpu_ms_per_request": round(cpu_seconds * 1000 / requests, 4) if requests else None
+    }
+
+
+def case_key(workload: str, concurrency: int, conversation_length: int, payload_words: int) -> str:
+    """
+    Build the key that identifies a benchmark case across runs.
+
+    Args:
+        workload (str): The workflow.
+        concurrency (int): The max_concurrency.
+        conversation_length (int): The number of exchanges per conversation.
+        payload_words (int): The number of words per message.
+
+    Returns:
+        str: The key (e.g., "simulations/c4/len5/words30").
+    """
+
+    if workload == "queries":
+        conversation_length = 1
+    return f"{workload}/c{concurrency}/len{conversation_length}/words{payload_words}"
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    """
+    Summarize request latencies.
+
+    Args:
+        latencies (list[float]): The latencies, in seconds.
+
+    Returns:
+        dict: A dictionary with the following keys (all in milliseconds, or None without any latencies): "p50",
+        "p95", "p99", "mean", "max".
+    """
+
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(latencies)
+    return {
+        "p50": round(percentile(ordered, 50) * 1000, 3),
+        "p95": round(percentile(ordered, 95) * 1000, 3),
+        "p99": round(percentile(ordered, 99) * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3)
+    }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """
+    Get a percentile of sorted values, interpolating between the nearest ranks.
+
+    Args:
+        ordered (list[float]): The values, sorted in ascending order (must not be empty).
+        pct (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The percentile.
+    """
+
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.1, metrics: dict = None) -> list[dict]:
+    """
+    Compare two benchmark runs, case by case.
+
+    Args:
+        baseline (dict): The baseline results, as returned by run_benchmarks().
+        current (dict): The results to compare against the baseline.
+        threshold (float): The relative change beyond which a worse value counts as a regression (e.g., 0.1 for
+          10%). Defaults to 0.1.
+        metrics (dict): The metrics to compare (dot-separated for nested values), each mapped to whether higher
+          values are better. Defaults to COMPARED_METRICS.
+
+    Returns:
+        list[dict]: A dictionary for each metric of each case present in both runs (in the current run's order),
+        with the following keys: "case", "metric", "baseline", "current", "change" (relative, positive when the
+        value went up), "regression" (True if the change is for the worse and beyond the threshold).
+    """
+
+    baseline_cases = {case["case"]: case for case in baseline["cases"]}
+    comparisons = []
+    for case in current["cases"]:
+        baseline_case = baseline_cases.get(case["case"])
+        if baseline_case is None:
+            continue
+        for metric, higher_is_better in (metrics or COMPARED_METRICS).items():
+            baseline_value = _metric_value(baseline_case, metric)
+            current_value = _metric_value(case, metric)
+            if not baseline_value or current_value is None:
+                continue
+            change = (current_value - baseline_value) / baseline_value
+            worse = change < 0 if higher_is_better else change > 0
+            comparisons.append({"case": case["case"], "metric": metric, "baseline": baseline_value,
+                                "current": current_value, "change": round(change, 4),
+                                "regression": worse and abs(change) > threshold})
+    return comparisons
+
+
+def print_comparisons(comparisons: list[dict], threshold: float) -> int:
+    """
+    Print a comparison of two benchmark runs.
+
+    Args:
+        comparisons (list[dict]): The comparisons, as returned by compare_results().
+        threshold (float): The threshold the comparisons used.
+
+    Returns:
+        int: The number of regressions.
+    """
+
+    regressions = sum(1 for comparison in comparisons if comparison["regression"])
+    for comparison in comparisons:
+        flag = "REGRESSION" if comparison["regression"] else "ok"
+        print(f"{flag:>10}  {comparison['case']}  {comparison['metric']}: {comparison['baseline']} -> "
+              f"{comparison['current']} ({comparison['change']:+.1%})")
+    print(f"{regressions} regression(s) in {len(comparisons)} comparison(s) (threshold {threshold:.0%})")
+    return regressions
+
+
+def load_results(path: str) -> dict:
+    """
+    Load benchmark results from a JSON file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        dict: The results.
+    """
+
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def run_metadata(**settings) -> dict:
+    """
+    Describe the code revision and environment a benchmark run measures.
+
+    Args:
+        **settings: The run's settings, to record with it.
+
+    Returns:
+        dict: A dictionary with the following keys: "revision" (the git commit, if available), "timestamp",
+        "python", "platform", "cpu_count", "settings".
+    """
+
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision, "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "settings": settings}
+
+
+def main():
+    """
+    Run the benchmark suite, or compare two runs, from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, replay, and query workflows against a "
+                                                 "local mock OCS server.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmark suite")
+    run_parser.add_argument("--output", help="file to write JSON results to (default: standard output)")
+    run_parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                            help=f"comma-separated workloads (default: {','.join(WORKLOADS)})")
+    run_parser.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)),
+                            help="comma-separated concurrency levels (default: %(default)s)")
+    run_parser.add_argument("--lengths", default=",".join(map(str, DEFAULT_CONVERSATION_LENGTHS)),
+                            help="comma-separated conversation lengths (default: %(default)s)")
+    run_parser.add_argument("--payload-words", default=",".join(map(str, DEFAULT_PAYLOAD_WORDS)),
+                            help="comma-separated words per message (default: %(default)s)")
+    run_parser.add_argument("--conversations", type=int, default=32,
+                            help="conversations per case (default: %(default)s)")
+    run_parser.add_argument("--server-latency", default="fixed:0",
+                            help="mock server latency distribution (default: %(default)s)")
+    compare_parser = subparsers.add_parser("compare", help="compare two runs, flagging regressions")
+    compare_parser.add_argument("baseline", help="baseline results file")
+    compare_parser.add_argument("current", help="results file to compare against the baseline")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative change that counts as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        def report(case: dict):
+            print(f"{case['case']}: {case['conversations_per_second']} conversations/s, "
+                  f"{case['requests_per_second']} requests/s, p95 {case['latency_ms']['p95']} ms", file=sys.stderr)
+
+        results = run_benchmarks(tuple(args.workloads.split(",")), _int_list(args.concurrency),
+                                 _int_list(args.lengths), _int_list(args.payload_words), args.conversations,
+                                 args.server_latency, report)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        else:
+            print(output)
+    else:
+        baseline = load_results(args.baseline)
+        current = load_results(args.current)
+        if baseline["metadata"]["settings"] != current["metadata"]["settings"]:
+            print("Warning: the runs used different settings, so their results may not be comparable",
+                  file=sys.stderr)
+        metrics = dict(COMPARED_METRICS)
+        if any(run["metadata"].get("memory_source") != "psutil" for run in (baseline, current)):
+            print("Skipping peak_rss_mb: it was only measured per case in runs with psutil installed",
+                  file=sys.stderr)
+            del metrics["peak_rss_mb"]
+        regressions = print_comparisons(compare_results(baseline, current, args.threshold, metrics), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+class _TimingAdapter(BaseAdapter):
+    """requests transport adapter that records the latency of each request (including each retry)."""
+
+    def __init__(self, adapter: BaseAdapter):
+        super().__init__()
+        self.adapter = adapter
+        self._lock = threading.Lock()
+        self._latencies = []
+
+    def send(self, request, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return self.adapter.send(request, **kwargs)
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start_time)
+
+    def close(self):
+        self.adapter.close()
+
+    def latencies(self) -> list[float]:
+        with self._lock:
+            return list(self._latencies)
+
+
+class _MemorySampler:
+    """Background sampler of the process's peak resident memory."""
+
+    def __init__(self, interval_seconds: float = 0.02):
+        self.interval_seconds = interval_seconds
+        self._peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if psutil is None:
+            return
+        process = psutil.Process()
+        self._peak_bytes = process.memory_info().rss
+
+        def sample():
+            while not self._stop.wait(self.interval_seconds):
+                self._peak_bytes = max(self._peak_bytes, process.memory_info().rss)
+
+        self._thread = threading.Thread(target=sample, name="ocs-benchmark-memory", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def peak_rss_mb(self) -> Optional[float]:
+        if psutil is not None:
+            return round(self._peak_bytes / (1024 * 1024), 2)
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux, but bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+        return None
+
+
+@contextmanager
+def _mock_server_process(conversation_length: int, payload_words: int, server_latency: str) -> Iterator[str]:
+    """
+    Run the mock OCS server in a child process.
+
+    Args:
+        conversation_length (int): The number of exchanges after which the user simulator experiment ends.
+        payload_words (int): The number of words in each generated response.
+        server_latency (str): The latency distribution, as passed to the server's --latency option.
+
+    Yields:
+        str: The server's base URL.
+
+    Raises:
+        RuntimeError: If the server fails to start.
+    """
+
+    process = subprocess.Popen([sys.executable, _MOCK_SERVER_PATH, "--port", "0", "--latency", server_latency,
+                                "--response-words", str(payload_words),
+                                "--end-after", f"{_USER_EXPERIMENT_ID}={conversation_length}"],
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        match = re.search(r"(http://\S+)", line)
+        if not match:
+            raise RuntimeError(f"Mock OCS server failed to start: {line.strip()}")
+        yield match.group(1)
+    finally:
+        process.terminate()
+        process.wait()
+        process.stdout.close()
+
+
+def _synthetic_export_rows(num_conversations: int, conversation_length: int, words: str) -> list[dict]:
+    """
+    Build session export rows for conversations to replay.
+
+    Args:
+        num_conversations (int): The number of conversations.
+        conversation_length (int): The number of exchanges per conversation.
+        words (str): The text for each message.
+
+    Returns:
+        list[dict]: The export rows, in conversation order.
+    """
+
+    rows = []
+    for conversation in range(num_conversations):
+        for exchange in range(conversation_length):
+            for message_type in ("human", "ai"):
+                rows.append({"Message ID": f"{conversation}-{exchange}-{message_type}", "Message Type": message_type,
+                             "Message Content": f"{message_type} {exchange}: {words}",
+                             "Session ID": f"session-{conversation}"})
+    return rows
+
+
+def _is_error(result: dict) -> bool:
+    """Determine whether a workflow result records an error (see continue_on_error in the workflows)."""
+
+    if "messages" in result:
+        return any(message[0].startswith("ERROR:") for message in result["messages"])
+    return str(result.get("response", "")).startswith("ERROR:")
+
+
+def _metric_value(case: dict, metric: str) -> Optional[float]:
+    """Get a (possibly nested, dot-separated) metric from a case result."""
+
+    value = case
+    for part in metric.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _int_list(value: str) -> tuple:
+    """Parse a comma-separated list of integers."""
+
+    return tuple(int(part) for part in value.split(",") if part.strip())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,392 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Record/replay "cassettes" of Open Chat Studio API traffic, for offline, deterministic runs of the OCS API clients."""
+
+import asyncio
+import base64
+import contextvars
+import gzip
+import logging
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from typing import Optional
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+# the current cassette scope (if any), for matching each conversation's requests only with its own recorded ones
+_current_scope = contextvars.ContextVar("ocs_cassette_scope", default=None)
+
+
+@contextmanager
+def cassette_scope(scope: str):
+    """
+    Tag the OCS API requests made within the block (including any made in worker threads started with a copy of its
+    context) with a scope, typically the ID of a conversation or query.
+
+    Requests recorded within a scope are replayed only to requests made within the same scope, so that concurrent
+    conversations that send identical requests (e.g., to create their sessions) each get their own responses back,
+    whatever order they run in. Scopes should be unique per conversation; within a scope, identical requests get
+    their responses in recorded order. Cassettes recorded without scopes are matched from any scope.
+
+    Args:
+        scope (str): The scope name.
+    """
+
+    token = _current_scope.set(scope)
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+class Cassette:
+    """On-disk store of OCS API request/response pairs, recorded from live traffic and served back in replay mode."""
+
+    # response headers not to record (bodies are stored decoded, and their length is implied)
+    SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+    # httpx request extension the async client sets on requests whose responses it streams
+    STREAMED_EXTENSION = "ocs_streamed"
+
+    def __init__(self, path: str, mode: str = "replay", reproduce_latency: bool = False,
+                 latency_scale: float = 1.0, allow_repeats: bool = True):
+        """
+        Initialize the cassette.
+
+        Pass the cassette to an OCS API client (via its cassette argument) to record or replay all of its traffic.
+        In record mode, requests go to the server as usual, and each request/response pair is appended to the
+        cassette file (one JSON line each, gzipped if the path ends in ".gz"), along with how long the response took.
+        Request headers (including the API key) are not recorded. In replay mode, no requests are sent: each is
+        matched with a recorded one by method, URL path and query, and JSON body (ignoring key order and
+        formatting), and the recorded response is returned. Identical requests get their recorded responses in
+        recorded order, so concurrent conversations only replay correctly if each runs within its own
+        cassette_scope() (as the simulators do).
+
+        Streamed responses (incremental list parsing and file downloads) are passed through without being recorded,
+        so as not to buffer them; in replay mode, they fail with CassetteMissError (unless they were recorded some
+        other way).
+
+        Args:
+            path (str): The path of the cassette file.
+            mode (str): "record" (overwriting any existing file) or "replay". Defaults to "replay".
+            reproduce_latency (bool): Whether to wait as long as each recorded response took before returning it
+              (in replay mode). Defaults to False (replay at full speed).
+            latency_scale (float): The factor to scale reproduced latencies by. Defaults to 1.0.
+            allow_repeats (bool): Whether to keep returning the last recorded response for a request once its
+              recorded responses are used up (rather than raising CassetteMissError). Defaults to True.
+
+        Raises:
+            ValueError: If the mode isn't "record" or "replay".
+        """
+
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+
+        # set parameters
+        self.path = path
+        self.mode = mode
+        self.reproduce_latency = reproduce_latency
+        self.latency_scale = latency_scale
+        self.allow_repeats = allow_repeats
+
+        # initialize state
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {"recorded": 0, "replayed": 0, "misses": 0, "unrecorded_streams": 0}
+        self._file = None
+        if mode == "record":
+            self._file = gzip.open(path, "wt", encoding="utf-8") if path.endswith(".gz") \
+                else open(path, "w", encoding="utf-8")
+        else:
+            self._load()
+
+    def close(self):
+        """
+        Close the cassette file (after recording).
+        """
+
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def wrap_adapter(self, adapter: BaseAdapter) -> BaseAdapter:
+        """
+        Wrap a requests transport adapter to record or replay through this cassette.
+
+        Args:
+            adapter (BaseAdapter): The adapter that sends requests to the server.
+
+        Returns:
+            BaseAdapter: The wrapping adapter, to mount on the session in its place.
+        """
+
+        return _CassetteAdapter(self, adapter)
+
+    def wrap_async_transport(self, transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        """
+        Wrap an httpx transport to record or replay through this cassette.
+
+        Args:
+            transport (httpx.AsyncBaseTransport): The transport that sends requests to the server.
+
+        Returns:
+            httpx.AsyncBaseTransport: The wrapping transport, to pass to the httpx client in its place.
+        """
+
+        return _AsyncCassetteTransport(self, transport)
+
+    def stats(self) -> dict:
+        """
+        Report cassette activity.
+
+        Returns:
+            dict: A dictionary with the following keys: "recorded", "replayed", "misses", "unrecorded_streams".
+        """
+
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def match_key(method: str, url: str, body: Optional[bytes]) -> str:
+        """
+        Build the key for matching a request with recorded ones.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The full request URL.
+            body (Optional[bytes]): The request body (if any).
+
+        Returns:
+            str: The key: the method, the URL's path and sorted query, and the body with any JSON normalized.
+        """
+
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        body_text = ""
+        if body:
+            try:
+                body_text = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+            except ValueError:
+                body_text = body.decode("utf-8", errors="replace")
+        return f"{method.upper()} {parts.path}?{query} {body_text}"
+
+    def record(self, key: str, status_code: int, headers, content: bytes, elapsed_seconds: float):
+        """
+        Record a response (within the current cassette_scope(), if any).
+
+        Args:
+            key (str): The request's match key, from match_key().
+            status_code (int): The response's HTTP status code.
+            headers: The response headers (a mapping).
+            content (bytes): The (decoded) response body.
+            elapsed_seconds (float): How long the response took.
+        """
+
+        entry = {"key": key, "status": status_code, "elapsed": round(elapsed_seconds, 6),
+                 "headers": {name: value for name, value in headers.items()
+                             if name.lower() not in self.SKIPPED_HEADERS}}
+        scope = _current_scope.get()
+        if scope is not None:
+            entry["scope"] = scope
+        try:
+            entry["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_base64"] = base64.b64encode(content).decode("ascii")
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Cassette is closed")
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._file.flush()
+            self._stats["recorded"] += 1
+
+    def skip_stream(self, key: str):
+        """
+        Note a streamed response that was passed through without being recorded.
+
+        Args:
+            key (str): The request's match key, from match_key().
+        """
+
+        with self._lock:
+            self._stats["unrecorded_streams"] += 1
+            first = self._stats["unrecorded_streams"] == 1
+        if first:
+            logging.warning(f"Cassette doesn't record streamed responses; not recording: {key}")
+
+    def play(self, key: str) -> dict:
+        """
+        Get the next recorded response for a request (within the current cassette_scope(), if any).
+
+        Args:
+            key (str): The request's match key, from match_key().
+
+        Returns:
+            dict: The recorded entry, with "status", "headers", "content" (bytes), and "elapsed" (seconds) keys.
+
+        Raises:
+            CassetteMissError: If there's no (remaining) recorded response for the request.
+        """
+
+        scope = _current_scope.get()
+        with self._lock:
+            entries = self._entries.get((scope, key))
+            if entries is None and scope is not None:
+                # (requests recorded without a scope match from any scope)
+                entries = self._entries.get((None, key))
+            if not entries:
+                self._stats["misses"] += 1
+                raise CassetteMissError(f"No recorded response for request: {key}")
+            entry = entries.popleft() if len(entries) > 1 or not self.allow_repeats else entries[0]
+            self._stats["replayed"] += 1
+            return entry
+
+    def latency_for(self, entry: dict) -> float:
+        """
+        Get how long to wait before returning a replayed response.
+
+        Args:
+            entry (dict): The recorded entry, from play().
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+
+        return entry["elapsed"] * self.latency_scale if self.reproduce_latency else 0.0
+
+    def _load(self):
+        """Load recorded entries from the cassette file."""
+
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "body_base64" in entry:
+                    entry["content"] = base64.b64decode(entry.pop("body_base64"))
+                else:
+                    entry["content"] = entry.pop("body").encode("utf-8")
+                self._entries.setdefault((entry.get("scope"), entry["key"]), deque()).append(entry)
+
+
+class _CassetteAdapter(BaseAdapter):
+    """requests transport adapter that records or replays through a cassette."""
+
+    def __init__(self, cassette: Cassette, adapter: BaseAdapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        key = self.cassette.match_key(request.method, request.url, request.body)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.play(key)
+            latency = self.cassette.latency_for(entry)
+            if latency:
+                time.sleep(latency)
+            return _build_response(request, entry)
+
+        # pass streamed responses through unrecorded, rather than buffering them
+        if kwargs.get("stream"):
+            self.cassette.skip_stream(key)
+            return self.adapter.send(request, **kwargs)
+
+        # send for real, reading the whole body so that we can record it (it can still be iterated afterward)
+        start_time = time.monotonic()
+        response = self.adapter.send(request, **kwargs)
+        content = response.content
+        self.cassette.record(key, response.status_code, response.headers, content, time.monotonic() - start_time)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class _AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records or replays through a cassette."""
+
+    def __init__(self, cassette: Cassette, transport: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = self.cassette.match_key(request.method, str(request.url), request.content)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.play(key)
+            latency = self.cassette.latency_for(entry)
+            if latency:
+                await asyncio.sleep(latency)
+            return httpx.Response(entry["status"], headers=entry["headers"], content=entry["content"],
+                                  request=request)
+
+        # pass streamed responses through unrecorded, rather than buffering them
+        if request.extensions.get(Cassette.STREAMED_EXTENSION):
+            self.cassette.skip_stream(key)
+            return await self.transport.handle_async_request(request)
+
+        # send for real, reading the whole (decoded) body so that we can record it
+        start_time = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed_seconds = time.monotonic() - start_time
+        self.cassette.record(key, response.status_code, response.headers, content, elapsed_seconds)
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in Cassette.SKIPPED_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _build_response(request: requests.PreparedRequest, entry: dict) -> requests.Response:
+    """
+    Build a requests response from a recorded entry.
+
+    Args:
+        request (requests.PreparedRequest): The request being answered.
+        entry (dict): The recorded entry, from Cassette.play().
+
+    Returns:
+        requests.Response: The response, with its content already loaded.
+    """
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.elapsed = timedelta(seconds=entry["elapsed"])
+    response._content = entry["content"]
+    response._content_consumed = True
+    return response
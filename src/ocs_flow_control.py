@@ -0,0 +1,716 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Client-side flow control for Open Chat Studio API calls, shared by the blocking and asyncio clients."""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class TokenBucketRateLimiter:
+    """Token-bucket rate limiter with separate buckets per API endpoint and experiment."""
+
+    def __init__(self, rates: dict[str, float], bursts: Optional[dict[str, float]] = None,
+                 default_rate: Optional[float] = None, per_experiment: bool = True):
+        """
+        Initialize the rate limiter.
+
+        Endpoints are identified by their operation IDs in ocs-api-schema.yaml (e.g., "new_api_message" for
+        incoming_message, "session_create" for session creation). Each (endpoint, experiment ID) pair gets its own
+        bucket, so, for example, a target experiment and a user simulator experiment are limited separately.
+
+        Args:
+            rates (dict[str, float]): The sustained rate (in requests per second) to allow for each endpoint.
+            bursts (dict[str, float], optional): The number of requests to allow in a burst for each endpoint (i.e.,
+              the bucket size). Defaults to one second's worth of requests (and at least one).
+            default_rate (float, optional): The rate to apply to endpoints not in rates. Defaults to None (no limit).
+            per_experiment (bool): Whether to keep separate buckets for each experiment (rather than one bucket per
+              endpoint). Defaults to True.
+        """
+
+        # set parameters
+        self.rates = dict(rates)
+        self.bursts = dict(bursts or {})
+        self.default_rate = default_rate
+        self.per_experiment = per_experiment
+
+        # buckets and wait statistics, keyed by (endpoint, experiment ID)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._stats = {}
+
+    def reserve(self, endpoint: str, experiment_id: Optional[str] = None,
+                max_wait_seconds: Optional[float] = None) -> Optional[float]:
+        """
+        Take a token from the appropriate bucket, without waiting.
+
+        Tokens can be borrowed ahead of time, so this succeeds unless the wait would be too long; the caller must then
+        wait the returned number of seconds before sending its request. acquire() and acquire_async() do this for you.
+
+        Args:
+            endpoint (str): The endpoint being called.
+            experiment_id (str, optional): The ID of the experiment the call is for (if any). Defaults to None.
+            max_wait_seconds (float, optional): The longest the caller can wait (e.g., before its deadline). If the
+              wait would be longer, no token is taken. Defaults to None (no limit).
+
+        Returns:
+            Optional[float]: The number of seconds the caller must wait before sending its request, or None if that
+            would be longer than max_wait_seconds.
+        """
+
+        rate = self.rates.get(endpoint, self.default_rate)
+        if not rate:
+            return 0.0
+
+        key = (endpoint, experiment_id if self.per_experiment else None)
+        with self._lock:
+            # refill the bucket for the time that's passed, then take a token (possibly going into debt)
+            now = time.monotonic()
+            capacity = self.bursts.get(endpoint, max(1.0, rate))
+            tokens, last_refill = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last_refill) * rate) - 1
+            delay = -tokens / rate if tokens < 0 else 0.0
+            if max_wait_seconds is not None and delay > max_wait_seconds:
+                return None
+            self._buckets[key] = (tokens, now)
+
+            # record how long we're making the caller wait
+            stats = self._stats.setdefault(key, {"calls": 0, "delayed_calls": 0, "total_wait_seconds": 0.0,
+                                                 "max_wait_seconds": 0.0})
+            stats["calls"] += 1
+            if delay > 0:
+                stats["delayed_calls"] += 1
+                stats["total_wait_seconds"] += delay
+                stats["max_wait_seconds"] = max(stats["max_wait_seconds"], delay)
+
+        return delay
+
+    def acquire(self, endpoint: str, experiment_id: Optional[str] = None,
+                max_wait_seconds: Optional[float] = None) -> Optional[float]:
+        """
+        Block until a request to the endpoint is allowed.
+
+        Args:
+            endpoint (str): The endpoint being called.
+            experiment_id (str, optional): The ID of the experiment the call is for (if any). Defaults to None.
+            max_wait_seconds (float, optional): The longest to wait (e.g., before the caller's deadline). Defaults to
+              None (no limit).
+
+        Returns:
+            Optional[float]: The number of seconds waited, or None (without waiting) if the wait would be longer than
+            max_wait_seconds.
+        """
+
+        delay = self.reserve(endpoint, experiment_id, max_wait_seconds)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, endpoint: str, experiment_id: Optional[str] = None,
+                            max_wait_seconds: Optional[float] = None) -> Optional[float]:
+        """
+        Wait (asynchronously) until a request to the endpoint is allowed.
+
+        Args:
+            endpoint (str): The endpoint being called.
+            experiment_id (str, optional): The ID of the experiment the call is for (if any). Defaults to None.
+            max_wait_seconds (float, optional): The longest to wait (e.g., before the caller's deadline). Defaults to
+              None (no limit).
+
+        Returns:
+            Optional[float]: The number of seconds waited, or None (without waiting) if the wait would be longer than
+            max_wait_seconds.
+        """
+
+        delay = self.reserve(endpoint, experiment_id, max_wait_seconds)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Report how long the limiter has made calls wait.
+
+        Returns:
+            dict[str, dict]: A dictionary keyed by "endpoint" or "endpoint:experiment_id", each with the following
+            keys: "calls", "delayed_calls", "total_wait_seconds", "max_wait_seconds".
+        """
+
+        with self._lock:
+            return {(f"{endpoint}:{experiment_id}" if experiment_id else endpoint): dict(stats)
+                    for (endpoint, experiment_id), stats in self._stats.items()}
+
+    @property
+    def total_wait_seconds(self) -> float:
+        """The total number of seconds the limiter has made calls wait, across all buckets."""
+
+        with self._lock:
+            return sum(stats["total_wait_seconds"] for stats in self._stats.values())
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD (additive-increase, multiplicative-decrease) limit on the number of in-flight OCS API requests."""
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64, increase_step: int = 1,
+                 decrease_factor: float = 0.5, window_size: int = 20, latency_target_seconds: Optional[float] = None,
+                 max_error_rate: float = 0.05, decrease_cooldown_seconds: float = 5.0):
+        """
+        Initialize the concurrency limiter.
+
+        After every window_size completed requests, the limit rises by increase_step if the window's p95 latency is
+        within latency_target_seconds (if set) and its error rate is within max_error_rate. Whenever a request fails
+        with an overload signal (429, 5xx, timeout, or connection error), the limit is cut by decrease_factor, at
+        most once per cooldown period (so that one burst of failures from the same in-flight requests counts once).
+
+        Args:
+            initial_limit (int): The starting limit. Defaults to 4.
+            min_limit (int): The lowest the limit can go. Defaults to 1.
+            max_limit (int): The highest the limit can go. Defaults to 64.
+            increase_step (int): How much to raise the limit after a healthy window. Defaults to 1.
+            decrease_factor (float): The factor to multiply the limit by on overload. Defaults to 0.5.
+            window_size (int): The number of completed requests to judge health over. Defaults to 20.
+            latency_target_seconds (float, optional): The p95 latency above which the limit stops rising. Defaults to
+              None (latency is not considered).
+            max_error_rate (float): The error rate above which the limit stops rising. Defaults to 0.05.
+            decrease_cooldown_seconds (float): The minimum time between decreases. Defaults to 5.0.
+        """
+
+        # set parameters
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.window_size = window_size
+        self.latency_target_seconds = latency_target_seconds
+        self.max_error_rate = max_error_rate
+        self.decrease_cooldown_seconds = decrease_cooldown_seconds
+
+        # initialize state
+        self._condition = threading.Condition()
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._in_flight = 0
+        self._window = []
+        self._last_decrease = float("-inf")
+        self._listeners = []
+
+    @property
+    def limit(self) -> int:
+        """The current limit on in-flight requests."""
+
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests currently in flight."""
+
+        return self._in_flight
+
+    def add_listener(self, listener: callable):
+        """
+        Add a listener to be called whenever the limit changes.
+
+        Args:
+            listener (callable): A function accepting two arguments: the new limit and a string describing the
+              reason for the change. May be called from any thread.
+        """
+
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: callable):
+        """
+        Remove a listener added with add_listener().
+
+        Args:
+            listener (callable): The listener to remove.
+        """
+
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def try_acquire(self) -> bool:
+        """
+        Take an in-flight slot if one is free, without waiting.
+
+        Returns:
+            bool: True if a slot was taken (in which case release() must be called when the request completes).
+        """
+
+        with self._condition:
+            if self._in_flight < self._limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, max_wait_seconds: Optional[float] = None) -> bool:
+        """
+        Block until an in-flight slot is free, then take it. Call release() when the request completes.
+
+        Args:
+            max_wait_seconds (float, optional): The longest to wait (e.g., before the caller's deadline). Defaults to
+              None (no limit).
+
+        Returns:
+            bool: True if a slot was taken, False if max_wait_seconds ran out first.
+        """
+
+        give_up_at = None if max_wait_seconds is None else time.monotonic() + max_wait_seconds
+        with self._condition:
+            while self._in_flight >= self._limit:
+                if give_up_at is None:
+                    self._condition.wait()
+                else:
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    async def acquire_async(self, poll_interval_seconds: float = 0.05,
+                            max_wait_seconds: Optional[float] = None) -> bool:
+        """
+        Wait (asynchronously) until an in-flight slot is free, then take it. Call release() when the request completes.
+
+        Args:
+            poll_interval_seconds (float): How often to check for a free slot. Defaults to 0.05.
+            max_wait_seconds (float, optional): The longest to wait (e.g., before the caller's deadline). Defaults to
+              None (no limit).
+
+        Returns:
+            bool: True if a slot was taken, False if max_wait_seconds ran out first.
+        """
+
+        give_up_at = None if max_wait_seconds is None else time.monotonic() + max_wait_seconds
+        while not self.try_acquire():
+            if give_up_at is not None and time.monotonic() >= give_up_at:
+                return False
+            await asyncio.sleep(poll_interval_seconds)
+        return True
+
+    def release(self, latency_seconds: float, outcome: str):
+        """
+        Release an in-flight slot and adjust the limit based on how the request went.
+
+        Args:
+            latency_seconds (float): How long the request took.
+            outcome (str): "success", "overload" (429, 5xx, timeout, or connection error), or "error" (any other
+              failure, which counts toward the error rate but doesn't trigger a decrease).
+        """
+
+        change = None
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if outcome == "overload":
+                # cut back sharply, but only once per cooldown
+                if now - self._last_decrease >= self.decrease_cooldown_seconds:
+                    self._last_decrease = now
+                    self._window = []
+                    new_limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+                    if new_limit != self._limit:
+                        self._limit = new_limit
+                        change = (new_limit, "decrease after overload (429, 5xx, or timeout)")
+            else:
+                # judge health once we have a full window
+                self._window.append((latency_seconds, outcome))
+                if len(self._window) >= self.window_size:
+                    latencies = sorted(latency for latency, _ in self._window)
+                    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                    error_rate = sum(1 for _, o in self._window if o != "success") / len(self._window)
+                    self._window = []
+                    healthy = error_rate <= self.max_error_rate and (self.latency_target_seconds is None
+                                                                      or p95 <= self.latency_target_seconds)
+                    if healthy and self._limit < self.max_limit:
+                        self._limit = min(self.max_limit, self._limit + self.increase_step)
+                        change = (self._limit, f"increase after healthy window (p95 {p95:.2f}s, "
+                                               f"error rate {error_rate:.0%})")
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+
+        # report any change outside the lock
+        if change:
+            for listener in listeners:
+                listener(*change)
+
+    def stats(self) -> dict:
+        """
+        Report the limiter's current state.
+
+        Returns:
+            dict: A dictionary with the following keys: "limit", "in_flight", "min_limit", "max_limit".
+        """
+
+        with self._condition:
+            return {"limit": self._limit, "in_flight": self._in_flight, "min_limit": self.min_limit,
+                    "max_limit": self.max_limit}
+
+
+class CircuitBreaker:
+    """Circuit breaker that holds back OCS API calls during outages, probing with half-open calls before resuming."""
+
+    def __init__(self, failure_rate_threshold: float = 0.5, min_calls: int = 10, window_seconds: float = 30.0,
+                 open_seconds: float = 30.0, half_open_max_calls: int = 1, wait_when_open: bool = True,
+                 max_wait_seconds: Optional[float] = None, poll_interval_seconds: float = 1.0):
+        """
+        Initialize the circuit breaker.
+
+        The breaker starts closed (calls flow normally). If, within the last window_seconds, at least min_calls calls
+        completed and at least failure_rate_threshold of them failed with an overload signal (429, 5xx, timeout, or
+        connection error), the breaker opens: new calls either wait or fail fast. After open_seconds, the breaker goes
+        half-open and lets up to half_open_max_calls probe calls through; a successful probe closes it again, while a
+        failed probe re-opens it.
+
+        Args:
+            failure_rate_threshold (float): The failure rate at which to open. Defaults to 0.5.
+            min_calls (int): The minimum number of calls in the window before the failure rate is considered.
+              Defaults to 10.
+            window_seconds (float): How far back to look when computing the failure rate. Defaults to 30.0.
+            open_seconds (float): How long to stay open before probing. Defaults to 30.0.
+            half_open_max_calls (int): The number of probe calls to allow at once while half-open. Defaults to 1.
+            wait_when_open (bool): Whether calls should wait for the breaker to close (rather than fail fast) while
+              it's open. Defaults to True.
+            max_wait_seconds (float, optional): The longest a call will wait for the breaker before failing. Defaults
+              to None (wait indefinitely).
+            poll_interval_seconds (float): How often waiting calls re-check the breaker. Defaults to 1.0.
+        """
+
+        # set parameters
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.wait_when_open = wait_when_open
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+
+        # initialize state
+        self._condition = threading.Condition()
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._window = deque()
+        self._stats = {"times_opened": 0, "rejected_calls": 0, "waited_calls": 0, "total_wait_seconds": 0.0}
+
+    @property
+    def state(self) -> str:
+        """The breaker's current state: "closed", "open", or "half-open"."""
+
+        with self._condition:
+            self._update_state(time.monotonic())
+            return self._state
+
+    def _update_state(self, now: float):
+        """Move from open to half-open once the open period has passed (call with the lock held)."""
+
+        if self._state == "open" and now - self._opened_at >= self.open_seconds:
+            self._state = "half-open"
+            self._probes_in_flight = 0
+            logging.warning("OCS API circuit breaker half-open: probing before resuming calls")
+
+    def _try_acquire(self, now: float) -> tuple[Optional[str], float]:
+        """
+        Try to get permission for a call (call with the lock held).
+
+        Returns:
+            tuple[Optional[str], float]: The permit ("call" or "probe"), or None if the call can't go ahead yet, plus
+            how long to wait before trying again.
+        """
+
+        self._update_state(now)
+        if self._state == "closed":
+            return "call", 0.0
+        if self._state == "half-open":
+            if self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return "probe", 0.0
+            return None, self.poll_interval_seconds
+        return None, min(self.poll_interval_seconds, max(0.0, self._opened_at + self.open_seconds - now))
+
+    def acquire(self, max_wait_seconds: Optional[float] = None) -> Optional[str]:
+        """
+        Get permission for a call, waiting while the breaker is open (if configured to wait).
+
+        Args:
+            max_wait_seconds (float, optional): The longest this call can wait (e.g., before the caller's deadline),
+              on top of the breaker's own max_wait_seconds. Defaults to None (no limit).
+
+        Returns:
+            Optional[str]: The permit to pass to release() once the call completes ("call" or "probe"), or None if
+            the call should fail fast because the breaker is open (or it's been open for as long as it can wait).
+        """
+
+        start = time.monotonic()
+        waited = False
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                permit, retry_in = self._try_acquire(now)
+                if permit:
+                    if waited:
+                        self._record_wait(now - start)
+                    return permit
+                if not self._can_wait(now - start, max_wait_seconds):
+                    self._stats["rejected_calls"] += 1
+                    return None
+                waited = True
+                self._condition.wait(retry_in if max_wait_seconds is None
+                                     else min(retry_in, max(0.0, max_wait_seconds - (now - start))))
+
+    async def acquire_async(self, max_wait_seconds: Optional[float] = None) -> Optional[str]:
+        """
+        Get permission for a call, waiting (asynchronously) while the breaker is open (if configured to wait).
+
+        Args:
+            max_wait_seconds (float, optional): The longest this call can wait (e.g., before the caller's deadline),
+              on top of the breaker's own max_wait_seconds. Defaults to None (no limit).
+
+        Returns:
+            Optional[str]: The permit to pass to release() once the call completes ("call" or "probe"), or None if
+            the call should fail fast because the breaker is open (or it's been open for as long as it can wait).
+        """
+
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                permit, retry_in = self._try_acquire(now)
+                if permit:
+                    if waited:
+                        self._record_wait(now - start)
+                    return permit
+                if not self._can_wait(now - start, max_wait_seconds):
+                    self._stats["rejected_calls"] += 1
+                    return None
+            waited = True
+            await asyncio.sleep(retry_in if max_wait_seconds is None
+                                else min(retry_in, max(0.0, max_wait_seconds - (now - start))))
+
+    def wait_for_reset(self, max_wait_seconds: Optional[float] = None) -> bool:
+        """
+        Wait until the breaker is no longer open (i.e., its open period has passed and it's probing or closed).
+
+        Args:
+            max_wait_seconds (float, optional): The longest to wait. Defaults to None (until the open period ends).
+
+        Returns:
+            bool: True if the breaker is no longer open, False if max_wait_seconds ran out first.
+        """
+
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._update_state(now)
+                if self._state != "open":
+                    return True
+                wait = max(0.0, self._opened_at + self.open_seconds - now)
+                if max_wait_seconds is not None:
+                    if now - start >= max_wait_seconds:
+                        return False
+                    wait = min(wait, max_wait_seconds - (now - start))
+                self._condition.wait(wait)
+
+    def _can_wait(self, waited_seconds: float, max_wait_seconds: Optional[float] = None) -> bool:
+        """Determine whether a call held back by the breaker should keep waiting (call with the lock held)."""
+
+        return self.wait_when_open and (self.max_wait_seconds is None or waited_seconds < self.max_wait_seconds) \
+            and (max_wait_seconds is None or waited_seconds < max_wait_seconds)
+
+    def _record_wait(self, waited_seconds: float):
+        """Record how long a call was held back (call with the lock held)."""
+
+        self._stats["waited_calls"] += 1
+        self._stats["total_wait_seconds"] += waited_seconds
+
+    def release(self, permit: str, outcome: str):
+        """
+        Record how a call went, opening or closing the breaker as appropriate.
+
+        Args:
+            permit (str): The permit returned by acquire().
+            outcome (str): "success", "overload" (429, 5xx, timeout, or connection error), "error" (any other
+              failure, which shows that the service is up and so counts as a success here), or "cancelled" (the
+              call was never made, e.g., because it ran out of time waiting for other limits; this counts for
+              nothing).
+        """
+
+        failed = outcome == "overload"
+        with self._condition:
+            now = time.monotonic()
+            if outcome == "cancelled":
+                if permit == "probe":
+                    self._probes_in_flight -= 1
+            elif permit == "probe":
+                self._probes_in_flight -= 1
+                if self._state == "half-open":
+                    if failed:
+                        self._open(now, "probe call failed")
+                    else:
+                        self._state = "closed"
+                        self._window.clear()
+                        logging.warning("OCS API circuit breaker closed: resuming calls")
+            elif self._state == "closed":
+                # track the failure rate over the window
+                self._window.append((now, failed))
+                while self._window and self._window[0][0] < now - self.window_seconds:
+                    self._window.popleft()
+                failures = sum(1 for _, call_failed in self._window if call_failed)
+                if len(self._window) >= self.min_calls and failures / len(self._window) >= self.failure_rate_threshold:
+                    self._open(now, f"{failures} of the last {len(self._window)} calls failed")
+            self._condition.notify_all()
+
+    def _open(self, now: float, reason: str):
+        """Open the breaker (call with the lock held)."""
+
+        self._state = "open"
+        self._opened_at = now
+        self._window.clear()
+        self._stats["times_opened"] += 1
+        logging.warning(f"OCS API circuit breaker opened ({reason}): holding calls for {self.open_seconds}s")
+
+    def stats(self) -> dict:
+        """
+        Report the breaker's current state and history.
+
+        Returns:
+            dict: A dictionary with the following keys: "state", "times_opened", "rejected_calls", "waited_calls",
+            "total_wait_seconds".
+        """
+
+        with self._condition:
+            self._update_state(time.monotonic())
+            return {"state": self._state, **self._stats}
+
+
+class HedgePolicy:
+    """Policy for hedging slow, idempotent OCS API requests with a duplicate request, to cut tail latency."""
+
+    # by default, hedge only idempotent GET endpoints that bulk exports lean on
+    DEFAULT_ENDPOINTS = ("session_retrieve", "session_list", "experiment_retrieve", "experiment_list")
+
+    def __init__(self, endpoints: Optional[tuple[str, ...]] = None, percentile: float = 95.0, min_samples: int = 20,
+                 window_size: int = 200, min_delay_seconds: float = 0.0, max_hedge_ratio: float = 0.1):
+        """
+        Initialize the hedge policy.
+
+        Once an endpoint has min_samples observed latencies, a request to it that hasn't had a response within the
+        given percentile of those latencies is duplicated; the first response that isn't a 429 or 5xx is used and the
+        other request is abandoned. Hedges don't count against rate or concurrency limits, so max_hedge_ratio caps the
+        extra load they can add.
+
+        Args:
+            endpoints (tuple[str, ...], optional): The operation IDs of the (idempotent GET) endpoints to hedge.
+              Defaults to DEFAULT_ENDPOINTS.
+            percentile (float): The percentile of observed latency after which to send a hedge. Defaults to 95.0.
+            min_samples (int): The number of latencies to observe for an endpoint before hedging. Defaults to 20.
+            window_size (int): The number of recent latencies to keep per endpoint. Defaults to 200.
+            min_delay_seconds (float): The minimum time to wait before sending a hedge. Defaults to 0.0.
+            max_hedge_ratio (float): The maximum fraction of hedgeable requests that can be hedged. Defaults to 0.1.
+        """
+
+        # set parameters
+        self.endpoints = set(self.DEFAULT_ENDPOINTS if endpoints is None else endpoints)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.min_delay_seconds = min_delay_seconds
+        self.max_hedge_ratio = max_hedge_ratio
+
+        # initialize state
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._stats = {"requests": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped": 0}
+
+    def hedge_delay(self, endpoint: Optional[str]) -> Optional[float]:
+        """
+        Get how long to wait for a response before hedging a request.
+
+        Args:
+            endpoint (str, optional): The operation ID of the endpoint being called.
+
+        Returns:
+            Optional[float]: The number of seconds to wait before hedging, or None if the request shouldn't be
+            hedged (because the endpoint isn't hedged or there aren't enough latency samples yet).
+        """
+
+        if endpoint not in self.endpoints:
+            return None
+
+        with self._lock:
+            self._stats["requests"] += 1
+            return self._current_delay(endpoint)
+
+    def record_latency(self, endpoint: Optional[str], latency_seconds: float):
+        """
+        Record the latency of a request (hedged or not).
+
+        Args:
+            endpoint (str, optional): The operation ID of the endpoint called.
+            latency_seconds (float): How long the request took to get a response.
+        """
+
+        if endpoint not in self.endpoints:
+            return
+
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window_size)
+            latencies.append(latency_seconds)
+
+    def try_hedge(self) -> bool:
+        """
+        Claim permission to send a hedge, within the hedge budget.
+
+        Returns:
+            bool: True if a hedge can be sent, False if the budget is used up.
+        """
+
+        with self._lock:
+            if self._stats["hedges_fired"] + 1 > self.max_hedge_ratio * self._stats["requests"]:
+                self._stats["hedges_skipped"] += 1
+                return False
+            self._stats["hedges_fired"] += 1
+            return True
+
+    def record_hedge_won(self):
+        """
+        Record that a hedge's response arrived before the original request's.
+        """
+
+        with self._lock:
+            self._stats["hedges_won"] += 1
+
+    def stats(self) -> dict:
+        """
+        Report how often requests were hedged.
+
+        Returns:
+            dict: A dictionary with the following keys: "requests" (hedgeable requests), "hedges_fired",
+            "hedges_won" (hedges that responded first), "hedges_skipped" (for lack of budget), and "hedge_delays"
+            (the current delay before hedging, per endpoint with enough samples).
+        """
+
+        with self._lock:
+            delays = {endpoint: self._current_delay(endpoint) for endpoint in self._latencies}
+            return {**self._stats, "hedge_delays": {endpoint: delay for endpoint, delay in delays.items()
+                                                    if delay is not None}}
+
+    def _current_delay(self, endpoint: str) -> Optional[float]:
+        """Compute the current hedge delay for an endpoint (call with the lock held)."""
+
+        latencies = self._latencies.get(endpoint)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay_seconds, ordered[index])
@@ -0,0 +1,174 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""JSON encoding and decoding for Open Chat Studio API calls, shared by the blocking and asyncio clients."""
+
+import json
+from typing import Any
+
+# faster codecs and incremental parsing are optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+
+class JSONCodec:
+    """JSON codec using the standard library."""
+
+    def dumps(self, obj: Any) -> bytes:
+        """
+        Encode an object as JSON.
+
+        Args:
+            obj (Any): The object to encode.
+
+        Returns:
+            bytes: The UTF-8 encoded JSON.
+        """
+
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, content: bytes) -> Any:
+        """
+        Decode JSON.
+
+        Args:
+            content (bytes): The UTF-8 encoded JSON.
+
+        Returns:
+            Any: The decoded object.
+
+        Raises:
+            ValueError: If the content isn't valid JSON.
+        """
+
+        return json.loads(content)
+
+
+class OrjsonCodec(JSONCodec):
+    """JSON codec using orjson, which is several times faster than the standard library for large documents."""
+
+    def __init__(self):
+        """
+        Initialize the codec.
+
+        Raises:
+            ImportError: If orjson isn't installed.
+        """
+
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires the orjson package")
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, content: bytes) -> Any:
+        return orjson.loads(content)
+
+
+def default_json_codec() -> JSONCodec:
+    """
+    Get the fastest available JSON codec.
+
+    Returns:
+        JSONCodec: An OrjsonCodec if orjson is installed, otherwise a standard-library JSONCodec.
+    """
+
+    return OrjsonCodec() if orjson is not None else JSONCodec()
+
+
+class IncrementalPageParser:
+    """Incremental parser for paginated list responses, returning each result as soon as it has been received."""
+
+    def __init__(self, items_key: str = "results"):
+        """
+        Initialize the parser.
+
+        Args:
+            items_key (str): The top-level key of the list of results. Defaults to "results".
+
+        Raises:
+            ImportError: If ijson isn't installed.
+        """
+
+        if ijson is None:
+            raise ImportError("Incremental parsing requires the ijson package")
+
+        self.page = {}
+        self._item_prefix = f"{items_key}.item"
+        self._events = ijson.sendable_list()
+        self._parser = ijson.parse_coro(self._events, use_float=True)
+        self._builder = None
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Parse the next chunk of the response.
+
+        Args:
+            chunk (bytes): The next chunk of raw response content.
+
+        Returns:
+            list: The results completed by this chunk (possibly none).
+
+        Raises:
+            ValueError: If the response is invalid JSON.
+        """
+
+        try:
+            self._parser.send(chunk)
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid JSON: {e}") from e
+        return self._drain()
+
+    def close(self) -> list:
+        """
+        Finish parsing the response, once all chunks have been fed.
+
+        Returns:
+            list: Any remaining results.
+
+        Raises:
+            ValueError: If the response was incomplete or invalid JSON.
+        """
+
+        try:
+            self._parser.close()
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid JSON: {e}") from e
+        return self._drain()
+
+    def _drain(self) -> list:
+        """
+        Process the parse events received so far.
+
+        Returns:
+            list: The results completed by these events.
+        """
+
+        items = []
+        for prefix, event, value in self._events:
+            if self._builder is not None:
+                # continue building the current result until its closing event
+                self._builder.event(event, value)
+                if prefix == self._item_prefix and event in ("end_map", "end_array"):
+                    items.append(self._builder.value)
+                    self._builder = None
+            elif prefix == self._item_prefix:
+                if event in ("start_map", "start_array"):
+                    self._builder = ObjectBuilder()
+                    self._builder.event(event, value)
+                else:
+                    items.append(value)
+            elif prefix and "." not in prefix and event not in ("start_map", "start_array", "end_map", "end_array",
+                                                                "map_key"):
+                # keep top-level scalars (like the "next" cursor) for the page
+                self.page[prefix] = value
+        del self._events[:]
+        return items
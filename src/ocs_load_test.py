@@ -0,0 +1,598 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Open-loop load testing of Open Chat Studio experiments, for finding the arrival rate at which latency degrades.
+
+Run it from the command line (e.g., "python ocs_load_test.py --schedule step --rates 1,2,4,8 --step-seconds 60"),
+reading credentials from the notebooks' configuration file, or use OpenLoopLoadGenerator from Python.
+"""
+
+import argparse
+import configparser
+import csv
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from ocs_api import OCSAPIClient
+from ocs_simulation_support import OCSBotToBotSimulator, OCSQueryRunner
+from typing import Iterator, Optional
+
+# the production OCS API, which command-line runs only target with the API key and IDs from the configuration file
+PRODUCTION_BASE_URL = "https://chatbots.dimagi.com"
+
+
+class ArrivalSchedule:
+    """When to start each request in an open-loop load test: a sequence of steps, each at a fixed arrival rate."""
+
+    def __init__(self, rates: list[float], step_seconds: float, poisson: bool = False, seed: Optional[int] = None):
+        """
+        Initialize the schedule.
+
+        Use the constant(), poisson_process(), and step() constructors for the common shapes.
+
+        Args:
+            rates (list[float]): The arrival rate for each step, in arrivals per second.
+            step_seconds (float): How long each step lasts.
+            poisson (bool): Whether arrivals are a Poisson process (exponentially distributed gaps, as from many
+              independent users) rather than evenly spaced. Defaults to False.
+            seed (int, optional): A seed for Poisson arrivals, for repeatable schedules. Defaults to None.
+
+        Raises:
+            ValueError: If there are no steps or a rate isn't positive.
+        """
+
+        if not rates or any(rate <= 0 for rate in rates):
+            raise ValueError("Arrival schedules need at least one step, and positive rates")
+
+        self.rates = list(rates)
+        self.step_seconds = step_seconds
+        self.poisson = poisson
+        self.seed = seed
+
+    @classmethod
+    def constant(cls, rate_per_second: float, duration_seconds: float) -> "ArrivalSchedule":
+        """
+        Build a schedule of evenly spaced arrivals.
+
+        Args:
+            rate_per_second (float): The arrival rate.
+            duration_seconds (float): How long to keep arriving.
+
+        Returns:
+            ArrivalSchedule: The schedule.
+        """
+
+        return cls([rate_per_second], duration_seconds)
+
+    @classmethod
+    def poisson_process(cls, rate_per_second: float, duration_seconds: float,
+                        seed: Optional[int] = None) -> "ArrivalSchedule":
+        """
+        Build a schedule of Poisson arrivals.
+
+        Args:
+            rate_per_second (float): The mean arrival rate.
+            duration_seconds (float): How long to keep arriving.
+            seed (int, optional): A seed, for repeatable schedules. Defaults to None.
+
+        Returns:
+            ArrivalSchedule: The schedule.
+        """
+
+        return cls([rate_per_second], duration_seconds, poisson=True, seed=seed)
+
+    @classmethod
+    def step(cls, rates: list[float], step_seconds: float, poisson: bool = False,
+             seed: Optional[int] = None) -> "ArrivalSchedule":
+        """
+        Build a schedule that steps through increasing (or any) arrival rates, for finding the saturation point.
+
+        Args:
+            rates (list[float]): The arrival rate for each step.
+            step_seconds (float): How long each step lasts.
+            poisson (bool): Whether arrivals within each step are a Poisson process. Defaults to False.
+            seed (int, optional): A seed for Poisson arrivals. Defaults to None.
+
+        Returns:
+            ArrivalSchedule: The schedule.
+        """
+
+        return cls(rates, step_seconds, poisson, seed)
+
+    @property
+    def duration_seconds(self) -> float:
+        """The total duration of the schedule."""
+
+        return len(self.rates) * self.step_seconds
+
+    def arrivals(self) -> Iterator[tuple[float, int]]:
+        """
+        Generate the arrivals.
+
+        Yields:
+            tuple[float, int]: The arrival time (in seconds from the start of the test) and its step index.
+        """
+
+        rng = random.Random(self.seed)
+        for step_index, rate in enumerate(self.rates):
+            step_start = step_index * self.step_seconds
+            step_end = step_start + self.step_seconds
+            offset = step_start + (rng.expovariate(rate) if self.poisson else 0.0)
+            count = 0
+            while offset < step_end:
+                yield offset, step_index
+                count += 1
+                offset = offset + rng.expovariate(rate) if self.poisson else step_start + count / rate
+
+    def describe(self) -> dict:
+        """
+        Describe the schedule.
+
+        Returns:
+            dict: A dictionary with the following keys: "rates", "step_seconds", "poisson", "duration_seconds".
+        """
+
+        return {"rates": self.rates, "step_seconds": self.step_seconds, "poisson": self.poisson,
+                "duration_seconds": self.duration_seconds}
+
+
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets, so that percentiles have bounded relative error at any scale."""
+
+    def __init__(self, precision: float = 0.01, min_seconds: float = 0.0001):
+        """
+        Initialize the histogram.
+
+        Args:
+            precision (float): The relative width of each bucket, which bounds the error of reported percentiles.
+              Defaults to 0.01 (1%).
+            min_seconds (float): The upper bound of the lowest bucket. Defaults to 0.0001 (0.1 ms).
+        """
+
+        self.precision = precision
+        self.min_seconds = min_seconds
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._counts = {}
+        self._log_base = math.log1p(precision)
+
+    def record(self, seconds: float):
+        """
+        Record a latency.
+
+        Args:
+            seconds (float): The latency, in seconds.
+        """
+
+        index = 0 if seconds <= self.min_seconds else math.ceil(math.log(seconds / self.min_seconds) / self._log_base)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        Add another histogram's latencies to this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge in (with the same precision and minimum).
+        """
+
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.total_seconds += other.total_seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Get a latency percentile.
+
+        Args:
+            pct (float): The percentile, from 0 to 100.
+
+        Returns:
+            Optional[float]: The percentile in seconds (the upper bound of its bucket, capped at the maximum), or None
+            if nothing has been recorded.
+        """
+
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(self.min_seconds * (1 + self.precision) ** index, self.max_seconds)
+        return self.max_seconds
+
+    def summary(self) -> dict:
+        """
+        Summarize the histogram.
+
+        Returns:
+            dict: A dictionary with the following keys: "count", plus (in milliseconds, or None if nothing has been
+            recorded) "p50", "p90", "p99", "p999", "max", "mean".
+        """
+
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 3) if seconds is not None else None
+
+        return {"count": self.count, "p50": ms(self.percentile(50)), "p90": ms(self.percentile(90)),
+                "p99": ms(self.percentile(99)), "p999": ms(self.percentile(99.9)),
+                "max": ms(self.max_seconds if self.count else None),
+                "mean": ms(self.total_seconds / self.count if self.count else None)}
+
+    def to_dict(self) -> dict:
+        """
+        Export the histogram, for saving with results.
+
+        Returns:
+            dict: A dictionary with the following keys: "precision", "min_seconds", "buckets" (each bucket's upper
+            bound in seconds, mapped to its count).
+        """
+
+        return {"precision": self.precision, "min_seconds": self.min_seconds,
+                "buckets": {f"{self.min_seconds * (1 + self.precision) ** index:.6g}": self._counts[index]
+                            for index in sorted(self._counts)}}
+
+
+class OpenLoopLoadGenerator:
+    """Open-loop load generator: starts queries or conversations on an arrival schedule, whether or not earlier ones
+    have finished."""
+
+    MODES = ("queries", "conversations")
+
+    def __init__(self, ocs_api_client: OCSAPIClient, exp_id: str, part_id: str, user_exp_id: str = None,
+                 create_sessions: bool = True, max_exchanges: int = 5, max_workers: int = 256,
+                 max_backlog: int = 10000):
+        """
+        Initialize the load generator.
+
+        The notebooks' loops are closed-loop: each worker waits for a response before sending its next request, so a
+        slow server just slows the test down, and measured latency hides the queueing real users would see. Here,
+        requests start on schedule regardless, and latency is measured from when each was scheduled to start (not
+        when a worker got to it), which corrects for coordinated omission.
+
+        Args:
+            ocs_api_client (OCSAPIClient): The OCS API client to use. Its connection pool (pool_maxsize) should be at
+              least max_workers (twice that for conversations that create sessions), and it shouldn't have a
+              concurrency limiter unless you mean to test it.
+            exp_id (str): The ID of the experiment to load.
+            part_id (str): The ID of the participant to use.
+            user_exp_id (str): The ID of the user simulator experiment (required for conversations). Defaults to
+              None.
+            create_sessions (bool): Whether to create sessions before sending first messages, as for OCSQueryRunner
+              and OCSBotToBotSimulator. Defaults to True.
+            max_exchanges (int): The maximum number of exchanges per conversation. Defaults to 5.
+            max_workers (int): The maximum number of queries or conversations in flight. Arrivals beyond that wait
+              for a free worker (with their wait counted in their latency). Defaults to 256.
+            max_backlog (int): The maximum number of arrivals waiting for a worker; arrivals beyond that are dropped
+              (and counted as errors), so that an overloaded test doesn't grow without bound. Defaults to 10000.
+        """
+
+        self.ocs_api_client = ocs_api_client
+        self.experiment_id = exp_id
+        self.participant_id = part_id
+        self.user_experiment_id = user_exp_id
+        self.create_sessions = create_sessions
+        self.max_exchanges = max_exchanges
+        self.max_workers = max_workers
+        self.max_backlog = max_backlog
+
+    def run(self, schedule: ArrivalSchedule, prompts: list[str], mode: str = "queries",
+            status_callback: callable = None, include_histograms: bool = False) -> dict:
+        """
+        Run a load test.
+
+        Args:
+            schedule (ArrivalSchedule): When to start each query or conversation.
+            prompts (list[str]): The queries (or conversation contexts) to send, cycled through in order.
+            mode (str): "queries" (single-turn queries, as run by OCSQueryRunner) or "conversations" (bot-to-bot
+              simulations, as run by OCSBotToBotSimulator, with latency measured for the whole conversation).
+              Defaults to "queries".
+            status_callback (callable, optional): A callback to report progress. Defaults to None. Should accept
+              three arguments: "STEP", the step index (as a string), and the step's arrival rate (as a string); it
+              is called as each step starts.
+            include_histograms (bool): Whether to include the full latency histograms in the results. Defaults to
+              False.
+
+        Returns:
+            dict: A dictionary with the following keys: "mode", "schedule", "steps" (a dictionary for each step,
+            with the following keys: "step", "offered_rate", "arrivals", "dropped", "completed", "errors",
+            "error_rate", "throughput" (completions per second of the step's arrivals), "latency_ms" (corrected for
+            coordinated omission), "service_latency_ms" (from when each actually started)), "overall" (totals and
+            latencies for the whole test), and "saturation" (as returned by find_saturation()).
+
+        Raises:
+            ValueError: If the mode isn't supported, or conversations are requested without a user simulator
+              experiment.
+        """
+
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported load test mode: {mode}")
+        if mode == "conversations" and not self.user_experiment_id:
+            raise ValueError("Load testing conversations requires a user simulator experiment")
+
+        if mode == "queries":
+            runner = OCSQueryRunner(self.ocs_api_client, self.experiment_id, self.participant_id,
+                                    self.create_sessions)
+            work = partial(runner.exec_query, continue_on_error=False)
+            closing = nullcontext()
+        else:
+            simulator = OCSBotToBotSimulator(self.ocs_api_client, self.experiment_id, self.user_experiment_id,
+                                             self.participant_id, self.create_sessions)
+            work = partial(simulator.exec_simulation, continue_on_error=False, max_exchanges=self.max_exchanges)
+            closing = simulator
+
+        steps = [_StepStats(rate) for rate in schedule.rates]
+        lock = threading.Lock()
+        backlog = threading.Semaphore(self.max_workers + self.max_backlog)
+        start_time = time.monotonic()
+
+        def execute(item_id: str, prompt: str, scheduled_at: float, step: _StepStats):
+            started_at = time.monotonic()
+            try:
+                work(item_id, prompt)
+                failed = False
+            except Exception as e:
+                logging.warning(f"Load test {mode[:-1]} {item_id} failed: {str(e)}")
+                failed = True
+            finally:
+                backlog.release()
+            finished_at = time.monotonic()
+
+            with lock:
+                step.corrected.record(finished_at - scheduled_at)
+                step.service.record(finished_at - started_at)
+                step.errors += failed
+                step.first_finished_at = min(step.first_finished_at or finished_at, finished_at)
+                step.last_finished_at = max(step.last_finished_at or finished_at, finished_at)
+
+        prompts = itertools.cycle(prompts)
+        current_step = -1
+        with closing, ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocs-load") as executor:
+            for number, (offset, step_index) in enumerate(schedule.arrivals()):
+                if step_index != current_step:
+                    current_step = step_index
+                    if status_callback:
+                        status_callback("STEP", str(step_index), str(schedule.rates[step_index]))
+
+                # wait until the arrival is due (never for earlier work to finish)
+                scheduled_at = start_time + offset
+                delay = scheduled_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                step = steps[step_index]
+                with lock:
+                    step.arrivals += 1
+                if not backlog.acquire(blocking=False):
+                    with lock:
+                        step.dropped += 1
+                    continue
+                executor.submit(execute, f"load-{number + 1}", next(prompts), scheduled_at, step)
+
+        # summarize
+        step_results = [step.result(index, schedule.step_seconds, include_histograms)
+                        for index, step in enumerate(steps)]
+        overall = _StepStats(None)
+        for step in steps:
+            overall.arrivals += step.arrivals
+            overall.dropped += step.dropped
+            overall.errors += step.errors
+            overall.corrected.merge(step.corrected)
+            overall.service.merge(step.service)
+        elapsed_seconds = time.monotonic() - start_time
+        overall_result = overall.result(None, elapsed_seconds, include_histograms)
+        overall_result["throughput"] = round(overall.corrected.count / elapsed_seconds, 3)
+        overall_result["elapsed_seconds"] = round(elapsed_seconds, 3)
+        del overall_result["step"], overall_result["offered_rate"]
+        return {"mode": mode, "schedule": schedule.describe(), "steps": step_results, "overall": overall_result,
+                "saturation": find_saturation(step_results)}
+
+
+def find_saturation(steps: list[dict], throughput_ratio: float = 0.9, latency_factor: float = 3.0,
+                    max_error_rate: float = 0.05) -> dict:
+    """
+    Find the step at which the system saturated, from a load test's step results.
+
+    A step is saturated if throughput falls short of the offered rate, corrected p99 latency grows well beyond the
+    first step's, or errors (including dropped arrivals) become frequent.
+
+    Args:
+        steps (list[dict]): The step results, as returned by OpenLoopLoadGenerator.run().
+        throughput_ratio (float): The fraction of the offered rate that throughput must reach. Defaults to 0.9.
+        latency_factor (float): How many times the first step's p99 latency a step's p99 may reach. Defaults to 3.0.
+        max_error_rate (float): The maximum error rate. Defaults to 0.05.
+
+    Returns:
+        dict: A dictionary with the following keys: "saturated" (bool), "step" (the first saturated step's index, or
+        None), "offered_rate" (its offered rate, or None), "max_sustainable_rate" (the highest offered rate before
+        it, or None), "reasons" (a list of strings).
+    """
+
+    baseline_p99 = steps[0]["latency_ms"]["p99"] if steps else None
+    sustainable_rate = None
+    for step in steps:
+        reasons = []
+        if step["throughput"] < throughput_ratio * step["offered_rate"]:
+            reasons.append(f"throughput {step['throughput']}/s is below {throughput_ratio:.0%} of the offered "
+                           f"{step['offered_rate']}/s")
+        p99 = step["latency_ms"]["p99"]
+        if baseline_p99 and p99 and p99 > latency_factor * baseline_p99:
+            reasons.append(f"p99 latency {p99} ms is over {latency_factor:g}x the first step's {baseline_p99} ms")
+        if step["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {step['error_rate']:.1%} is over {max_error_rate:.0%}")
+        if reasons:
+            return {"saturated": True, "step": step["step"], "offered_rate": step["offered_rate"],
+                    "max_sustainable_rate": sustainable_rate, "reasons": reasons}
+        sustainable_rate = step["offered_rate"] if sustainable_rate is None \
+            else max(sustainable_rate, step["offered_rate"])
+    return {"saturated": False, "step": None, "offered_rate": None, "max_sustainable_rate": sustainable_rate,
+            "reasons": []}
+
+
+def read_ocs_config(parser: argparse.ArgumentParser, config_path: str, base_url: str,
+                    options: dict[str, str]) -> dict[str, str]:
+    """
+    Read the API key and IDs for a command-line run from the "ocs" section of the notebooks' configuration file.
+
+    Against the production OCS API, every option is required, so that a run never sends traffic with a made-up key
+    or IDs; against any other base URL (e.g., a local mock server), missing options fall back to placeholders.
+
+    Args:
+        parser (argparse.ArgumentParser): The command-line parser, to report missing options with (exiting).
+        config_path (str): The path of the configuration file.
+        base_url (str): The OCS API base URL the run will use.
+        options (dict[str, str]): The options to read, each mapped to its placeholder value.
+
+    Returns:
+        dict[str, str]: The value of each option.
+    """
+
+    inifile = configparser.RawConfigParser()
+    inifile.read(os.path.expanduser(config_path))
+    if base_url.rstrip("/") == PRODUCTION_BASE_URL:
+        missing = [option for option in options if not inifile.get("ocs", option, fallback="")]
+        if missing:
+            parser.error(f"{config_path} is missing {', '.join(missing)} in its [ocs] section (required unless "
+                         f"--base-url points elsewhere, e.g. at a mock server)")
+    return {option: inifile.get("ocs", option, fallback=placeholder) for option, placeholder in options.items()}
+
+
+def main():
+    """
+    Run a load test from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Open-loop load test of an Open Chat Studio experiment.")
+    parser.add_argument("--config", default="~/.ocs/open-chat-studio-sim.ini",
+                        help="the notebooks' configuration file, for the API key and IDs (default: %(default)s)")
+    parser.add_argument("--base-url", default=PRODUCTION_BASE_URL,
+                        help="the OCS API base URL, e.g. for a local mock server (default: %(default)s)")
+    parser.add_argument("--mode", choices=OpenLoopLoadGenerator.MODES, default="queries",
+                        help="what to start on each arrival (default: %(default)s)")
+    parser.add_argument("--schedule", choices=("constant", "poisson", "step"), default="step",
+                        help="arrival schedule (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="arrivals per second, for constant and Poisson schedules (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="seconds, for constant and Poisson schedules (default: %(default)s)")
+    parser.add_argument("--rates", default="1,2,4,8,16",
+                        help="comma-separated arrivals per second, for step schedules (default: %(default)s)")
+    parser.add_argument("--step-seconds", type=float, default=60.0,
+                        help="seconds per step, for step schedules (default: %(default)s)")
+    parser.add_argument("--poisson-steps", action="store_true", help="use Poisson arrivals within each step")
+    parser.add_argument("--prompts", help=".csv file of prompts, with a \"query\" or \"context\" column (default: a "
+                                          "fixed prompt)")
+    parser.add_argument("--max-exchanges", type=int, default=5,
+                        help="maximum exchanges per conversation (default: %(default)s)")
+    parser.add_argument("--max-workers", type=int, default=256,
+                        help="maximum queries or conversations in flight (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="API read timeout in seconds, per attempt (default: %(default)s)")
+    parser.add_argument("--histograms", action="store_true", help="include full latency histograms in the output")
+    parser.add_argument("--output", help="file to write JSON results to (default: standard output)")
+    args = parser.parse_args()
+
+    # load configuration (the user simulator experiment is only needed for conversations)
+    options = {"ocs-api-key": "load-test", "experiment-id": "load-test-experiment",
+               "participant-id": "open-chat-studio-sim"}
+    if args.mode == "conversations":
+        options["user-simulator-experiment-id"] = "load-test-user-simulator"
+    config = read_ocs_config(parser, args.config, args.base_url, options)
+    api_key = config["ocs-api-key"]
+    experiment_id = config["experiment-id"]
+    user_experiment_id = config.get("user-simulator-experiment-id")
+    participant_id = config["participant-id"]
+
+    # load prompts
+    prompts = ["Hello! Can you tell me what you can help me with?"]
+    if args.prompts:
+        with open(args.prompts, newline="", encoding="utf-8") as file:
+            prompts = [row.get("query") or row.get("context") for row in csv.DictReader(file)]
+
+    if args.schedule == "constant":
+        schedule = ArrivalSchedule.constant(args.rate, args.duration)
+    elif args.schedule == "poisson":
+        schedule = ArrivalSchedule.poisson_process(args.rate, args.duration)
+    else:
+        schedule = ArrivalSchedule.step([float(rate) for rate in args.rates.split(",")], args.step_seconds,
+                                        args.poisson_steps)
+
+    def report(status: str, step: str, rate: str):
+        print(f"Step {step}: {rate} arrivals/s for {schedule.step_seconds:g} s...", file=sys.stderr)
+
+    client = OCSAPIClient(api_key, args.base_url, timeout_seconds=args.timeout,
+                          pool_maxsize=args.max_workers * (2 if args.mode == "conversations" else 1))
+    try:
+        generator = OpenLoopLoadGenerator(client, experiment_id, participant_id, user_experiment_id,
+                                          max_exchanges=args.max_exchanges, max_workers=args.max_workers)
+        results = generator.run(schedule, prompts, args.mode, report, args.histograms)
+    finally:
+        client.close()
+
+    for step in results["steps"]:
+        print(f"Step {step['step']}: offered {step['offered_rate']}/s, throughput {step['throughput']}/s, "
+              f"errors {step['error_rate']:.1%}, p50 {step['latency_ms']['p50']} ms, "
+              f"p99 {step['latency_ms']['p99']} ms", file=sys.stderr)
+    saturation = results["saturation"]
+    if saturation["saturated"]:
+        print(f"Saturated at {saturation['offered_rate']}/s (max sustainable rate: "
+              f"{saturation['max_sustainable_rate']}/s): {'; '.join(saturation['reasons'])}", file=sys.stderr)
+    else:
+        print(f"Not saturated up to {saturation['max_sustainable_rate']}/s", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+class _StepStats:
+    """Running totals for one step of a load test."""
+
+    def __init__(self, offered_rate: Optional[float]):
+        self.offered_rate = offered_rate
+        self.arrivals = 0
+        self.dropped = 0
+        self.errors = 0
+        self.first_finished_at = None
+        self.last_finished_at = None
+        self.corrected = LatencyHistogram()
+        self.service = LatencyHistogram()
+
+    def result(self, index: Optional[int], seconds: float, include_histograms: bool) -> dict:
+        completed = self.corrected.count
+        # measure throughput over the span in which the step's work finished (which trails the step itself by
+        # about one latency), falling back to the step's duration
+        span = self.last_finished_at - self.first_finished_at if completed > 1 and self.first_finished_at else 0.0
+        throughput = (completed - 1) / span if span > 0 else completed / seconds
+        result = {"step": index, "offered_rate": self.offered_rate, "arrivals": self.arrivals,
+                  "dropped": self.dropped, "completed": completed, "errors": self.errors,
+                  "error_rate": round((self.errors + self.dropped) / self.arrivals, 4) if self.arrivals else 0.0,
+                  "throughput": round(throughput, 3),
+                  "latency_ms": self.corrected.summary(), "service_latency_ms": self.service.summary()}
+        if include_histograms:
+            result["latency_histogram"] = self.corrected.to_dict()
+            result["service_latency_histogram"] = self.service.to_dict()
+        return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,338 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Micro-benchmarks for the notebooks' local (client-side CPU) stages, on synthetic inputs and without any network.
+
+Run the suite with "python ocs_microbenchmark.py run --messages 10000,100000 --output results.json", then compare two
+revisions' results with "python ocs_microbenchmark.py compare baseline.json results.json". Add 1000000 to the sizes to
+measure at the scale of the largest exports (which takes about ten times as long as the defaults, and far more memory).
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from operator import itemgetter
+import pandas as pd
+from ocs_benchmark import compare_results, print_comparisons, load_results, run_metadata
+from ocs_json import default_json_codec
+from ocs_simulation_support import ConversationReplayer
+
+# the replay notebook's output columns
+REPLAY_FIELDNAMES = ["message_id", "session_id", "replay_session_id", "completion_id", "query", "response",
+                     "orig_response", "context"]
+
+# the default input sizes (in messages; pass 1_000_000 as well, via --messages, for the largest exports)
+DEFAULT_MESSAGE_COUNTS = (10_000, 100_000)
+
+# metrics compared between runs, and whether higher values are better
+COMPARED_METRICS = {"seconds": False}
+
+
+class SyntheticInputs:
+    """Synthetic inputs for the local stages, in memory and as the .csv files the notebooks read."""
+
+    def __init__(self, directory: str, num_messages: int, conversation_length: int = 20, message_words: int = 40,
+                 seed: int = 0):
+        """
+        Generate the inputs.
+
+        Args:
+            directory (str): The directory to write input files to.
+            num_messages (int): The number of messages: rows of the conversation export to replay, and of the
+              simulation and query inputs.
+            conversation_length (int): The number of messages (human and AI) per exported conversation. Defaults to
+              20.
+            message_words (int): The number of words per message. Defaults to 40.
+            seed (int): The random seed, so that runs see the same inputs. Defaults to 0.
+        """
+
+        rng = random.Random(seed)
+
+        # messages include commas, quotes, and line breaks, like real chats (and so need quoting in .csv files)
+        def message(index: int) -> str:
+            words = [_WORDS[rng.randrange(len(_WORDS))] for _ in range(message_words)]
+            return f"Message {index}, \"{words[0]}\": " + " ".join(words[1:]) + ("\nThanks!" if index % 5 == 0 else "")
+
+        self.num_messages = num_messages
+        self.export_rows = [{"Message ID": index, "Message Type": "human" if index % 2 == 0 else "ai",
+                             "Message Content": message(index),
+                             "Session ID": f"session-{index // conversation_length}"}
+                            for index in range(num_messages)]
+        self.export_file = os.path.join(directory, f"conversations_to_replay_{num_messages}.csv")
+        _write_csv(self.export_file, ["Message ID", "Message Type", "Message Content", "Session ID"],
+                   self.export_rows)
+        self.simulations_file = os.path.join(directory, f"simulations_to_run_{num_messages}.csv")
+        _write_csv(self.simulations_file, ["simulation_id", "context"],
+                   [{"simulation_id": index + 1, "context": row["Message Content"]}
+                    for index, row in enumerate(self.export_rows)])
+
+        # replay jobs, and the results and simulation output rows they would lead to
+        self.jobs = ConversationReplayer.build_jobs(self.export_rows)
+        self.contexts = [json.dumps(job["history"]) for job in self.jobs]
+        self.replay_results = [_replay_result(job, f"replay-{job['session_id']}", job["orig_response"], context)
+                               for job, context in zip(self.jobs, self.contexts)]
+        conversations = {}
+        for job in self.jobs:
+            conversations.setdefault(job["session_id"], []).append([job["query"], job["orig_response"]])
+        self.simulation_results = [{"simulation_id": session_id, "experiment_session_id": session_id,
+                                    "context": "Simulation context", "messages": messages}
+                                   for session_id, messages in conversations.items()]
+
+
+def stage_variants() -> dict[str, dict[str, callable]]:
+    """
+    Get the benchmarked stages, each with the way the notebooks do it today (listed first) and the alternatives.
+
+    Each variant is a function that takes SyntheticInputs and a scratch directory, and does the stage's work.
+
+    Returns:
+        dict[str, dict[str, callable]]: The variants for each stage, by stage and variant name.
+    """
+
+    return {
+        "input_loading": {
+            # the simulation and query notebooks: read_csv(), then iterrows() to build (ID, text) tuples
+            "read_csv_iterrows": _load_with_iterrows,
+            "read_csv_itertuples": _load_with_itertuples,
+            "read_csv_to_dict": _load_with_to_dict,
+            "csv_dictreader": _load_with_dictreader
+        },
+        "replay_job_building": {
+            # the replay notebook: read_csv(), then to_dict("records") into build_jobs()
+            "read_csv_build_jobs": lambda inputs, directory: ConversationReplayer.build_jobs(
+                pd.read_csv(inputs.export_file).to_dict("records")),
+            "dictreader_build_jobs": lambda inputs, directory: ConversationReplayer.build_jobs(
+                _read_dicts(inputs.export_file))
+        },
+        "context_serialization": {
+            # exec_replay(): json.dumps() of each step's history
+            "json_dumps": lambda inputs, directory: [json.dumps(job["history"]) for job in inputs.jobs],
+            "json_codec": _serialize_with_codec
+        },
+        "result_building": {
+            # exec_replay()'s result dictionaries, and the simulation notebook's output rows
+            "replay_result_dicts": lambda inputs, directory: [
+                _replay_result(job, "replay-session", job["orig_response"], context)
+                for job, context in zip(inputs.jobs, inputs.contexts)],
+            "simulation_output_rows": _build_simulation_rows
+        },
+        "output_writing": {
+            # all three notebooks: csv.DictWriter with QUOTE_NONNUMERIC
+            "dictwriter_nonnumeric": lambda inputs, directory: _write_csv(
+                os.path.join(directory, "dictwriter.csv"), REPLAY_FIELDNAMES, inputs.replay_results,
+                quoting=csv.QUOTE_NONNUMERIC),
+            "dictwriter_minimal": lambda inputs, directory: _write_csv(
+                os.path.join(directory, "dictwriter_minimal.csv"), REPLAY_FIELDNAMES, inputs.replay_results,
+                quoting=csv.QUOTE_MINIMAL),
+            "writer_tuples": _write_with_writer,
+            "pandas_to_csv": _write_with_pandas
+        }
+    }
+
+
+def run_microbenchmarks(message_counts: tuple = DEFAULT_MESSAGE_COUNTS, stages: tuple = None, repeats: int = 3,
+                        conversation_length: int = 20, message_words: int = 40,
+                        status_callback: callable = None) -> dict:
+    """
+    Run the micro-benchmarks: each variant of each stage, at each input size.
+
+    Args:
+        message_counts (tuple): The input sizes, in messages. Defaults to (10_000, 100_000).
+        stages (tuple, optional): The stages to run (see stage_variants()). Defaults to None (all stages).
+        repeats (int): The number of times to run each variant; the fastest run is reported, as the least disturbed
+          by other activity. Defaults to 3.
+        conversation_length (int): The number of messages per exported conversation. Defaults to 20.
+        message_words (int): The number of words per message. Defaults to 40.
+        status_callback (callable, optional): A callback to report progress. Defaults to None. Should accept one
+          argument: the result of each case as it completes.
+
+    Returns:
+        dict: A dictionary with the following keys: "metadata" (the revision, platform, and settings) and "cases"
+        (a list of dictionaries, each with the following keys: "case" (a key identifying the case across runs),
+        "stage", "variant", "messages", "seconds" (fastest run), "median_seconds", "us_per_message").
+    """
+
+    variants = stage_variants()
+    results = {"metadata": run_metadata(repeats=repeats, conversation_length=conversation_length,
+                                        message_words=message_words),
+               "cases": []}
+    with tempfile.TemporaryDirectory() as directory:
+        for num_messages in message_counts:
+            inputs = SyntheticInputs(directory, num_messages, conversation_length, message_words)
+            for stage, stage_functions in variants.items():
+                if stages and stage not in stages:
+                    continue
+                for variant, function in stage_functions.items():
+                    timings = []
+                    for _ in range(repeats):
+                        start_time = time.perf_counter()
+                        function(inputs, directory)
+                        timings.append(time.perf_counter() - start_time)
+                    case = {"case": f"{stage}/{variant}/n{num_messages}", "stage": stage, "variant": variant,
+                            "messages": num_messages, "seconds": round(min(timings), 6),
+                            "median_seconds": round(statistics.median(timings), 6),
+                            "us_per_message": round(min(timings) * 1_000_000 / num_messages, 3)}
+                    results["cases"].append(case)
+                    if status_callback:
+                        status_callback(case)
+            del inputs
+    return results
+
+
+def main():
+    """
+    Run the micro-benchmarks, or compare two runs, from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark the notebooks' local stages on synthetic inputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the micro-benchmarks")
+    run_parser.add_argument("--output", help="file to write JSON results to (default: standard output)")
+    run_parser.add_argument("--messages", default=",".join(map(str, DEFAULT_MESSAGE_COUNTS)),
+                            help="comma-separated input sizes, in messages (default: %(default)s)")
+    run_parser.add_argument("--stages", default=None,
+                            help=f"comma-separated stages (default: all of {','.join(stage_variants())})")
+    run_parser.add_argument("--repeats", type=int, default=3, help="runs per variant (default: %(default)s)")
+    compare_parser = subparsers.add_parser("compare", help="compare two runs, flagging regressions")
+    compare_parser.add_argument("baseline", help="baseline results file")
+    compare_parser.add_argument("current", help="results file to compare against the baseline")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative change that counts as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        def report(case: dict):
+            print(f"{case['case']}: {case['seconds']:.4f} s ({case['us_per_message']} us/message)", file=sys.stderr)
+
+        results = run_microbenchmarks(tuple(int(count) for count in args.messages.split(",")),
+                                      tuple(args.stages.split(",")) if args.stages else None, args.repeats,
+                                      status_callback=report)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        else:
+            print(output)
+    else:
+        comparisons = compare_results(load_results(args.baseline), load_results(args.current), args.threshold,
+                                      COMPARED_METRICS)
+        sys.exit(1 if print_comparisons(comparisons, args.threshold) else 0)
+
+
+# words for synthetic messages
+_WORDS = ("the", "patient", "asked", "about", "malaria", "symptoms", "and", "whether", "to", "visit", "a", "clinic",
+          "nurse", "recommended", "rest", "fluids", "follow-up", "in", "two", "days", "if", "fever", "persists",
+          "medication", "dose", "child", "weight", "vaccination", "schedule", "appointment")
+
+
+def _load_with_iterrows(inputs: SyntheticInputs, directory: str) -> list[tuple[str, str]]:
+    """Load simulations as the notebooks do: read_csv() and iterrows()."""
+
+    simulations_to_run = pd.read_csv(inputs.simulations_file)
+    simulations = []
+    for index, row in simulations_to_run.iterrows():
+        simulations.append((str(row.get("simulation_id", index + 1)), row["context"]))
+    return simulations
+
+
+def _load_with_itertuples(inputs: SyntheticInputs, directory: str) -> list[tuple[str, str]]:
+    """Load simulations with read_csv() and itertuples(), which skips building a Series per row."""
+
+    simulations_to_run = pd.read_csv(inputs.simulations_file)
+    return [(str(row.simulation_id), row.context) for row in simulations_to_run.itertuples(index=False)]
+
+
+def _load_with_to_dict(inputs: SyntheticInputs, directory: str) -> list[tuple[str, str]]:
+    """Load simulations with read_csv() and to_dict("records")."""
+
+    records = pd.read_csv(inputs.simulations_file).to_dict("records")
+    return [(str(record["simulation_id"]), record["context"]) for record in records]
+
+
+def _load_with_dictreader(inputs: SyntheticInputs, directory: str) -> list[tuple[str, str]]:
+    """Load simulations with csv.DictReader, without pandas."""
+
+    return [(row["simulation_id"], row["context"]) for row in _read_dicts(inputs.simulations_file)]
+
+
+def _serialize_with_codec(inputs: SyntheticInputs, directory: str) -> list[str]:
+    """Serialize each step's history with the API clients' JSON codec (orjson, if installed)."""
+
+    codec = default_json_codec()
+    return [codec.dumps(job["history"]).decode("utf-8") for job in inputs.jobs]
+
+
+def _build_simulation_rows(inputs: SyntheticInputs, directory: str) -> list[dict]:
+    """Flatten simulation results into output rows, as the simulation notebook does."""
+
+    output_rows = []
+    for result in inputs.simulation_results:
+        for query, response in result["messages"]:
+            output_rows.append({
+                "simulation_id": result["simulation_id"],
+                "session_id": result["experiment_session_id"],
+                "context": result["context"],
+                "query": query,
+                "response": response
+            })
+    return output_rows
+
+
+def _write_with_writer(inputs: SyntheticInputs, directory: str):
+    """Write replay results with csv.writer and tuples, skipping DictWriter's per-row field checks."""
+
+    get_fields = itemgetter(*REPLAY_FIELDNAMES)
+    with open(os.path.join(directory, "writer.csv"), "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\")
+        writer.writerow(REPLAY_FIELDNAMES)
+        writer.writerows(map(get_fields, inputs.replay_results))
+
+
+def _write_with_pandas(inputs: SyntheticInputs, directory: str):
+    """Write replay results with DataFrame.to_csv()."""
+
+    results = pd.DataFrame(inputs.replay_results, columns=REPLAY_FIELDNAMES)
+    results.to_csv(os.path.join(directory, "pandas.csv"), index=False, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\")
+
+
+def _replay_result(job: dict, replay_session_id: str, response: str, context: str) -> dict:
+    """Build a result dictionary shaped like exec_replay()'s."""
+
+    return {
+        "message_id": job["message_id"],
+        "session_id": job["session_id"],
+        "replay_session_id": replay_session_id,
+        "completion_id": "",
+        "query": job["query"],
+        "response": response,
+        "orig_response": job["orig_response"],
+        "context": context
+    }
+
+
+def _read_dicts(path: str) -> list[dict]:
+    """Read a .csv file with csv.DictReader."""
+
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def _write_csv(path: str, fieldnames: list[str], rows: list[dict], quoting: int = csv.QUOTE_NONNUMERIC):
+    """Write rows with csv.DictWriter, as the notebooks do."""
+
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, quoting=quoting, escapechar="\\")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    main()
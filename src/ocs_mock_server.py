@@ -0,0 +1,628 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Local mock Open Chat Studio server, driven by ocs-api-schema.yaml, for load testing without LLM costs.
+
+Run it from the command line (e.g., "python ocs_mock_server.py --port 8000 --latency lognormal:0.8:0.5") or start it
+from Python with MockOCSServer, then point OCSAPIClient at it via base_url.
+"""
+
+import argparse
+import base64
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+import yaml
+from typing import Optional
+
+
+# the schema bundled with this repository
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ocs-api-schema.yaml")
+
+
+class LatencyDistribution:
+    """Distribution of simulated response latency."""
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, kind: str = "fixed", seconds: float = 0.0, spread: float = 0.0, max_seconds: float = None):
+        """
+        Initialize the distribution.
+
+        Args:
+            kind (str): The kind of distribution: "fixed" (always seconds), "uniform" (seconds plus or minus
+              spread), "normal" (mean seconds, standard deviation spread), "lognormal" (median seconds, log-space
+              standard deviation spread; realistic for LLM calls), or "exponential" (mean seconds). Defaults to
+              "fixed".
+            seconds (float): The central latency in seconds. Defaults to 0.0.
+            spread (float): The distribution's spread, as described for kind. Defaults to 0.0.
+            max_seconds (float, optional): A cap on sampled latencies. Defaults to None (no cap).
+
+        Raises:
+            ValueError: If the kind isn't supported.
+        """
+
+        if kind not in self.KINDS:
+            raise ValueError(f"Unsupported latency distribution: {kind}")
+
+        self.kind = kind
+        self.seconds = seconds
+        self.spread = spread
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """
+        Parse a distribution from a command-line spec like "fixed:0.2", "uniform:0.5:0.2", or "lognormal:0.8:0.5".
+
+        Args:
+            spec (str): The spec: the kind, seconds, and (optionally) spread and max_seconds, separated by colons.
+
+        Returns:
+            LatencyDistribution: The distribution.
+        """
+
+        parts = spec.split(":")
+        values = [float(part) for part in parts[1:]]
+        return cls(parts[0], *values)
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Sample a latency.
+
+        Args:
+            rng (random.Random): The random number generator to use.
+
+        Returns:
+            float: The latency in seconds (never negative).
+        """
+
+        if self.kind == "uniform":
+            latency = rng.uniform(self.seconds - self.spread, self.seconds + self.spread)
+        elif self.kind == "normal":
+            latency = rng.gauss(self.seconds, self.spread)
+        elif self.kind == "lognormal":
+            latency = rng.lognormvariate(math.log(self.seconds), self.spread) if self.seconds > 0 else 0.0
+        elif self.kind == "exponential":
+            latency = rng.expovariate(1 / self.seconds) if self.seconds > 0 else 0.0
+        else:
+            latency = self.seconds
+
+        latency = max(0.0, latency)
+        return min(latency, self.max_seconds) if self.max_seconds is not None else latency
+
+
+class MockOCSServer:
+    """In-memory stand-in for the Open Chat Studio API, serving the operations in ocs-api-schema.yaml."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, schema_path: str = DEFAULT_SCHEMA_PATH,
+                 latencies: Optional[dict[str, LatencyDistribution]] = None,
+                 error_rates: Optional[dict[str, dict]] = None, retry_after_seconds: Optional[float] = 1.0,
+                 end_after: Optional[dict[str, int]] = None, response_words: int = 30, page_size: int = 100,
+                 file_size_bytes: int = 1024 * 1024, num_experiments: int = 3, include_session_ids: bool = False,
+                 require_auth: bool = True, seed: Optional[int] = None):
+        """
+        Initialize the mock server.
+
+        Routes come from the schema's paths and operation IDs; operations without a mock implementation return
+        501. Experiments are created on first use (plus num_experiments listed from the start), sessions and their
+        messages are kept in memory, and file content is generated on demand (with Range support, for resumable
+        downloads). Responses to messages are generated text; for user simulator experiments, end_after scripts an
+        "END" response once a session has received enough messages, so bot-to-bot simulations finish.
+
+        Args:
+            host (str): The host to listen on. Defaults to "127.0.0.1".
+            port (int): The port to listen on. Defaults to 0 (any free port; see base_url once started).
+            schema_path (str): The path of the OCS API schema. Defaults to the schema bundled with this repository.
+            latencies (dict[str, LatencyDistribution], optional): Simulated latency per operation ID (e.g.,
+              "new_api_message"), with any "default" entry applying to other operations. Defaults to None (no added
+              latency).
+            error_rates (dict[str, dict], optional): Injected errors per operation ID (with any "default" entry
+              applying to other operations), each a dictionary mapping an HTTP status code (or "drop", to close the
+              connection without responding) to the probability of injecting it. Defaults to None (no errors).
+            retry_after_seconds (float, optional): The Retry-After header to send with injected 429 and 503 errors.
+              Defaults to 1.0.
+            end_after (dict[str, int], optional): For experiments that simulate users, the number of messages per
+              session after which to respond "END" (with any "*" entry applying to all experiments). Defaults to
+              None (never respond "END").
+            response_words (int): The number of words in each generated response. Defaults to 30.
+            page_size (int): The number of results per page of a list response. Defaults to 100.
+            file_size_bytes (int): The size of generated file content. Defaults to 1 MiB.
+            num_experiments (int): The number of experiments to list before any others are used. Defaults to 3.
+            include_session_ids (bool): Whether to include the session ID (as "session_id") in responses to new
+              messages, which the schema doesn't define, but the simulators need when they don't create sessions
+              themselves (create_sessions=False). Defaults to False (follow the schema).
+            require_auth (bool): Whether to require an API key (X-api-key) or bearer token, of any value. Defaults
+              to True.
+            seed (int, optional): A seed for the random number generator, for repeatable latencies, errors, and
+              content. Defaults to None.
+        """
+
+        # set parameters
+        self.host = host
+        self.port = port
+        self.latencies = latencies or {}
+        self.error_rates = error_rates or {}
+        self.retry_after_seconds = retry_after_seconds
+        self.end_after = end_after or {}
+        self.response_words = response_words
+        self.page_size = page_size
+        self.file_size_bytes = file_size_bytes
+        self.include_session_ids = include_session_ids
+        self.require_auth = require_auth
+
+        # load routes from the schema
+        with open(schema_path, encoding="utf-8") as file:
+            schema = yaml.safe_load(file)
+        self._routes = []
+        for path, operations in schema["paths"].items():
+            pattern = re.compile("^" + re.sub(r"\\{(\w+)\\}", r"(?P<\1>[^/]+)", re.escape(path)) + "$")
+            for method, operation in operations.items():
+                if isinstance(operation, dict) and "operationId" in operation:
+                    self._routes.append((method.upper(), pattern, operation["operationId"]))
+
+        # initialize state
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._experiments = {}
+        self._sessions = {}
+        self._participant_data = {}
+        self._files = {}
+        self._stats = {"requests": {}, "injected_errors": {}}
+        self._server = None
+        self._thread = None
+        for index in range(num_experiments):
+            self._experiment(str(uuid.UUID(int=self._rng.getrandbits(128), version=4)), f"Mock experiment {index + 1}")
+
+    @property
+    def base_url(self) -> str:
+        """The base URL to pass to the OCS API client (once the server has started)."""
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """
+        Start serving in a background thread.
+
+        Returns:
+            str: The base URL to pass to the OCS API client.
+        """
+
+        self._server = _MockHTTPServer((self.host, self.port), _MockRequestHandler)
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ocs-mock-server", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stats(self) -> dict:
+        """
+        Report server activity.
+
+        Returns:
+            dict: A dictionary with the following keys: "requests" and "injected_errors" (each a count per
+            operation ID), "sessions", "messages".
+        """
+
+        with self._lock:
+            return {"requests": dict(self._stats["requests"]), "injected_errors": dict(self._stats["injected_errors"]),
+                    "sessions": len(self._sessions),
+                    "messages": sum(len(session["messages"]) for session in self._sessions.values())}
+
+    def route(self, method: str, path: str) -> tuple[Optional[str], dict]:
+        """
+        Find the operation for a request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The URL path.
+
+        Returns:
+            tuple[Optional[str], dict]: The operation ID (or None if no route matches) and the path parameters.
+        """
+
+        for route_method, pattern, operation_id in self._routes:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                return operation_id, match.groupdict()
+        return None, {}
+
+    def plan_response(self, operation_id: str) -> tuple[float, Optional[object]]:
+        """
+        Sample the latency and any injected error for a request.
+
+        Args:
+            operation_id (str): The operation ID.
+
+        Returns:
+            tuple[float, Optional[object]]: The latency in seconds, and the status code (or "drop") to inject, if
+            any.
+        """
+
+        latency_distribution = self.latencies.get(operation_id, self.latencies.get("default"))
+        error_rates = self.error_rates.get(operation_id, self.error_rates.get("default", {}))
+        with self._lock:
+            self._stats["requests"][operation_id] = self._stats["requests"].get(operation_id, 0) + 1
+            latency = latency_distribution.sample(self._rng) if latency_distribution else 0.0
+            error = None
+            draw = self._rng.random()
+            for status, probability in error_rates.items():
+                if draw < probability:
+                    error = status
+                    self._stats["injected_errors"][operation_id] = \
+                        self._stats["injected_errors"].get(operation_id, 0) + 1
+                    break
+                draw -= probability
+        return latency, error
+
+    def handle(self, operation_id: str, path_params: dict, query: dict, body, base_url: str,
+               headers) -> tuple[int, dict, bytes]:
+        """
+        Handle a request for an operation.
+
+        Args:
+            operation_id (str): The operation ID.
+            path_params (dict): The path parameters.
+            query (dict): The query parameters (each a single value).
+            body: The parsed JSON body (if any).
+            base_url (str): The base URL the request was sent to, for building URLs in responses.
+            headers: The request headers.
+
+        Returns:
+            tuple[int, dict, bytes]: The status code, response headers, and response body.
+        """
+
+        handler = getattr(self, f"_handle_{operation_id}", None)
+        if handler is None:
+            return _json_response(501, {"detail": f"Operation {operation_id} is not implemented by the mock server"})
+        with self._lock:
+            return handler(path_params=path_params, query=query, body=body, base_url=base_url, headers=headers)
+
+    # operation handlers (called with the lock held)
+
+    def _handle_experiment_list(self, query: dict, base_url: str, **kwargs) -> tuple[int, dict, bytes]:
+        experiments = [self._experiment_json(experiment_id, base_url) for experiment_id in self._experiments]
+        return _json_response(200, self._page(experiments, query, f"{base_url}/api/experiments/"))
+
+    def _handle_experiment_retrieve(self, path_params: dict, base_url: str, **kwargs) -> tuple[int, dict, bytes]:
+        if path_params["id"] not in self._experiments:
+            return _json_response(404, {"detail": "Not found."})
+        return _json_response(200, self._experiment_json(path_params["id"], base_url))
+
+    def _handle_file_content(self, path_params: dict, headers, **kwargs) -> tuple[int, dict, bytes]:
+        file_id = path_params["id"]
+        if file_id not in self._files:
+            self._files[file_id] = random.Random(f"{file_id}").randbytes(self.file_size_bytes)
+        content = self._files[file_id]
+
+        # serve byte ranges, so that downloads can resume
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", headers.get("Range", "").strip())
+        if not match:
+            return 200, {"Content-Type": "application/octet-stream"}, content
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+        if start >= len(content) or start > end:
+            return 416, {"Content-Range": f"bytes */{len(content)}"}, b""
+        return 206, {"Content-Type": "application/octet-stream",
+                     "Content-Range": f"bytes {start}-{end}/{len(content)}"}, content[start:end + 1]
+
+    def _handle_openai_chat_completions(self, path_params: dict, body, **kwargs) -> tuple[int, dict, bytes]:
+        experiment_id = path_params["experiment_id"]
+        messages = (body or {}).get("messages")
+        if not messages:
+            return _json_response(400, {"detail": "messages is required"})
+        self._experiment(experiment_id)
+        user_turns = sum(1 for message in messages if message.get("role") == "user")
+        content = self._generate_response(experiment_id, user_turns, messages[-1].get("content", ""))
+        return _json_response(200, {
+            "id": f"chatcmpl-{uuid.UUID(int=self._rng.getrandbits(128), version=4).hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "mock",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]
+        })
+
+    def _handle_update_participant_data(self, body, **kwargs) -> tuple[int, dict, bytes]:
+        if not body or "identifier" not in body or "data" not in body:
+            return _json_response(400, {"detail": "identifier and data are required"})
+        for experiment_data in body["data"]:
+            self._experiment(experiment_data["experiment"])
+            key = (body["identifier"], experiment_data["experiment"])
+            self._participant_data.setdefault(key, {}).update(experiment_data.get("data", {}))
+        return 200, {}, b""
+
+    def _handle_session_list(self, query: dict, base_url: str, **kwargs) -> tuple[int, dict, bytes]:
+        sessions = list(self._sessions.values())
+        ordering = query.get("ordering")
+        if ordering:
+            field = ordering.lstrip("-")
+            sessions.sort(key=lambda session: session.get(field) or "", reverse=ordering.startswith("-"))
+        results = [self._session_json(session, base_url) for session in sessions]
+        return _json_response(200, self._page(results, query, f"{base_url}/api/sessions/"))
+
+    def _handle_session_create(self, body, base_url: str, **kwargs) -> tuple[int, dict, bytes]:
+        if not body or "experiment" not in body:
+            return _json_response(400, {"detail": "experiment is required"})
+        session = self._new_session(body["experiment"], body.get("participant"))
+        for message in body.get("messages") or []:
+            session["messages"].append(_message(message.get("role", "user"), message.get("content", "")))
+        return _json_response(201, self._session_json(session, base_url))
+
+    def _handle_session_retrieve(self, path_params: dict, base_url: str, **kwargs) -> tuple[int, dict, bytes]:
+        session = self._sessions.get(path_params["id"])
+        if session is None:
+            return _json_response(404, {"detail": "Not found."})
+        return _json_response(200, {**self._session_json(session, base_url), "messages": session["messages"]})
+
+    def _handle_new_api_message(self, path_params: dict, body, **kwargs) -> tuple[int, dict, bytes]:
+        if not body or "message" not in body:
+            return _json_response(400, {"detail": "message is required"})
+        experiment_id = path_params["experiment_id"]
+        if body.get("session"):
+            session = self._sessions.get(body["session"])
+            if session is None or session["experiment"] != experiment_id:
+                return _json_response(404, {"detail": "Session not found."})
+        else:
+            session = self._new_session(experiment_id, None)
+
+        session["messages"].append(_message("user", body["message"]))
+        user_turns = sum(1 for message in session["messages"] if message["role"] == "user")
+        response = self._generate_response(experiment_id, user_turns, body["message"])
+        session["messages"].append(_message("assistant", response))
+        session["updated_at"] = session["messages"][-1]["created_at"]
+
+        result = {"response": response}
+        if self.include_session_ids:
+            result["session_id"] = session["id"]
+        return _json_response(200, result)
+
+    # helpers (called with the lock held)
+
+    def _experiment(self, experiment_id: str, name: str = None) -> dict:
+        """Get an experiment, creating it on first use."""
+
+        if experiment_id not in self._experiments:
+            self._experiments[experiment_id] = {"id": experiment_id,
+                                                "name": name or f"Mock experiment {len(self._experiments) + 1}"}
+        return self._experiments[experiment_id]
+
+    def _experiment_json(self, experiment_id: str, base_url: str) -> dict:
+        """Build the JSON for an experiment."""
+
+        return {**self._experiments[experiment_id], "url": f"{base_url}/api/experiments/{experiment_id}/"}
+
+    def _new_session(self, experiment_id: str, participant: Optional[str]) -> dict:
+        """Create a new session."""
+
+        self._experiment(experiment_id)
+        now = datetime.now(timezone.utc).isoformat()
+        session_id = str(uuid.UUID(int=self._rng.getrandbits(128), version=4))
+        session = {"id": session_id, "experiment": experiment_id, "participant": participant or "api-participant",
+                   "created_at": now, "updated_at": now, "messages": []}
+        self._sessions[session_id] = session
+        return session
+
+    def _session_json(self, session: dict, base_url: str) -> dict:
+        """Build the JSON for a session (without its messages)."""
+
+        return {"url": f"{base_url}/api/sessions/{session['id']}/", "id": session["id"],
+                "team": {"name": "Mock team", "slug": "mock-team"},
+                "experiment": self._experiment_json(session["experiment"], base_url),
+                "participant": {"identifier": session["participant"]},
+                "created_at": session["created_at"], "updated_at": session["updated_at"]}
+
+    def _page(self, results: list, query: dict, list_url: str) -> dict:
+        """Build a page of results, with cursor links."""
+
+        cursor = query.get("cursor")
+        offset = int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")) if cursor else 0
+        end = offset + self.page_size
+
+        def link(new_offset: int) -> str:
+            params = {key: value for key, value in query.items() if key != "cursor"}
+            params["cursor"] = base64.urlsafe_b64encode(str(new_offset).encode("ascii")).decode("ascii")
+            return f"{list_url}?{urlencode(params)}"
+
+        return {"next": link(end) if end < len(results) else None,
+                "previous": link(max(0, offset - self.page_size)) if offset > 0 else None,
+                "results": results[offset:end]}
+
+    def _generate_response(self, experiment_id: str, user_turns: int, message: str) -> str:
+        """Generate a response to a message, or "END" if the experiment's script says the conversation is over."""
+
+        end_after = self.end_after.get(experiment_id, self.end_after.get("*"))
+        if end_after is not None and user_turns > end_after:
+            return "END"
+        words = [_WORDS[self._rng.randrange(len(_WORDS))] for _ in range(self.response_words)]
+        return f"Response {user_turns} to \"{message[:40]}\": " + " ".join(words)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a deeper listen backlog, for load testing."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _MockRequestHandler(BaseHTTPRequestHandler):
+    """HTTP request handler that dispatches to the mock server."""
+
+    # keep connections alive between requests, and don't delay small responses (Nagle's algorithm plus delayed
+    # ACKs would add ~40ms per request)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        logging.debug(f"Mock OCS server: {format % args}")
+
+    def _dispatch(self, method: str):
+        mock = self.server.mock
+        parts = urlsplit(self.path)
+        body_bytes = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        # check authentication and find the operation
+        if mock.require_auth and not (self.headers.get("X-api-key")
+                                      or self.headers.get("Authorization", "").startswith("Bearer ")):
+            return self._send(*_json_response(401, {"detail": "Authentication credentials were not provided."}))
+        operation_id, path_params = mock.route(method, parts.path)
+        if operation_id is None:
+            return self._send(*_json_response(404, {"detail": "Not found."}))
+
+        # simulate latency and any injected error
+        latency, error = mock.plan_response(operation_id)
+        if latency:
+            time.sleep(latency)
+        if error == "drop":
+            self.close_connection = True
+            return
+        if error is not None:
+            headers = {"Retry-After": f"{mock.retry_after_seconds:g}"} \
+                if int(error) in (429, 503) and mock.retry_after_seconds is not None else {}
+            status, json_headers, content = _json_response(int(error), {"detail": "Injected error"})
+            return self._send(status, {**json_headers, **headers}, content)
+
+        # handle the request
+        try:
+            body = json.loads(body_bytes) if body_bytes else None
+        except ValueError:
+            return self._send(*_json_response(400, {"detail": "Invalid JSON"}))
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        base_url = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+        self._send(*mock.handle(operation_id, path_params, query, body, base_url, self.headers))
+
+    def _send(self, status: int, headers: dict, content: bytes):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+# words for generated responses
+_WORDS = ("the", "a", "chatbot", "helps", "with", "health", "questions", "and", "answers", "clearly", "please",
+          "remember", "to", "drink", "water", "visit", "your", "clinic", "for", "advice", "today", "thanks",
+          "happy", "help", "more", "information", "about", "this", "topic", "is", "available")
+
+
+def _json_response(status: int, payload) -> tuple[int, dict, bytes]:
+    """
+    Build a JSON response.
+
+    Args:
+        status (int): The HTTP status code.
+        payload: The object to send as JSON.
+
+    Returns:
+        tuple[int, dict, bytes]: The status code, response headers, and response body.
+    """
+
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+def _message(role: str, content: str) -> dict:
+    """
+    Build a session message.
+
+    Args:
+        role (str): The message role ("user", "assistant", or "system").
+        content (str): The message content.
+
+    Returns:
+        dict: The message, as a JSON object.
+    """
+
+    return {"created_at": datetime.now(timezone.utc).isoformat(), "role": role, "content": content,
+            "metadata": {}, "tags": [], "attachments": []}
+
+
+def main():
+    """
+    Run the mock server from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Run a local mock Open Chat Studio API server.")
+    parser.add_argument("--host", default="127.0.0.1", help="host to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="path of the OCS API schema")
+    parser.add_argument("--latency", action="append", default=[], metavar="[OPERATION=]KIND:SECONDS[:SPREAD[:MAX]]",
+                        help="latency distribution, for all operations or one (e.g., "
+                             "new_api_message=lognormal:0.8:0.5); may be repeated")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="[OPERATION=]STATUS:PROBABILITY",
+                        help="injected error rate, for all operations or one (e.g., 503:0.02 or drop:0.01); may be "
+                             "repeated")
+    parser.add_argument("--end-after", action="append", default=[], metavar="EXPERIMENT_ID=MESSAGES",
+                        help="respond END after this many messages per session (use * for all experiments); may be "
+                             "repeated")
+    parser.add_argument("--response-words", type=int, default=30, help="words per generated response (default: 30)")
+    parser.add_argument("--page-size", type=int, default=100, help="results per list page (default: 100)")
+    parser.add_argument("--include-session-ids", action="store_true",
+                        help="include session IDs in new message responses (beyond the schema)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed, for repeatable runs")
+    args = parser.parse_args()
+
+    latencies = {}
+    for spec in args.latency:
+        operation_id, _, distribution = spec.rpartition("=")
+        latencies[operation_id or "default"] = LatencyDistribution.parse(distribution)
+    error_rates = {}
+    for spec in args.error_rate:
+        operation_id, _, rate = spec.rpartition("=")
+        status, probability = rate.split(":")
+        error_rates.setdefault(operation_id or "default", {})[status if status == "drop" else int(status)] = \
+            float(probability)
+    end_after = {}
+    for spec in args.end_after:
+        experiment_id, _, messages = spec.rpartition("=")
+        end_after[experiment_id or "*"] = int(messages)
+
+    server = MockOCSServer(args.host, args.port, args.schema, latencies, error_rates, end_after=end_after,
+                           response_words=args.response_words, page_size=args.page_size,
+                           include_session_ids=args.include_session_ids, seed=args.seed)
+    server.start()
+    print(f"Mock OCS server listening at {server.base_url} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
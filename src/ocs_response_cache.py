@@ -0,0 +1,175 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Opt-in cache for Open Chat Studio API GET responses, shared by the blocking and asyncio clients."""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class ResponseCache:
+    """LRU cache of OCS API GET responses, with per-endpoint TTLs and conditional revalidation."""
+
+    # by default, cache only experiment metadata, which rarely changes
+    DEFAULT_TTLS = {
+        "experiment_retrieve": 300.0,
+        "experiment_list": 60.0
+    }
+
+    def __init__(self, ttls: Optional[dict[str, float]] = None, max_entries: int = 1024, revalidate: bool = True):
+        """
+        Initialize the response cache.
+
+        Endpoints are identified by their operation IDs in ocs-api-schema.yaml (e.g., "experiment_retrieve"). Only
+        endpoints with a TTL are cached. Within its TTL, a cached response is returned without any request. After
+        that, if the server supplied an ETag or Last-Modified header, the client sends a conditional request and
+        reuses the cached response on a 304 Not Modified.
+
+        Args:
+            ttls (dict[str, float], optional): The number of seconds to treat responses from each endpoint as fresh.
+              Defaults to DEFAULT_TTLS.
+            max_entries (int): The maximum number of responses to keep; the least recently used are evicted first.
+              Defaults to 1024.
+            revalidate (bool): Whether to revalidate expired responses with conditional requests (rather than simply
+              refetching them). Defaults to True.
+        """
+
+        # set parameters
+        self.ttls = dict(self.DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.revalidate = revalidate
+
+        # initialize state
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "revalidations": 0, "not_modified": 0, "evictions": 0}
+
+    def caches(self, endpoint: Optional[str]) -> bool:
+        """
+        Determine whether responses from an endpoint are cached.
+
+        Args:
+            endpoint (str, optional): The endpoint's operation ID.
+
+        Returns:
+            bool: True if the endpoint has a TTL.
+        """
+
+        return endpoint in self.ttls
+
+    @staticmethod
+    def make_key(endpoint: str, url: str, params: Optional[dict] = None) -> tuple:
+        """
+        Build the cache key for a request.
+
+        Args:
+            endpoint (str): The endpoint's operation ID.
+            url (str): The request URL.
+            params (dict, optional): The request's query parameters. Defaults to None.
+
+        Returns:
+            tuple: The cache key.
+        """
+
+        return endpoint, url, tuple(sorted((params or {}).items()))
+
+    def lookup(self, key: tuple) -> tuple[Optional[Any], dict]:
+        """
+        Look up a cached response.
+
+        Args:
+            key (tuple): The cache key, from make_key().
+
+        Returns:
+            tuple[Optional[Any], dict]: The cached response body if it's still fresh (or None), plus any conditional
+            request headers to send when it isn't (empty if there's nothing to revalidate).
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None, {}
+
+            self._entries.move_to_end(key)
+            if time.monotonic() < entry["expires_at"]:
+                self._stats["hits"] += 1
+                return copy.deepcopy(entry["body"]), {}
+
+            # expired: revalidate if we can, otherwise treat as a miss
+            headers = {}
+            if self.revalidate:
+                if entry["etag"]:
+                    headers["If-None-Match"] = entry["etag"]
+                if entry["last_modified"]:
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            if headers:
+                self._stats["revalidations"] += 1
+            else:
+                self._stats["misses"] += 1
+            return None, headers
+
+    def not_modified(self, key: tuple) -> Optional[Any]:
+        """
+        Handle a 304 Not Modified response to a conditional request, renewing the cached response.
+
+        Args:
+            key (tuple): The cache key, from make_key().
+
+        Returns:
+            Optional[Any]: The cached response body, or None if it has since been evicted.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry["expires_at"] = time.monotonic() + self.ttls[key[0]]
+            self._stats["not_modified"] += 1
+            return copy.deepcopy(entry["body"])
+
+    def store(self, key: tuple, body: Any, headers) -> None:
+        """
+        Store a response.
+
+        Args:
+            key (tuple): The cache key, from make_key().
+            body (Any): The response body (parsed JSON).
+            headers: The response headers (a case-insensitive mapping).
+        """
+
+        with self._lock:
+            self._entries[key] = {
+                "body": copy.deepcopy(body),
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "expires_at": time.monotonic() + self.ttls[key[0]]
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """
+        Remove all cached responses.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Report cache activity.
+
+        Returns:
+            dict: A dictionary with the following keys: "entries", "hits", "misses", "revalidations" (conditional
+            requests sent), "not_modified" (conditional requests answered with 304), "evictions".
+        """
+
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
@@ -4,16 +4,34 @@
 
 """Open Chat Studio support functions for data generation and simulation."""
 
-from ocs_api import OCSAPIClient
+from ocs_api import OCSAPIClient, OCSCircuitOpenError, deadline, remaining_deadline_seconds
+from ocs_flow_control import AdaptiveConcurrencyLimiter, CircuitBreaker
+from ocs_cassette import cassette_scope
+import contextvars
 import logging
-from athina.datasets import Dataset
-from athina.keys import AthinaApiKey
+import threading
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from typing import Iterable, Iterator
+
+# athina is only needed to create datasets (not to run simulations, queries, or replays, e.g., in load tests and
+# benchmarks), so carry on without it if it won't import
+try:
+    from athina.datasets import Dataset
+    from athina.keys import AthinaApiKey
+except ImportError:
+    Dataset = AthinaApiKey = None
+
+# how many times to try a call the circuit breaker refuses, waiting for the breaker to reset in between
+BREAKER_RETRY_ATTEMPTS = 3
 
 
 class OCSBotToBotSimulator:
     """A class to simulate bot-to-bot conversations using the Open Chat Studio API."""
 
-    def __init__(self, ocs_api_client: OCSAPIClient, exp_id: str, user_exp_id: str, part_id: str):
+    def __init__(self, ocs_api_client: OCSAPIClient, exp_id: str, user_exp_id: str, part_id: str,
+                 create_sessions: bool = True, turn_deadline_seconds: float = None):
         """
         Initialize for bot-to-bot simulation.
 
@@ -22,6 +40,15 @@ class OCSBotToBotSimulator:
             exp_id (str): The ID of the AI assistant experiment.
             user_exp_id (str): The ID of the user simulator experiment.
             part_id (str): The ID of the participant to use.
+            create_sessions (bool): Whether to explicitly create sessions (for our participant) before sending the
+              first messages. If False, the first message on each side is sent without a session, OCS starts a new
+              one, and its ID is taken from the response; this saves two round trips per simulation, but relies on
+              undocumented server behaviour (the OCS API schema's NewAPIMessageResponse has only "response"). If a
+              response doesn't include a session ID, the simulation fails with a ValueError. Default is True, which
+              is the documented (and safe) way.
+            turn_deadline_seconds (float): The time allowed for each exchange (the experiment's response plus the
+              user simulator's reply), including any retries. If an exchange runs out of time, the simulation fails
+              with an OCSDeadlineExceededError. Default is None (no deadline).
         """
 
         # remember details for future calls
@@ -29,6 +56,48 @@ class OCSBotToBotSimulator:
         self.experiment_id = exp_id
         self.user_experiment_id = user_exp_id
         self.participant_id = part_id
+        self.create_sessions = create_sessions
+        self.turn_deadline_seconds = turn_deadline_seconds
+
+        # background threads for session setup that can overlap with the user simulator's opening message (started
+        # on first use, so there's nothing to clean up until sessions are created)
+        self._setup_executor = None
+        self._setup_lock = threading.Lock()
+
+    def close(self):
+        """
+        Stop the simulator's background session setup threads (if any were started).
+
+        Session setup that hasn't started yet is cancelled, but a session creation already in flight can't be
+        stopped: it finishes in the background, leaving an unused session. The simulator can still be used after
+        closing; it starts new threads as needed.
+        """
+
+        with self._setup_lock:
+            executor, self._setup_executor = self._setup_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _setup_threads(self) -> ThreadPoolExecutor:
+        """
+        Get the background session setup threads, starting them on first use.
+
+        Returns:
+            ThreadPoolExecutor: The session setup threads (one per simulation that can run at once, which is at most
+            the client's connection pool size).
+        """
+
+        with self._setup_lock:
+            if self._setup_executor is None:
+                self._setup_executor = ThreadPoolExecutor(max_workers=self.ocs_api_client.pool_maxsize,
+                                                          thread_name_prefix="ocs-sim-setup")
+            return self._setup_executor
 
     def exec_simulation(self, simulation_id: str, simulation_context: str, continue_on_error: bool = True,
                         max_exchanges: int = 20) -> dict:
@@ -44,43 +113,64 @@ class OCSBotToBotSimulator:
         Returns:
             dict: A dictionary with the following keys: "simulation_id", "user_session_id", "experiment_session_id",
             "context", "messages".
+
+        Raises:
+            ValueError: If create_sessions is False and the server doesn't return a session ID with the first
+              message response on either side (recorded in the result instead, if continue_on_error is True).
         """
 
         # initialize for new simulation
         messages = []
         user_session_id = ""
         experiment_session_id = ""
+        experiment_session_future = None
+        breaker = self.ocs_api_client.circuit_breaker
 
         try:
-            # create a new session for the user simulator experiment
-            api_response = self.ocs_api_client.create_experiment_session(self.user_experiment_id,
-                                                                         self.participant_id)
-            user_session_id = api_response["id"]
+            # create a new session for the user simulator experiment (unless we're letting OCS start one), while
+            # creating the experiment session in the background, since that doesn't depend on the user simulator
+            if self.create_sessions:
+                experiment_session_future = self._setup_threads().submit(
+                    contextvars.copy_context().run, _call_through_breaker, breaker,
+                    self.ocs_api_client.create_experiment_session, self.experiment_id, self.participant_id)
+                api_response = _call_through_breaker(breaker, self.ocs_api_client.create_experiment_session,
+                                                     self.user_experiment_id, self.participant_id)
+                user_session_id = api_response["id"]
 
             # send the context message as the first user message, use response as the first message to experiment
-            api_response = self.ocs_api_client.send_new_api_message(self.user_experiment_id, simulation_context,
-                                                                    user_session_id)
+            api_response = _call_through_breaker(breaker, self.ocs_api_client.send_new_api_message,
+                                                 self.user_experiment_id, simulation_context, user_session_id)
+            if not user_session_id:
+                user_session_id = _session_id_from_response(api_response, self.user_experiment_id)
             user_message = api_response["response"]
 
-            # create a new session for the experiment
-            api_response = self.ocs_api_client.create_experiment_session(self.experiment_id, self.participant_id)
-            experiment_session_id = api_response["id"]
+            # wait for the new experiment session (unless we're letting OCS start one)
+            if experiment_session_future:
+                api_response = experiment_session_future.result()
+                experiment_session_id = api_response["id"]
 
-            # loop while user_message is not "END"
+            # loop while user_message is not "END", holding each exchange to the turn deadline (if any)
             while user_message.strip().upper() != "END" and len(messages) < max_exchanges:
-                # send simulated user message to the experiment
-                api_response = self.ocs_api_client.send_new_api_message(self.experiment_id, user_message,
-                                                                        experiment_session_id)
-                ai_message = api_response["response"]
-
-                # keep track of our exchanges
-                messages.append([user_message, ai_message])
-
-                # send AI response back to the user simulator
-                api_response = self.ocs_api_client.send_new_api_message(self.user_experiment_id,
-                                                                        ai_message, user_session_id)
-                user_message = api_response["response"]
+                with deadline(self.turn_deadline_seconds) if self.turn_deadline_seconds else nullcontext():
+                    # send simulated user message to the experiment
+                    api_response = _call_through_breaker(breaker, self.ocs_api_client.send_new_api_message,
+                                                         self.experiment_id, user_message, experiment_session_id)
+                    if not experiment_session_id:
+                        experiment_session_id = _session_id_from_response(api_response, self.experiment_id)
+                    ai_message = api_response["response"]
+
+                    # keep track of our exchanges
+                    messages.append([user_message, ai_message])
+
+                    # send AI response back to the user simulator
+                    api_response = _call_through_breaker(breaker, self.ocs_api_client.send_new_api_message,
+                                                         self.user_experiment_id, ai_message, user_session_id)
+                    user_message = api_response["response"]
         except Exception as e:
+            # don't bother creating the experiment session if it hasn't started yet
+            if experiment_session_future:
+                experiment_session_future.cancel()
+
             if continue_on_error:
                 # log the error and continue to the next simulation
                 logging.error(f"Continuing following simulation error: {str(e)}")
@@ -99,7 +189,8 @@ class OCSBotToBotSimulator:
         }
 
     def exec_simulations(self, simulations: list[str, str], continue_on_error: bool = True,
-                         max_exchanges: int = 20, status_callback: callable = None) -> list[dict]:
+                         max_exchanges: int = 20, status_callback: callable = None,
+                         max_concurrency: int = None) -> list[dict]:
         """
         Execute a list of simulations.
 
@@ -109,27 +200,419 @@ class OCSBotToBotSimulator:
             max_exchanges (int): The maximum number of exchanges per simulation. Default is 20.
             status_callback (callable, optional): A callback function to report the status of simulations. Default is
               None. Should accept three arguments: a string indicating the status ("PRE-SIM" or "POST-SIM"), the
-              simulation ID, and the simulation context.
+              simulation ID, and the simulation context. When max_concurrency is greater than 1, it is called from
+              worker threads (and possibly from several at once). If the OCS API client has an adaptive concurrency
+              limiter, it is also called with "CONCURRENCY", the new limit (as a string), and the reason, whenever
+              the limit changes.
+            max_concurrency (int): The maximum number of simulations to run in parallel. Default is None: the
+              maximum limit of the OCS API client's adaptive concurrency limiter, capped at half the client's
+              connection pool size (if there's a limiter), otherwise 1 (run one after another). Keep this at or below
+              half the pool size, since each simulation can have two requests in flight while it creates sessions.
 
         Returns:
             list[dict]: List of dictionaries, each with the following keys: "simulation_id", "user_session_id",
-            "experiment_session_id", "context", "messages".
+            "experiment_session_id", "context", "messages". Results are in the same order as the input simulations.
+        """
+
+        return list(self.iter_simulations(simulations, continue_on_error, max_exchanges, status_callback,
+                                          max_concurrency, in_order=True))
+
+    def iter_simulations(self, simulations: Iterable[tuple[str, str]], continue_on_error: bool = True,
+                         max_exchanges: int = 20, status_callback: callable = None, max_concurrency: int = None,
+                         in_order: bool = False) -> Iterator[dict]:
+        """
+        Execute simulations, yielding each result as soon as its conversation ends.
+
+        Unlike exec_simulations(), results are not accumulated, so callers can write them out incrementally. If the
+        caller stops iterating early, simulations that haven't started yet are cancelled.
+
+        Args:
+            simulations (Iterable[tuple[str, str]]): The simulations to run, each a tuple of (ID, context). May be a
+              lazy iterable; it is consumed only as workers become free.
+            continue_on_error (bool): Whether to continue to the next simulation if an error occurs. Default is True.
+            max_exchanges (int): The maximum number of exchanges per simulation. Default is 20.
+            status_callback (callable, optional): A callback function to report the status of simulations, as for
+              exec_simulations(). Default is None.
+            max_concurrency (int): The maximum number of simulations to run in parallel, as for exec_simulations().
+              Default is None.
+            in_order (bool): Whether to yield results in input order (holding back results that finish early) rather
+              than in completion order. Default is False.
+
+        Yields:
+            dict: A dictionary for each simulation, with the same keys as returned by exec_simulation().
         """
 
-        results = []
-        for simulation_id, simulation_context in simulations:
+        def run_simulation(simulation: tuple[str, str]) -> dict:
+            simulation_id, simulation_context = simulation
+
             # report status to callback (if any)
             if status_callback:
                 status_callback("PRE-SIM", simulation_id, simulation_context)
 
-            # execute simulation and add to results
-            results.append(self.exec_simulation(simulation_id, simulation_context, continue_on_error, max_exchanges))
+            # execute simulation (within its own cassette scope, so it replays only its own recorded requests)
+            with cassette_scope(f"simulation {simulation_id}"):
+                result = self.exec_simulation(simulation_id, simulation_context, continue_on_error, max_exchanges)
 
             # report status to callback (if any)
             if status_callback:
                 status_callback("POST-SIM", simulation_id, simulation_context)
 
-        return results
+            return result
+
+        # (each simulation can use two connections at once, while it creates sessions)
+        yield from _iter_concurrently(run_simulation, simulations, max_concurrency, in_order,
+                                      self.ocs_api_client.concurrency_limiter, status_callback,
+                                      max(1, self.ocs_api_client.pool_maxsize // 2))
+
+
+class OCSQueryRunner:
+    """A class to run single-turn queries against an experiment using the Open Chat Studio API."""
+
+    def __init__(self, ocs_api_client: OCSAPIClient, exp_id: str, part_id: str, create_sessions: bool = True):
+        """
+        Initialize for running queries.
+
+        Args:
+            ocs_api_client (OCSAPIClient): The OCS API client to use.
+            exp_id (str): The ID of the experiment to query.
+            part_id (str): The ID of the participant to use.
+            create_sessions (bool): Whether to explicitly create a session (for our participant) before sending each
+              query. If False, each query is sent without a session, OCS starts a new one, and its ID is taken from
+              the response; this saves a round trip per query, but relies on undocumented server behaviour (the OCS
+              API schema's NewAPIMessageResponse has only "response"). If a response doesn't include a session ID,
+              the query fails with a ValueError. Default is True, which is the documented (and safe) way.
+        """
+
+        # remember details for future calls
+        self.ocs_api_client = ocs_api_client
+        self.experiment_id = exp_id
+        self.participant_id = part_id
+        self.create_sessions = create_sessions
+
+    def exec_query(self, query_id: str, query: str, continue_on_error: bool = True) -> dict:
+        """
+        Execute a single query in a new session.
+
+        Args:
+            query_id (str): The ID of the query.
+            query (str): The query to send.
+            continue_on_error (bool): Whether to record errors in the result (rather than raising them). Default is
+              True.
+
+        Returns:
+            dict: A dictionary with the following keys: "query_id", "session_id", "query", "response".
+
+        Raises:
+            ValueError: If create_sessions is False and the server doesn't return a session ID with the response
+              (recorded in the result instead, if continue_on_error is True).
+        """
+
+        session_id = ""
+        breaker = self.ocs_api_client.circuit_breaker
+        try:
+            # create a new session for the query (unless we're letting OCS start one)
+            if self.create_sessions:
+                api_response = _call_through_breaker(breaker, self.ocs_api_client.create_experiment_session,
+                                                     self.experiment_id, self.participant_id)
+                session_id = api_response["id"]
+
+            # send the query to the experiment
+            api_response = _call_through_breaker(breaker, self.ocs_api_client.send_new_api_message,
+                                                 self.experiment_id, query, session_id)
+            if not session_id:
+                session_id = _session_id_from_response(api_response, self.experiment_id)
+            response = api_response["response"]
+        except Exception as e:
+            if continue_on_error:
+                # log the error and continue to the next query
+                logging.error(f"Continuing following query error: {str(e)}")
+                response = f"ERROR: {str(e)}"
+            else:
+                # re-raise the exception
+                raise
+
+        # return result
+        return {
+            "query_id": query_id,
+            "session_id": session_id,
+            "query": query,
+            "response": response
+        }
+
+    def exec_queries(self, queries: list[tuple[str, str]], continue_on_error: bool = True,
+                     status_callback: callable = None, max_concurrency: int = None) -> list[dict]:
+        """
+        Execute a list of queries, each in a new session.
+
+        Args:
+            queries (list[tuple[str, str]]): The queries to run, each a tuple of (ID, query).
+            continue_on_error (bool): Whether to record errors and continue if an error occurs. Default is True.
+            status_callback (callable, optional): A callback function to report the status of queries. Default is
+              None. Should accept three arguments: a string indicating the status ("PRE-QUERY" or "POST-QUERY"), the
+              query ID, and the query. When max_concurrency is greater than 1, it is called from worker threads (and
+              possibly from several at once). If the OCS API client has an adaptive concurrency limiter, it is also
+              called with "CONCURRENCY", the new limit (as a string), and the reason, whenever the limit changes.
+            max_concurrency (int): The maximum number of queries to run in parallel. Default is None: the maximum
+              limit of the OCS API client's adaptive concurrency limiter, capped at the client's connection pool size
+              (if there's a limiter), otherwise 1. Keep this at or below the pool size.
+
+        Returns:
+            list[dict]: List of dictionaries, one per query and in the same order, with the keys returned by
+            exec_query().
+        """
+
+        return list(self.iter_queries(queries, continue_on_error, status_callback, max_concurrency, in_order=True))
+
+    def iter_queries(self, queries: Iterable[tuple[str, str]], continue_on_error: bool = True,
+                     status_callback: callable = None, max_concurrency: int = None,
+                     in_order: bool = False) -> Iterator[dict]:
+        """
+        Execute queries, yielding each result as soon as it's available.
+
+        Args:
+            queries (Iterable[tuple[str, str]]): The queries to run, each a tuple of (ID, query).
+            continue_on_error (bool): Whether to record errors and continue if an error occurs. Default is True.
+            status_callback (callable, optional): A callback function to report the status of queries, as for
+              exec_queries(). Default is None.
+            max_concurrency (int): The maximum number of queries to run in parallel, as for exec_queries(). Default
+              is None.
+            in_order (bool): Whether to yield results in input order rather than in completion order. Default is
+              False.
+
+        Yields:
+            dict: A dictionary for each query, with the keys returned by exec_query().
+        """
+
+        def run_query(query_to_run: tuple[str, str]) -> dict:
+            query_id, query = query_to_run
+
+            # report status to callback (if any)
+            if status_callback:
+                status_callback("PRE-QUERY", query_id, query)
+
+            # execute query (within its own cassette scope, so it replays only its own recorded requests)
+            with cassette_scope(f"query {query_id}"):
+                result = self.exec_query(query_id, query, continue_on_error)
+
+            # report status to callback (if any)
+            if status_callback:
+                status_callback("POST-QUERY", query_id, query)
+
+            return result
+
+        yield from _iter_concurrently(run_query, queries, max_concurrency, in_order,
+                                      self.ocs_api_client.concurrency_limiter, status_callback,
+                                      self.ocs_api_client.pool_maxsize)
+
+
+class ConversationReplayer:
+    """A class to replay conversation steps against an experiment using the Open Chat Studio API."""
+
+    def __init__(self, ocs_api_client: OCSAPIClient, exp_id: str, part_id: str):
+        """
+        Initialize for conversation replay.
+
+        Args:
+            ocs_api_client (OCSAPIClient): The OCS API client to use.
+            exp_id (str): The ID of the experiment to replay conversations with.
+            part_id (str): The ID of the participant to use.
+        """
+
+        # remember details for future calls
+        self.ocs_api_client = ocs_api_client
+        self.experiment_id = exp_id
+        self.participant_id = part_id
+
+    @staticmethod
+    def build_jobs(export_rows: Iterable[dict]) -> list[dict]:
+        """
+        Build replay jobs from the rows of an Open Chat Studio experiment session export.
+
+        Each human message followed by an AI response becomes one job, carrying the original conversation history up
+        to that point. Jobs share no state, so they can be replayed in any order.
+
+        Args:
+            export_rows (Iterable[dict]): Export rows, in conversation order, each with "Message ID", "Message Type"
+              ("human" or "ai"), "Message Content", and "Session ID" keys (e.g., from DataFrame.to_dict("records")).
+
+        Returns:
+            list[dict]: List of dictionaries, each with the following keys: "message_id", "session_id", "query",
+            "orig_response", "history" (a list of role/content message dictionaries).
+        """
+
+        jobs = []
+        orig_session_id = ""
+        orig_messages = []
+        user_message = ""
+        user_message_id = ""
+        for row in export_rows:
+            if orig_session_id != row["Session ID"]:
+                # initialize for new conversations
+                orig_session_id = row["Session ID"]
+                orig_messages = []
+                user_message = ""
+                user_message_id = ""
+
+            if row["Message Type"] == "human":
+                # remember user message, but only process when we get to the original AI response
+                user_message = row["Message Content"]
+                user_message_id = row["Message ID"]
+            elif user_message and row["Message Type"] == "ai":
+                orig_response = row["Message Content"]
+
+                # add a job for the step, with the history so far
+                jobs.append({
+                    "message_id": user_message_id,
+                    "session_id": orig_session_id,
+                    "query": user_message,
+                    "orig_response": orig_response,
+                    "history": list(orig_messages)
+                })
+
+                # add original exchange to message history
+                orig_messages.append({
+                    "role": "user",
+                    "content": user_message
+                })
+                orig_messages.append({
+                    "role": "assistant",
+                    "content": orig_response
+                })
+
+        return jobs
+
+    def exec_replay(self, job: dict, continue_on_error: bool = True, use_chat_completions: bool = False) -> dict:
+        """
+        Replay a single conversation step.
+
+        By default, each step takes two API calls: one to create a new session seeded with the original history and
+        one to send the user message. With use_chat_completions, the history and user message go out together in a
+        single chat completions call. That saves a round trip, but OCS creates the session server-side without our
+        participant ID and doesn't return its ID, so the result's "replay_session_id" is blank; the completion ID is
+        recorded as "completion_id" instead (blank when replaying with sessions).
+
+        Args:
+            job (dict): The job to replay, as returned by build_jobs().
+            continue_on_error (bool): Whether to record errors in the result (rather than raising them). Default is
+              True.
+            use_chat_completions (bool): Whether to replay with a single chat completions call. Default is False.
+
+        Returns:
+            dict: A dictionary with the following keys: "message_id", "session_id", "replay_session_id",
+            "completion_id", "query", "response", "orig_response", "context".
+        """
+
+        session_id = ""
+        completion_id = ""
+        breaker = self.ocs_api_client.circuit_breaker
+        try:
+            if use_chat_completions:
+                # send the original conversation history plus the user message in one call (the response identifies
+                # the completion, not the session OCS created for it)
+                messages = job["history"] + [{"role": "user", "content": job["query"]}]
+                api_response = _call_through_breaker(breaker, self.ocs_api_client.chat_completions,
+                                                     self.experiment_id, messages)
+                completion_id = api_response["id"]
+                response = api_response["choices"][0]["message"]["content"]
+            else:
+                # create a new session for the step, including the original conversation history
+                api_response = _call_through_breaker(breaker, self.ocs_api_client.create_experiment_session,
+                                                     self.experiment_id, self.participant_id, job["history"])
+                session_id = api_response["id"]
+
+                # send the user message to the experiment
+                api_response = _call_through_breaker(breaker, self.ocs_api_client.send_new_api_message,
+                                                     self.experiment_id, job["query"], session_id)
+                response = api_response["response"]
+        except Exception as e:
+            if continue_on_error:
+                # log the error and continue to the next step
+                logging.error(f"Continuing following error fetching conversation response: {str(e)}")
+                response = f"ERROR: {str(e)}"
+            else:
+                # re-raise the exception
+                raise
+
+        # return result
+        return {
+            "message_id": job["message_id"],
+            "session_id": job["session_id"],
+            "replay_session_id": session_id,
+            "completion_id": completion_id,
+            "query": job["query"],
+            "response": response,
+            "orig_response": job["orig_response"],
+            "context": json.dumps(job["history"])
+        }
+
+    def exec_replays(self, jobs: list[dict], continue_on_error: bool = True, status_callback: callable = None,
+                     max_concurrency: int = None, use_chat_completions: bool = False) -> list[dict]:
+        """
+        Replay a list of conversation steps.
+
+        Args:
+            jobs (list[dict]): The jobs to replay, as returned by build_jobs().
+            continue_on_error (bool): Whether to record errors and continue if an error occurs. Default is True.
+            status_callback (callable, optional): A callback function to report the status of replays. Default is
+              None. Should accept three arguments: a string indicating the status ("PRE-REPLAY" or "POST-REPLAY"),
+              the message ID, and the original session ID. When max_concurrency is greater than 1, it is called from
+              worker threads (and possibly from several at once). If the OCS API client has an adaptive concurrency
+              limiter, it is also called with "CONCURRENCY", the new limit (as a string), and the reason, whenever
+              the limit changes.
+            max_concurrency (int): The maximum number of steps to replay in parallel. Default is None: the maximum
+              limit of the OCS API client's adaptive concurrency limiter, capped at the client's connection pool size
+              (if there's a limiter), otherwise 1. Keep this at or below the pool size.
+            use_chat_completions (bool): Whether to replay each step with a single chat completions call (see
+              exec_replay()). Default is False.
+
+        Returns:
+            list[dict]: List of dictionaries, one per job and in the same order, with the keys returned by
+            exec_replay().
+        """
+
+        return list(self.iter_replays(jobs, continue_on_error, status_callback, max_concurrency, in_order=True,
+                                      use_chat_completions=use_chat_completions))
+
+    def iter_replays(self, jobs: Iterable[dict], continue_on_error: bool = True, status_callback: callable = None,
+                     max_concurrency: int = None, in_order: bool = False,
+                     use_chat_completions: bool = False) -> Iterator[dict]:
+        """
+        Replay conversation steps, yielding each result as soon as it's available.
+
+        Args:
+            jobs (Iterable[dict]): The jobs to replay, as returned by build_jobs().
+            continue_on_error (bool): Whether to record errors and continue if an error occurs. Default is True.
+            status_callback (callable, optional): A callback function to report the status of replays, as for
+              exec_replays(). Default is None.
+            max_concurrency (int): The maximum number of steps to replay in parallel, as for exec_replays(). Default
+              is None.
+            in_order (bool): Whether to yield results in input order rather than in completion order. Default is
+              False.
+            use_chat_completions (bool): Whether to replay each step with a single chat completions call (see
+              exec_replay()). Default is False.
+
+        Yields:
+            dict: A dictionary for each job, with the keys returned by exec_replay().
+        """
+
+        def run_replay(job: dict) -> dict:
+            # report status to callback (if any)
+            if status_callback:
+                status_callback("PRE-REPLAY", job["message_id"], job["session_id"])
+
+            # execute replay (within its own cassette scope, so it replays only its own recorded requests)
+            with cassette_scope(f"replay {job['message_id']}"):
+                result = self.exec_replay(job, continue_on_error, use_chat_completions)
+
+            # report status to callback (if any)
+            if status_callback:
+                status_callback("POST-REPLAY", job["message_id"], job["session_id"])
+
+            return result
+
+        yield from _iter_concurrently(run_replay, jobs, max_concurrency, in_order,
+                                      self.ocs_api_client.concurrency_limiter, status_callback,
+                                      self.ocs_api_client.pool_maxsize)
 
 
 def athina_create_dataset(athina_api_key: str, dataset_name: str, dataset_description: str,
@@ -145,7 +628,177 @@ def athina_create_dataset(athina_api_key: str, dataset_name: str, dataset_descri
 
     Returns:
         Dataset: The newly-created dataset.
+
+    Raises:
+        ImportError: If athina isn't installed (or won't import).
     """
 
+    if Dataset is None:
+        raise ImportError("Creating datasets requires athina (see requirements.txt)")
     AthinaApiKey.set_key(athina_api_key)
     return Dataset.create(name=dataset_name, description=dataset_description, rows=dataset_rows)
+
+
+def _session_id_from_response(api_response: dict, exp_id: str) -> str:
+    """
+    Get the ID of the session OCS started for a message sent without a session.
+
+    Args:
+        api_response (dict): The response from sending the message.
+        exp_id (str): The ID of the experiment the message was sent to (for the error message).
+
+    Returns:
+        str: The session ID.
+
+    Raises:
+        ValueError: If the response doesn't include a session ID.
+    """
+
+    session = api_response.get("session_id", api_response.get("session"))
+    if isinstance(session, dict):
+        session = session.get("id")
+    if not session:
+        raise ValueError(f"OCS didn't return a session ID with the response to the first message sent to experiment "
+                         f"{exp_id} (this isn't part of the OCS API schema); create sessions explicitly instead "
+                         f"(create_sessions=True)")
+    return session
+
+
+def _call_through_breaker(circuit_breaker: CircuitBreaker, func: callable, *args):
+    """
+    Make an API call, waiting for the circuit breaker to reset and trying the same call again whenever the breaker
+    refuses it, so that a conversation resumes where it stopped rather than starting over.
+
+    Args:
+        circuit_breaker (CircuitBreaker): The OCS API client's circuit breaker (if any).
+        func (callable): The OCS API client method to call.
+        *args: The arguments to call it with.
+
+    Returns:
+        The method's return value.
+
+    Raises:
+        OCSCircuitOpenError: If the breaker still refuses the call after BREAKER_RETRY_ATTEMPTS attempts.
+        OCSDeadlineExceededError: If the current deadline (if any) passes while waiting for the breaker.
+    """
+
+    for attempt in range(1, BREAKER_RETRY_ATTEMPTS + 1):
+        try:
+            return func(*args)
+        except OCSCircuitOpenError:
+            if attempt == BREAKER_RETRY_ATTEMPTS or circuit_breaker is None:
+                raise
+
+            # wait for the breaker's open period to pass (for no longer than the current deadline allows), then try
+            # the call again
+            logging.warning(f"Circuit breaker refused a call; retrying after it resets (attempt {attempt})")
+            remaining = remaining_deadline_seconds()
+            circuit_breaker.wait_for_reset(None if remaining is None else max(0.0, remaining))
+
+
+def _iter_concurrently(func: callable, items: Iterable, max_concurrency: int = None, in_order: bool = False,
+                       concurrency_limiter: AdaptiveConcurrencyLimiter = None, status_callback: callable = None,
+                       pool_size: int = None) -> Iterator:
+    """
+    Apply a function to each item on a bounded worker pool, yielding results as they become available.
+
+    Items are pulled from the iterable only as workers free up, so neither the inputs nor the results need to be held
+    in memory all at once. If the function raises, the exception is re-raised here and pending items are cancelled.
+
+    Args:
+        func (callable): The function to apply to each item.
+        items (Iterable): The items to process.
+        max_concurrency (int): The maximum number of items to process in parallel. Default is None: the maximum limit
+          of the concurrency limiter, capped at pool_size (if there's a limiter), otherwise 1 (process one after
+          another in the calling thread).
+        in_order (bool): Whether to yield results in input order rather than completion order. Default is False.
+        concurrency_limiter (AdaptiveConcurrencyLimiter, optional): The OCS API client's adaptive concurrency limiter
+          (if any), which actually governs how many requests are in flight. Default is None.
+        status_callback (callable, optional): A status callback to report limit changes to, as "CONCURRENCY" statuses.
+          Default is None.
+        pool_size (int, optional): The number of items that can run at once without waiting for a connection from the
+          OCS API client's pool, to cap the default max_concurrency. Default is None (no cap).
+
+    Yields:
+        The result of func for each item.
+    """
+
+    if max_concurrency is None:
+        max_concurrency = 1
+        if concurrency_limiter:
+            # (more workers than pooled connections would only queue for a connection, hiding the wait from the
+            # limiter)
+            max_concurrency = concurrency_limiter.max_limit if pool_size is None \
+                else max(1, min(concurrency_limiter.max_limit, pool_size))
+
+    # report concurrency limit changes while we're running
+    def report_limit(limit: int, reason: str):
+        status_callback("CONCURRENCY", str(limit), reason)
+
+    if concurrency_limiter and status_callback:
+        concurrency_limiter.add_listener(report_limit)
+        status_callback("CONCURRENCY", str(concurrency_limiter.limit), "initial limit")
+    try:
+        yield from _iter_with_pool(func, items, max_concurrency, in_order)
+    finally:
+        if concurrency_limiter and status_callback:
+            concurrency_limiter.remove_listener(report_limit)
+
+
+def _iter_with_pool(func: callable, items: Iterable, max_concurrency: int, in_order: bool) -> Iterator:
+    """
+    Apply a function to each item on a worker pool of a fixed size (see _iter_concurrently()).
+
+    Args:
+        func (callable): The function to apply to each item.
+        items (Iterable): The items to process.
+        max_concurrency (int): The maximum number of items to process in parallel.
+        in_order (bool): Whether to yield results in input order rather than completion order.
+
+    Yields:
+        The result of func for each item.
+    """
+
+    if max_concurrency <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    # in input order, allow some results to queue up behind a slow one so that workers aren't left idle
+    window = max_concurrency * 2 if in_order else max_concurrency
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = {}
+    completed = {}
+    next_index = 0
+    next_to_yield = 0
+    exhausted = False
+    try:
+        while True:
+            # keep the pool fed, up to the window size
+            while not exhausted and len(pending) + len(completed) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[executor.submit(contextvars.copy_context().run, func, item)] = next_index
+                next_index += 1
+
+            if not pending:
+                break
+
+            # wait for at least one result, then yield whatever we can
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                if in_order:
+                    completed[index] = future.result()
+                else:
+                    yield future.result()
+            while next_to_yield in completed:
+                yield completed.pop(next_to_yield)
+                next_to_yield += 1
+    finally:
+        # cancel anything not yet started (e.g., on error or early exit) without waiting for running work
+        executor.shutdown(wait=False, cancel_futures=True)
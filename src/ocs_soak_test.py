@@ -0,0 +1,600 @@
+#  Copyright (c) 2024 Dimagi, Inc.
+#
+#  BSD 3-Clause License: see LICENSE for details.
+
+"""Ramp and soak testing of bot-to-bot simulations, with interval sampling and drift (or leak) detection.
+
+Run it from the command line (e.g., "python ocs_soak_test.py --profile ramp:1:64:1800,hold:64:14400"), reading
+credentials from the notebooks' configuration file, or use SoakTestRunner from Python.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+from requests.adapters import BaseAdapter
+from ocs_api import OCSAPIClient
+from ocs_load_test import PRODUCTION_BASE_URL, LatencyHistogram, read_ocs_config
+from ocs_simulation_support import OCSBotToBotSimulator
+import psutil
+from typing import Optional
+
+
+class ConcurrencyProfile:
+    """How many conversations to keep running over time: a sequence of stages, each ramping or holding."""
+
+    def __init__(self, stages: list[tuple[float, int, int]]):
+        """
+        Initialize the profile.
+
+        Args:
+            stages (list[tuple[float, int, int]]): The stages, each a tuple of (duration in seconds, concurrency at
+              the start, concurrency at the end); concurrency changes linearly within each stage, so a stage with
+              the same start and end concurrency holds steady.
+
+        Raises:
+            ValueError: If there are no stages, or a stage has no duration or concurrency below 1.
+        """
+
+        if not stages or any(seconds <= 0 or min(start, end) < 1 for seconds, start, end in stages):
+            raise ValueError("Concurrency profiles need at least one stage, each with a duration and concurrency")
+
+        self.stages = [(float(seconds), int(start), int(end)) for seconds, start, end in stages]
+
+    @classmethod
+    def ramp_and_hold(cls, start_concurrency: int, peak_concurrency: int, ramp_seconds: float,
+                      hold_seconds: float) -> "ConcurrencyProfile":
+        """
+        Build a profile that ramps up, then holds at its peak (a soak test).
+
+        Args:
+            start_concurrency (int): The concurrency at the start of the ramp.
+            peak_concurrency (int): The concurrency at the end of the ramp, held thereafter.
+            ramp_seconds (float): How long to ramp for.
+            hold_seconds (float): How long to hold for.
+
+        Returns:
+            ConcurrencyProfile: The profile.
+        """
+
+        return cls([(ramp_seconds, start_concurrency, peak_concurrency),
+                    (hold_seconds, peak_concurrency, peak_concurrency)])
+
+    @classmethod
+    def parse(cls, spec: str) -> "ConcurrencyProfile":
+        """
+        Parse a profile from a command-line spec like "ramp:1:64:1800,hold:64:14400".
+
+        Args:
+            spec (str): Comma-separated stages, each "ramp:START:END:SECONDS" or "hold:CONCURRENCY:SECONDS".
+
+        Returns:
+            ConcurrencyProfile: The profile.
+
+        Raises:
+            ValueError: If the spec is invalid.
+        """
+
+        stages = []
+        for stage in spec.split(","):
+            parts = stage.strip().split(":")
+            if parts[0] == "ramp" and len(parts) == 4:
+                stages.append((float(parts[3]), int(parts[1]), int(parts[2])))
+            elif parts[0] == "hold" and len(parts) == 3:
+                stages.append((float(parts[2]), int(parts[1]), int(parts[1])))
+            else:
+                raise ValueError(f"Invalid profile stage: {stage}")
+        return cls(stages)
+
+    @property
+    def duration_seconds(self) -> float:
+        """The total duration of the profile."""
+
+        return sum(seconds for seconds, _, _ in self.stages)
+
+    @property
+    def max_concurrency(self) -> int:
+        """The highest concurrency in the profile."""
+
+        return max(max(start, end) for _, start, end in self.stages)
+
+    def concurrency_at(self, elapsed_seconds: float) -> int:
+        """
+        Get the target concurrency at a point in the profile.
+
+        Args:
+            elapsed_seconds (float): The time since the start of the profile.
+
+        Returns:
+            int: The number of conversations to keep running (0 once the profile is over).
+        """
+
+        stage_start = 0.0
+        for seconds, start, end in self.stages:
+            if elapsed_seconds < stage_start + seconds:
+                return round(start + (end - start) * (elapsed_seconds - stage_start) / seconds)
+            stage_start += seconds
+        return 0
+
+    def is_holding(self, start_seconds: float, end_seconds: float) -> bool:
+        """
+        Determine whether a span of the profile lies entirely within a holding stage.
+
+        Args:
+            start_seconds (float): The start of the span, from the start of the profile.
+            end_seconds (float): The end of the span.
+
+        Returns:
+            bool: True if the span is within a single stage whose concurrency doesn't change (allowing the span to
+            overrun the stage by up to a second, since samples are taken on a timer).
+        """
+
+        stage_start = 0.0
+        for seconds, start, end in self.stages:
+            stage_end = stage_start + seconds
+            if stage_start <= start_seconds < stage_end:
+                return start == end and end_seconds <= stage_end + 1.0
+            stage_start = stage_end
+        return False
+
+    def describe(self) -> dict:
+        """
+        Describe the profile.
+
+        Returns:
+            dict: A dictionary with the following keys: "stages" (each with "seconds", "start_concurrency", and
+            "end_concurrency" keys), "duration_seconds", "max_concurrency".
+        """
+
+        return {"stages": [{"seconds": seconds, "start_concurrency": start, "end_concurrency": end}
+                           for seconds, start, end in self.stages],
+                "duration_seconds": self.duration_seconds, "max_concurrency": self.max_concurrency}
+
+
+class SoakTestRunner:
+    """Runs bot-to-bot simulations under a concurrency profile, sampling stability metrics as it goes."""
+
+    # metrics checked for drift during holding stages, with the relative change over a hold that counts as drift
+    DRIFT_THRESHOLDS = {
+        "latency_ms.p50": 0.25,
+        "latency_ms.p99": 0.5,
+        "error_rate": 0.05,
+        "rss_mb": 0.2,
+        "open_connections": 0.5,
+        "threads": 0.5
+    }
+
+    def __init__(self, simulator: OCSBotToBotSimulator, max_exchanges: int = 20, sample_interval_seconds: float = 60.0,
+                 drift_thresholds: Optional[dict[str, float]] = None, finish_timeout_seconds: Optional[float] = None):
+        """
+        Initialize the runner.
+
+        Args:
+            simulator (OCSBotToBotSimulator): The simulator to run conversations with. Its OCS API client's connection
+              pool (pool_maxsize) should be at least twice the profile's maximum concurrency (for session setup).
+            max_exchanges (int): The maximum number of exchanges per conversation. Defaults to 20.
+            sample_interval_seconds (float): How often to sample metrics. Defaults to 60.0.
+            drift_thresholds (dict[str, float], optional): The metrics to check for drift during holding stages (as
+              for DRIFT_THRESHOLDS), each with the relative change over a hold that counts as drift (for error
+              rates, the absolute change). Defaults to DRIFT_THRESHOLDS.
+            finish_timeout_seconds (float, optional): How long to wait for running conversations to finish once the
+              profile is over; any still running are abandoned (and reported). Defaults to None: as long as a
+              conversation can take, given the client's per-call deadline or retry budget and the simulator's turn
+              deadline (see conversation_budget_seconds()).
+        """
+
+        self.simulator = simulator
+        self.max_exchanges = max_exchanges
+        self.sample_interval_seconds = sample_interval_seconds
+        self.drift_thresholds = dict(self.DRIFT_THRESHOLDS if drift_thresholds is None else drift_thresholds)
+        self.finish_timeout_seconds = finish_timeout_seconds \
+            if finish_timeout_seconds is not None else conversation_budget_seconds(simulator, max_exchanges)
+
+    def run(self, profile: ConcurrencyProfile, contexts: list[str], status_callback: callable = None) -> dict:
+        """
+        Run a ramp or soak test.
+
+        Conversations run back to back on as many workers as the profile calls for at each moment; when the target
+        drops, workers finish their current conversations before idling. Every sample interval, the runner records
+        request latency and errors (from the simulator's OCS API client), conversation counts and errors, and the
+        client process's resident memory, open network connections, and threads. Once the profile is over (and
+        running conversations have finished, or finish_timeout_seconds has passed), holding stages are checked for
+        drift: metrics that trend steadily up, like leaking memory or connections, or latency that degrades over
+        hours. If interrupted (e.g., with Ctrl+C), the runner doesn't wait for running conversations.
+
+        Args:
+            profile (ConcurrencyProfile): How many conversations to run at once, over time.
+            contexts (list[str]): The simulation contexts, cycled through in order.
+            status_callback (callable, optional): A callback to report progress. Defaults to None. Should accept
+              three arguments: "SAMPLE", the interval index (as a string), and the interval's metrics (a
+              dictionary, as in the results); it is called as each interval ends.
+
+        Returns:
+            dict: A dictionary with the following keys: "profile", "intervals" (a dictionary for each sample
+            interval, with the following keys: "interval", "start_seconds", "end_seconds", "target_concurrency",
+            "active_conversations", "holding" (whether the interval is within a holding stage), "conversations",
+            "conversation_errors", "requests", "request_errors", "error_rate" (of requests), "latency_ms",
+            "rss_mb", "open_connections", "threads"), "overall" (totals and request latencies for the whole test,
+            plus "abandoned_conversations": how many were still running when the runner stopped waiting for them),
+            and "stability" (as returned by detect_drift()).
+        """
+
+        client = self.simulator.ocs_api_client
+        contexts = itertools.cycle(contexts)
+        lock = threading.Lock()
+        stop = threading.Event()
+        state = {"target": 0, "active": 0, "number": 0}
+        interval = _IntervalStats()
+        overall = _IntervalStats()
+
+        def record_request(seconds: float, failed: bool):
+            with lock:
+                interval.record_request(seconds, failed)
+                overall.record_request(seconds, failed)
+
+        def work(worker_index: int):
+            while not stop.is_set():
+                with lock:
+                    if worker_index >= state["target"]:
+                        context = None
+                    else:
+                        state["number"] += 1
+                        state["active"] += 1
+                        simulation_id = f"soak-{state['number']}"
+                        context = next(contexts)
+                if context is None:
+                    stop.wait(0.25)
+                    continue
+
+                try:
+                    self.simulator.exec_simulation(simulation_id, context, continue_on_error=False,
+                                                   max_exchanges=self.max_exchanges)
+                    failed = False
+                except Exception as e:
+                    logging.warning(f"Soak test simulation {simulation_id} failed: {str(e)}")
+                    failed = True
+                with lock:
+                    state["active"] -= 1
+                    for stats in (interval, overall):
+                        stats.conversations += 1
+                        stats.conversation_errors += failed
+
+        # time every request the simulator's client sends, restoring its transport adapters afterward
+        original_adapters = dict(client.session.adapters)
+        for prefix, adapter in original_adapters.items():
+            client.session.mount(prefix, _RequestTimingAdapter(adapter, record_request))
+        workers = [threading.Thread(target=work, args=(index,), name=f"ocs-soak-{index}", daemon=True)
+                   for index in range(profile.max_concurrency)]
+        intervals = []
+        start_time = time.monotonic()
+        interrupted = False
+        try:
+            for worker in workers:
+                worker.start()
+
+            # follow the profile, sampling at the end of each interval
+            interval_start = 0.0
+            while True:
+                elapsed = time.monotonic() - start_time
+                with lock:
+                    state["target"] = profile.concurrency_at(elapsed)
+                if elapsed >= interval_start + self.sample_interval_seconds or elapsed >= profile.duration_seconds:
+                    with lock:
+                        sample = interval.result(len(intervals), interval_start, elapsed, profile.concurrency_at(
+                            interval_start), state["active"], profile.is_holding(interval_start, elapsed))
+                        interval = _IntervalStats()
+                    sample.update(_process_metrics())
+                    intervals.append(sample)
+                    if status_callback:
+                        status_callback("SAMPLE", str(sample["interval"]), sample)
+                    interval_start = elapsed
+                if elapsed >= profile.duration_seconds:
+                    break
+                time.sleep(min(1.0, self.sample_interval_seconds / 4))
+        except KeyboardInterrupt:
+            interrupted = True
+            raise
+        finally:
+            # let running conversations finish (for as long as they can take, or not at all if we were interrupted),
+            # abandoning any that don't, then put the client back as it was
+            stop.set()
+            with lock:
+                state["target"] = 0
+            finish_by = time.monotonic() + (0.0 if interrupted else self.finish_timeout_seconds)
+            for worker in workers:
+                if worker.is_alive():
+                    worker.join(max(0.0, finish_by - time.monotonic()))
+            with lock:
+                abandoned = state["active"]
+            if abandoned:
+                logging.warning(f"Soak test abandoned {abandoned} running conversation(s)")
+            client.session.adapters.clear()
+            for prefix, adapter in original_adapters.items():
+                client.session.mount(prefix, adapter)
+
+        elapsed = time.monotonic() - start_time
+        overall_result = overall.result(None, 0.0, elapsed, None, 0, False)
+        for key in ("interval", "start_seconds", "target_concurrency", "active_conversations", "holding"):
+            del overall_result[key]
+        overall_result["elapsed_seconds"] = overall_result.pop("end_seconds")
+        overall_result["abandoned_conversations"] = abandoned
+        return {"profile": profile.describe(), "intervals": intervals, "overall": overall_result,
+                "stability": detect_drift(intervals, self.drift_thresholds)}
+
+
+def conversation_budget_seconds(simulator: OCSBotToBotSimulator, max_exchanges: int) -> float:
+    """
+    Estimate the longest a simulated conversation can take, with every call using its full deadline or retry budget.
+
+    Args:
+        simulator (OCSBotToBotSimulator): The simulator running the conversation.
+        max_exchanges (int): The maximum number of exchanges per conversation.
+
+    Returns:
+        float: The number of seconds.
+    """
+
+    client = simulator.ocs_api_client
+    if client.deadline_seconds:
+        call_seconds = client.deadline_seconds
+    else:
+        # every attempt times out, and every retry backs off as long as it can (ignoring any Retry-After)
+        policy = client.retry_policy
+        call_seconds = policy.max_attempts * (client.connect_timeout_seconds + client.timeout_seconds)
+        for retry in range(policy.max_attempts - 1):
+            call_seconds += min(policy.initial_wait_seconds * policy.backoff_multiplier ** retry,
+                                policy.max_wait_seconds) + policy.jitter_seconds
+
+    # setting up both sessions, then two calls per exchange (each exchange also capped by any turn deadline)
+    exchange_seconds = 2 * call_seconds
+    if simulator.turn_deadline_seconds:
+        exchange_seconds = min(exchange_seconds, simulator.turn_deadline_seconds)
+    return 2 * call_seconds + max_exchanges * exchange_seconds
+
+
+def detect_drift(intervals: list[dict], thresholds: Optional[dict[str, float]] = None,
+                 min_intervals: int = 6, warmup_intervals: int = 1) -> dict:
+    """
+    Check holding stages of a ramp or soak test for drift.
+
+    Within each run of consecutive holding intervals (after skipping warm-up intervals), each metric's trend is
+    fitted with least squares. A metric drifts if its fitted change over the hold exceeds the threshold (relative to
+    its starting level, or absolute for error rates) and the last third of the hold is also worse than the first
+    third by at least half the threshold, so that a single outlier doesn't count as a trend.
+
+    Args:
+        intervals (list[dict]): The interval samples, as returned by SoakTestRunner.run().
+        thresholds (dict[str, float], optional): The metrics to check (dot-separated for nested values), each with
+          the change that counts as drift. Defaults to SoakTestRunner.DRIFT_THRESHOLDS.
+        min_intervals (int): The minimum number of holding intervals needed to check a hold. Defaults to 6.
+        warmup_intervals (int): The number of intervals to skip at the start of each hold. Defaults to 1.
+
+    Returns:
+        dict: A dictionary with the following keys: "stable" (False if any metric drifted), "holds_checked",
+        "findings" (a dictionary for each metric checked in each hold, with the following keys: "metric",
+        "start_seconds", "end_seconds", "slope_per_hour", "start_value", "fitted_change", "drifting").
+    """
+
+    thresholds = SoakTestRunner.DRIFT_THRESHOLDS if thresholds is None else thresholds
+
+    # find runs of consecutive holding intervals
+    holds = []
+    current = []
+    for sample in intervals:
+        if sample["holding"] and (not current or sample["target_concurrency"] == current[-1]["target_concurrency"]):
+            current.append(sample)
+        else:
+            holds.append(current)
+            current = [sample] if sample["holding"] else []
+    holds.append(current)
+    holds = [hold[warmup_intervals:] for hold in holds if len(hold) - warmup_intervals >= min_intervals]
+
+    findings = []
+    for hold in holds:
+        for metric, threshold in thresholds.items():
+            points = [((sample["start_seconds"] + sample["end_seconds"]) / 2, _metric_value(sample, metric))
+                      for sample in hold]
+            points = [(x, y) for x, y in points if y is not None]
+            if len(points) < min_intervals:
+                continue
+
+            slope, intercept = _fit_line(points)
+            start_value = intercept + slope * points[0][0]
+            fitted_change = slope * (points[-1][0] - points[0][0])
+            third = max(1, len(points) // 3)
+            first_mean = sum(y for _, y in points[:third]) / third
+            last_mean = sum(y for _, y in points[-third:]) / third
+            if metric == "error_rate":
+                drifting = fitted_change > threshold and last_mean - first_mean > threshold / 2
+            else:
+                base = max(abs(start_value), abs(first_mean), 1e-9)
+                drifting = fitted_change / base > threshold and (last_mean - first_mean) / base > threshold / 2
+            findings.append({"metric": metric, "start_seconds": round(hold[0]["start_seconds"], 1),
+                             "end_seconds": round(hold[-1]["end_seconds"], 1),
+                             "slope_per_hour": round(slope * 3600, 4), "start_value": round(start_value, 4),
+                             "fitted_change": round(fitted_change, 4), "drifting": drifting})
+
+    return {"stable": not any(finding["drifting"] for finding in findings), "holds_checked": len(holds),
+            "findings": findings}
+
+
+def main():
+    """
+    Run a ramp or soak test from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Ramp or soak test bot-to-bot simulations against Open Chat Studio.")
+    parser.add_argument("--config", default="~/.ocs/open-chat-studio-sim.ini",
+                        help="the notebooks' configuration file, for the API key and IDs (default: %(default)s)")
+    parser.add_argument("--base-url", default=PRODUCTION_BASE_URL,
+                        help="the OCS API base URL, e.g. for a local mock server (default: %(default)s)")
+    parser.add_argument("--profile", default="ramp:1:64:1800,hold:64:14400",
+                        help="comma-separated stages, each ramp:START:END:SECONDS or hold:CONCURRENCY:SECONDS "
+                             "(default: %(default)s)")
+    parser.add_argument("--sample-seconds", type=float, default=60.0,
+                        help="seconds per sample interval (default: %(default)s)")
+    parser.add_argument("--contexts", help=".csv file of simulation contexts, with a \"context\" column (default: a "
+                                           "fixed context)")
+    parser.add_argument("--max-exchanges", type=int, default=20,
+                        help="maximum exchanges per conversation (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="API read timeout in seconds, per attempt (default: %(default)s)")
+    parser.add_argument("--finish-timeout", type=float, default=None,
+                        help="seconds to wait for running conversations at the end before abandoning them (default: "
+                             "as long as a conversation can take, given the timeout and retries)")
+    parser.add_argument("--output", help="file to write JSON results to (default: standard output)")
+    args = parser.parse_args()
+
+    # load configuration
+    config = read_ocs_config(parser, args.config, args.base_url, {
+        "ocs-api-key": "soak-test", "experiment-id": "soak-test-experiment",
+        "user-simulator-experiment-id": "soak-test-user-simulator", "participant-id": "open-chat-studio-sim"})
+    api_key = config["ocs-api-key"]
+    experiment_id = config["experiment-id"]
+    user_experiment_id = config["user-simulator-experiment-id"]
+    participant_id = config["participant-id"]
+
+    # load contexts
+    contexts = ["You are a curious user with a few questions. Say END when they've been answered."]
+    if args.contexts:
+        with open(args.contexts, newline="", encoding="utf-8") as file:
+            contexts = [row["context"] for row in csv.DictReader(file)]
+
+    def report(status: str, index: str, sample: dict):
+        print(f"Interval {index} ({sample['end_seconds']:.0f} s): {sample['active_conversations']} active, "
+              f"{sample['conversations']} done, {sample['error_rate']:.1%} errors, "
+              f"p99 {sample['latency_ms']['p99']} ms, RSS {sample['rss_mb']} MB, "
+              f"{sample['open_connections']} connections", file=sys.stderr)
+
+    profile = ConcurrencyProfile.parse(args.profile)
+    client = OCSAPIClient(api_key, args.base_url, timeout_seconds=args.timeout,
+                          pool_maxsize=2 * profile.max_concurrency)
+    try:
+        with OCSBotToBotSimulator(client, experiment_id, user_experiment_id, participant_id) as simulator:
+            runner = SoakTestRunner(simulator, args.max_exchanges, args.sample_seconds,
+                                    finish_timeout_seconds=args.finish_timeout)
+            results = runner.run(profile, contexts, report)
+    finally:
+        client.close()
+
+    if results["overall"]["abandoned_conversations"]:
+        print(f"Abandoned {results['overall']['abandoned_conversations']} conversation(s) still running at the end",
+              file=sys.stderr)
+    stability = results["stability"]
+    drifting = [finding for finding in stability["findings"] if finding["drifting"]]
+    if not stability["holds_checked"]:
+        print("No holds long enough to check for drift", file=sys.stderr)
+    elif drifting:
+        for finding in drifting:
+            print(f"Drift in {finding['metric']}: {finding['fitted_change']:+g} over the hold from "
+                  f"{finding['start_seconds']:.0f} s to {finding['end_seconds']:.0f} s "
+                  f"(from {finding['start_value']:g})", file=sys.stderr)
+    else:
+        print("Stable: no drift detected", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+class _IntervalStats:
+    """Running totals for one sample interval of a soak test."""
+
+    def __init__(self):
+        self.requests = 0
+        self.request_errors = 0
+        self.conversations = 0
+        self.conversation_errors = 0
+        self.latencies = LatencyHistogram()
+
+    def record_request(self, seconds: float, failed: bool):
+        self.requests += 1
+        self.request_errors += failed
+        self.latencies.record(seconds)
+
+    def result(self, index: Optional[int], start_seconds: float, end_seconds: float,
+               target_concurrency: Optional[int], active: int, holding: bool) -> dict:
+        return {"interval": index, "start_seconds": round(start_seconds, 3), "end_seconds": round(end_seconds, 3),
+                "target_concurrency": target_concurrency, "active_conversations": active, "holding": holding,
+                "conversations": self.conversations, "conversation_errors": self.conversation_errors,
+                "requests": self.requests, "request_errors": self.request_errors,
+                "error_rate": round(self.request_errors / self.requests, 4) if self.requests else 0.0,
+                "latency_ms": self.latencies.summary()}
+
+
+class _RequestTimingAdapter(BaseAdapter):
+    """requests transport adapter that reports the latency and outcome of each request (including each retry)."""
+
+    def __init__(self, adapter: BaseAdapter, callback: callable):
+        super().__init__()
+        self.adapter = adapter
+        self.callback = callback
+
+    def send(self, request, **kwargs):
+        start_time = time.monotonic()
+        failed = True
+        try:
+            response = self.adapter.send(request, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self.callback(time.monotonic() - start_time, failed)
+
+    def close(self):
+        self.adapter.close()
+
+
+def _process_metrics() -> dict:
+    """
+    Sample the client process's resource use.
+
+    Returns:
+        dict: A dictionary with the following keys: "rss_mb" (resident memory), "open_connections" (network sockets),
+        "threads" (all of the process's threads, not just Python's).
+    """
+
+    process = psutil.Process()
+    connections = process.net_connections(kind="inet") if hasattr(process, "net_connections") \
+        else process.connections(kind="inet")
+    return {"rss_mb": round(process.memory_info().rss / (1024 * 1024), 2), "open_connections": len(connections),
+            "threads": process.num_threads()}
+
+
+def _fit_line(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """
+    Fit a line to points with least squares.
+
+    Args:
+        points (list[tuple[float, float]]): The (x, y) points (at least two, with distinct x values).
+
+    Returns:
+        tuple[float, float]: The slope and intercept.
+    """
+
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0.0
+    return slope, mean_y - slope * mean_x
+
+
+def _metric_value(sample: dict, metric: str) -> Optional[float]:
+    """Get a (possibly nested, dot-separated) metric from an interval sample."""
+
+    value = sample
+    for part in metric.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()